@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# backfill.py
+# Phase 2: 과거 일봉 일괄 수집 (구간 분할 + 병렬 다운로드 + 이어받기)
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Tuple
+
+from beta_matrix import krx_ticker
+from fetch_resilience import ResilientSource, TokenBucket
+from market_data_collector import load_watchlist
+from market_data_sources import MarketDataSource, MockSource, YFinanceSource
+from price_store import PriceStore
+from stock_universe import load_universe
+
+
+def make_chunks(symbols: List[str], start: date, end: date, chunk_days: int, chunk_symbols: int) -> List[Dict]:
+    """
+    (기간 × 종목)을 작업 단위로 분할
+
+    Returns:
+        [{'id': str, 'window': str, 'symbols': List[str], 'start': date, 'end': date}, ...]
+        id는 같은 범위면 항상 같음, 체크포인트는 (window, 종목) 단위로 기록
+    """
+    chunks = []
+    window_start = start
+    while window_start <= end:
+        window_end = min(end, window_start + timedelta(days=chunk_days - 1))
+        for i in range(0, len(symbols), chunk_symbols):
+            batch = symbols[i:i + chunk_symbols]
+            digest = hashlib.sha1(','.join(batch).encode()).hexdigest()[:10]
+            chunks.append({
+                'id': f"{window_start:%Y%m%d}-{window_end:%Y%m%d}-{digest}",
+                'window': f"{window_start:%Y%m%d}-{window_end:%Y%m%d}",
+                'symbols': batch,
+                'start': window_start,
+                'end': window_end
+            })
+        window_start = window_end + timedelta(days=1)
+    return chunks
+
+
+def checkpoint_key(chunk: Dict, symbol: str) -> str:
+    """체크포인트 단위: (구간, 종목) — 일봉을 저장한 종목만 완료로 기록"""
+    return f"{chunk['window']}:{symbol}"
+
+
+class Checkpoint:
+    """완료된 (구간, 종목) 키를 JSON 파일에 기록 (중단 후 이어받기용)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done = set()
+        self._lock = threading.Lock()
+
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.done = set(json.load(f).get('done', []))
+
+    def mark(self, key: str):
+        with self._lock:
+            self.done.add(key)
+
+            # 임시 파일에 쓴 뒤 교체 → 중간에 죽어도 파일이 깨지지 않음
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'done': sorted(self.done), 'updated': datetime.now().isoformat()}, f)
+            os.replace(tmp_path, self.path)
+
+    def reset(self):
+        with self._lock:
+            self.done = set()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+
+class Backfiller:
+    """
+    작업 단위를 제한된 스레드 풀로 내려받아 PriceStore에 바로 저장
+
+    요청 속도 제한은 소스 쪽(ResilientSource limiter)에서 실제 요청 단위로 건다.
+    """
+
+    def __init__(self, source: MarketDataSource, store: PriceStore, checkpoint: Checkpoint,
+                 workers: int = 4):
+        """
+        Args:
+            source: 데이터 소스
+            store: 저장소
+            checkpoint: 진행 기록
+            workers: 동시 다운로드 수 (소스가 동시 요청을 직렬화하면 1)
+        """
+        self.source = source
+        self.store = store
+        self.checkpoint = checkpoint
+        self.workers = workers if source.concurrent_requests else 1
+
+        # 같은 종목 파일을 동시에 병합하지 않도록 종목별 잠금
+        self._symbol_locks = defaultdict(threading.Lock)
+        self._locks_guard = threading.Lock()
+
+    def _lock_for(self, symbol: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._symbol_locks[symbol]
+
+    def _run_chunk(self, chunk: Dict) -> Tuple[int, List[str]]:
+        """
+        작업 하나 처리
+
+        Returns:
+            (저장한 일봉 수, 일봉을 받지 못한 종목) — 받지 못한 종목은 완료로 기록하지 않음
+        """
+        histories = self.source.fetch_history(chunk['symbols'], chunk['start'], chunk['end'])
+
+        rows = 0
+        missing = []
+        for symbol in chunk['symbols']:
+            frame = histories.get(symbol)
+            if frame is None or frame.empty:
+                missing.append(symbol)
+                continue
+            with self._lock_for(symbol):
+                self.store.write(symbol, frame)
+            self.checkpoint.mark(checkpoint_key(chunk, symbol))
+            rows += len(frame)
+
+        return rows, missing
+
+    def run(self, chunks: List[Dict]) -> Dict:
+        """
+        남은 작업 실행
+
+        Returns:
+            {'total', 'skipped', 'done', 'failed': List[id], 'rows', 'elapsed'}
+        """
+        # 체크포인트에 없는 종목만 남김 (일부만 받은 작업은 빠진 종목만 다시)
+        pending = []
+        for chunk in chunks:
+            symbols = [symbol for symbol in chunk['symbols'] if checkpoint_key(chunk, symbol) not in self.checkpoint.done]
+            if symbols:
+                pending.append({**chunk, 'symbols': symbols})
+        skipped = len(chunks) - len(pending)
+        if skipped:
+            print(f"⏩ 체크포인트에서 {skipped}개 작업 건너뜀")
+
+        started = time.perf_counter()
+        rows = 0
+        failed = []
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(self._run_chunk, chunk): chunk for chunk in pending}
+
+            for i, future in enumerate(as_completed(futures), 1):
+                chunk = futures[future]
+                label = f"{chunk['start']}~{chunk['end']} {len(chunk['symbols'])}종목"
+                try:
+                    chunk_rows, missing = future.result()
+                    rows += chunk_rows
+                    if missing:
+                        failed.append(chunk['id'])
+                        print(f"[{i}/{len(pending)}] ⚠️  {label} ({chunk_rows:,}개 일봉), "
+                              f"응답 없음 {len(missing)}종목: {', '.join(missing)}")
+                    else:
+                        print(f"[{i}/{len(pending)}] ✅ {label} ({chunk_rows:,}개 일봉)")
+                except Exception as e:
+                    failed.append(chunk['id'])
+                    print(f"[{i}/{len(pending)}] ❌ {label}: {e}")
+
+        return {
+            'total': len(chunks),
+            'skipped': skipped,
+            'done': len(pending) - len(failed),
+            'failed': failed,
+            'rows': rows,
+            'elapsed': round(time.perf_counter() - started, 2)
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="과거 일봉 일괄 수집 (중단 후 같은 명령으로 이어받기)")
+    parser.add_argument('--start', required=True, help="시작일 (YYYY-MM-DD)")
+    parser.add_argument('--end', help="종료일 (YYYY-MM-DD, 기본: 어제)")
+    parser.add_argument('--symbols', help="쉼표로 구분한 티커 (기본: watchlist.json 전체)")
+    parser.add_argument('--watchlist', help="관심 종목 설정 파일")
+    parser.add_argument('--korea', action='store_true', help="한국 관련주 유니버스 종목({코드}.KS)도 포함")
+    parser.add_argument('--chunk-days', type=int, default=365, help="작업당 기간 (일)")
+    parser.add_argument('--chunk-symbols', type=int, default=20, help="작업당 종목 수")
+    parser.add_argument('--workers', type=int, default=4, help="동시 다운로드 수")
+    parser.add_argument('--rate', type=float, default=2.0, help="초당 최대 요청 수 (종목 하나 = 요청 하나)")
+    parser.add_argument('--store', help="저장소 디렉터리 (기본: data/prices)")
+    parser.add_argument('--checkpoint', help="체크포인트 파일 (기본: <저장소>/backfill_checkpoint.json)")
+    parser.add_argument('--reset', action='store_true', help="체크포인트를 지우고 처음부터")
+    parser.add_argument('--mock', action='store_true', help="가상 데이터로 실행 (네트워크 없음)")
+    args = parser.parse_args(argv)
+
+    start = datetime.strptime(args.start, '%Y-%m-%d').date()
+    end = datetime.strptime(args.end, '%Y-%m-%d').date() if args.end else date.today() - timedelta(days=1)
+
+    if args.symbols:
+        symbols = [s.strip() for s in args.symbols.split(',') if s.strip()]
+    else:
+        symbols = list(dict.fromkeys(load_watchlist(args.watchlist)['indices'].values()))
+    if args.korea:
+        symbols += [krx_ticker(code) for code in load_universe().stock_codes]
+
+    store = PriceStore(args.store)
+    checkpoint = Checkpoint(args.checkpoint or os.path.join(store.root, 'backfill_checkpoint.json'))
+    if args.reset:
+        checkpoint.reset()
+
+    if args.mock:
+        source = MockSource(seed=0)
+    else:
+        source = ResilientSource(YFinanceSource(), limiter=TokenBucket(args.rate))
+    chunks = make_chunks(symbols, start, end, args.chunk_days, args.chunk_symbols)
+    backfiller = Backfiller(source, store, checkpoint, workers=args.workers)
+
+    print(f"📥 백필 시작: {len(symbols)}종목, {start} ~ {end}, {len(chunks)}개 작업")
+    print(f"   동시 {backfiller.workers}개, 초당 {args.rate}회 제한, 저장소 {store.root}\n")
+
+    result = backfiller.run(chunks)
+
+    print(f"\n✅ 완료 {result['done']} / 건너뜀 {result['skipped']} / 실패 {len(result['failed'])}")
+    print(f"   {result['rows']:,}개 일봉, {result['elapsed']}초")
+    if result['failed']:
+        print("   실패한 작업은 같은 명령을 다시 실행하면 이어서 받습니다.")
+
+    return 1 if result['failed'] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
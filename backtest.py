@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+# backtest.py
+# Phase 2: KoreanStockMapper 예측 백테스트 (과거 미국 종가 재생 → 다음 한국 거래일 수익률 비교 + 병렬 파라미터 탐색)
+
+import argparse
+import itertools
+import os
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Iterator, List
+
+import numpy as np
+import pandas as pd
+
+from beta_matrix import align_next_session, krx_ticker
+from korean_stock_mapper import KoreanStockMapper
+from market_data_collector import load_watchlist
+from market_data_sources import MockSource
+from price_store import PriceStore
+from stock_universe import StockUniverse, load_universe
+from supply_chain import load_supply_chain
+
+
+def load_closes(read, columns: Dict[str, str]) -> pd.DataFrame:
+    """
+    {컬럼: 티커} → 날짜 × 컬럼 종가 (데이터 없는 티커는 빠짐)
+
+    Args:
+        read: 티커 → 일봉 DataFrame 함수
+    """
+    frames = {}
+    for column, ticker in columns.items():
+        frame = read(ticker)
+        if frame is not None and len(frame) > 0:
+            frames[column] = frame['Close']
+    if not frames:
+        return pd.DataFrame()
+    close = pd.concat(frames, axis=1).sort_index()
+    close.index = pd.DatetimeIndex(close.index).tz_localize(None).normalize()
+    return close.groupby(level=0).last()
+
+
+def build_replay(us_close: pd.DataFrame, kr_close: pd.DataFrame, codes: List[str]) -> Dict:
+    """
+    재생 데이터: 미국 거래일별 시장 데이터 + 다음 한국 거래일 종목 수익률
+
+    Returns:
+        {
+            'dates': 미국 거래일 목록,
+            'market_data': [get_market_data()와 같은 형태의 dict, ...],
+            'kr_returns': (n_days, len(codes)) 다음 한국 거래일 등락률 % (없으면 NaN)
+        }
+    """
+    aligned = align_next_session(us_close, kr_close.reindex(columns=codes))
+    us_ret = aligned['us'].round(2)
+    prices = us_close.reindex(aligned.index)
+
+    market_data = []
+    for day, row in zip(aligned.index, us_ret.itertuples(index=False)):
+        market_data.append({
+            name: {'price': float(prices.at[day, name]), 'change_pct': float(change), 'date': day.strftime('%Y-%m-%d')}
+            for name, change in zip(us_ret.columns, row) if not np.isnan(change)
+        })
+
+    return {
+        'dates': list(aligned.index),
+        'market_data': market_data,
+        'kr_returns': aligned['kr'].to_numpy(dtype='f8')
+    }
+
+
+def spearman(x: np.ndarray, y: np.ndarray) -> float:
+    """순위 상관계수 (동순위는 평균 순위)"""
+    if len(x) < 3:
+        return float('nan')
+    rx = pd.Series(x).rank().to_numpy()
+    ry = pd.Series(y).rank().to_numpy()
+    if rx.std() == 0 or ry.std() == 0:
+        return float('nan')
+    return float(np.corrcoef(rx, ry)[0, 1])
+
+
+def evaluate(mapper: KoreanStockMapper, replay: Dict) -> Dict:
+    """
+    재생 데이터 전체를 mapper로 분석해 다음 한국 거래일과 비교
+
+    중립/데이터 부족 날은 예측이 없으므로 제외한다.
+
+    Returns:
+        {
+            'days': 전체 일수, 'active_days': 방향 예측 일수, 'picks': 평가한 종목 수,
+            'hit_rate': 종목 방향 적중률,
+            'rank_corr': (방향 부호 × 점수) vs 실제 수익률 순위 상관,
+            'sector_precision': 대표 섹터 평균 수익률 방향 적중률,
+            'avg_pick_return': 예측 방향으로 매매했을 때 평균 수익률 %
+        }
+    """
+    universe = mapper.universe
+    column = {code: j for j, code in enumerate(universe.stock_codes)}
+    sector_of = {name: i for i, name in enumerate(universe.sector_names)}
+    kr_returns = replay['kr_returns']
+
+    # 날짜 × 섹터 평균 수익률 (설정과 무관하므로 한 번에 계산)
+    with np.errstate(invalid='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        sector_means = np.column_stack([
+            np.nanmean(kr_returns[:, r.start:r.stop], axis=1) if len(r) else np.full(len(kr_returns), np.nan)
+            for r in map(universe.sector_stocks, range(len(universe.sector_keys)))
+        ]) if len(kr_returns) else np.empty((0, len(universe.sector_keys)))
+
+    scores, realized = [], []
+    sector_hits = []
+    active_days = 0
+
+    for market_data, returns, sector_move in zip(replay['market_data'], kr_returns, sector_means):
+        result = mapper.analyze_korea_impact(market_data)
+        if result['sentiment'] not in ('positive', 'negative'):
+            continue
+        active_days += 1
+
+        for stock in result['top_stocks']:
+            j = column.get(stock['code'])
+            if j is None or np.isnan(returns[j]) or stock.get('direction') not in ('positive', 'negative'):
+                continue
+            sign = 1.0 if stock['direction'] == 'positive' else -1.0
+            scores.append(sign * stock.get('impact_score', 1.0))
+            realized.append(returns[j])
+
+        sector = sector_of.get(result['primary_sector'])
+        if sector is not None and not np.isnan(sector_move[sector]):
+            sign = 1.0 if result['sentiment'] == 'positive' else -1.0
+            sector_hits.append(sign * sector_move[sector] > 0)
+
+    scores, realized = np.array(scores), np.array(realized)
+    signed = np.sign(scores) * realized
+
+    return {
+        'days': len(kr_returns),
+        'active_days': active_days,
+        'picks': len(scores),
+        'hit_rate': float(np.mean(signed > 0)) if len(scores) else float('nan'),
+        'rank_corr': spearman(scores, realized),
+        'sector_precision': float(np.mean(sector_hits)) if sector_hits else float('nan'),
+        'avg_pick_return': float(np.mean(signed)) if len(scores) else float('nan')
+    }
+
+
+def grid_size(universe: StockUniverse, threshold_values: List[float], weight_powers: List[float]) -> int:
+    """섹터별 임계값 × 가중치 지수 전체 격자 크기 (섹터 수에 따라 지수적으로 커짐)"""
+    return len(threshold_values) ** len(universe.sector_keys) * len(weight_powers)
+
+
+def make_grid(universe: StockUniverse, threshold_values: List[float], weight_powers: List[float],
+              max_configs: int = 10_000, seed: int = 0) -> Iterator[Dict]:
+    """
+    섹터별 임계값 × 가중치 지수 설정 (필요할 때 하나씩 생성)
+
+    가중치는 w ** power로 바꾼다 (0이면 전 종목 동일, 1이면 원래 값, 클수록 대표주 집중).
+    전체 격자가 max_configs 이하이면 격자 전체, 넘으면
+    - 모든 섹터가 같은 임계값인 설정 (임계값 후보 수만큼)
+    - 나머지는 라틴 하이퍼큐브 표본 (섹터마다 후보값이 고르게 나오도록 섞은 열을 이어 붙임)
+    을 가중치 지수 후보마다 평가한다.
+
+    Yields:
+        {'thresholds': {섹터 key: 임계값}, 'weight_power': float}
+    """
+    keys = universe.sector_keys
+    if grid_size(universe, threshold_values, weight_powers) <= max_configs:
+        threshold_sets = itertools.product(threshold_values, repeat=len(keys))
+    else:
+        threshold_sets = _sample_thresholds(len(keys), threshold_values, max(1, max_configs // len(weight_powers)), seed)
+
+    for thresholds in threshold_sets:
+        for power in weight_powers:
+            yield {'thresholds': dict(zip(keys, thresholds)), 'weight_power': power}
+
+
+def _sample_thresholds(n_sectors: int, threshold_values: List[float], count: int, seed: int) -> Iterator[tuple]:
+    """공통 임계값 설정 + 이산 라틴 하이퍼큐브 표본 (중복 제외, 최대 count개)"""
+    seen = set()
+    for value in threshold_values[:count]:
+        seen.add((value,) * n_sectors)
+        yield (value,) * n_sectors
+
+    remaining = count - len(seen)
+    if remaining <= 0:
+        return
+    rng = np.random.default_rng(seed)
+    levels = np.asarray(threshold_values, dtype=float)
+    samples = np.column_stack([rng.permutation(np.resize(levels, remaining)) for _ in range(n_sectors)])
+    for row in samples.tolist():
+        thresholds = tuple(row)
+        if thresholds not in seen:
+            seen.add(thresholds)
+            yield thresholds
+
+
+def configure(universe: StockUniverse, config: Dict) -> StockUniverse:
+    """설정 하나를 적용한 유니버스"""
+    power = config.get('weight_power', 1.0)
+    weights = {code: float(w) ** power for code, w in zip(universe.stock_codes, universe.stock_weights)}
+    return universe.with_overrides(thresholds=config.get('thresholds'), weights=weights)
+
+
+class CachedSupplyChain:
+    """
+    공급망 노출 메모이제이션 (설정과 무관하게 날짜마다 같은 값이므로 한 번만 계산)
+
+    재생 데이터의 시장 데이터 dict는 탐색 내내 살아 있으므로 객체 id를 키로 쓴다.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+        self._exposures = {}
+        self._sources = {}
+
+    def exposures(self, us_market_data: Dict, nodes: List[str] = None) -> Dict[str, float]:
+        key = id(us_market_data)
+        if key not in self._exposures:
+            self._exposures[key] = self.graph.exposures(us_market_data, nodes=nodes)
+        return self._exposures[key]
+
+    def main_sources(self, us_market_data: Dict, nodes: List[str]) -> Dict[str, str]:
+        key = (id(us_market_data), tuple(nodes))
+        if key not in self._sources:
+            self._sources[key] = self.graph.main_sources(us_market_data, nodes)
+        return self._sources[key]
+
+
+# 작업 프로세스마다 한 번만 받는 공용 데이터
+_worker = {}
+
+
+def _init_worker(universe: StockUniverse, replay: Dict, supply_chain):
+    _worker.update(
+        universe=universe, replay=replay,
+        supply_chain=CachedSupplyChain(supply_chain) if supply_chain is not None else None
+    )
+
+
+def _run_config(config: Dict) -> Dict:
+    mapper = KoreanStockMapper(
+        universe=configure(_worker['universe'], config),
+        supply_chain=_worker['supply_chain'] or False
+    )
+    return {**evaluate(mapper, _worker['replay']), 'config': config}
+
+
+def sweep(universe: StockUniverse, replay: Dict, configs: Iterable[Dict], workers: int = None,
+          supply_chain=None) -> List[Dict]:
+    """
+    설정 목록을 프로세스 풀로 나눠 평가
+
+    재생 데이터와 유니버스는 프로세스 시작 시 한 번만 넘기고 설정만 작은 묶음으로 보낸다.
+
+    Returns:
+        evaluate() 결과에 'config'를 더한 목록 (configs 순서)
+    """
+    configs = list(configs)
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(configs) // (workers * 8))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(universe, replay, supply_chain)) as executor:
+        return list(executor.map(_run_config, configs, chunksize=chunksize))
+
+
+def _format(metrics: Dict) -> str:
+    return (f"적중률 {metrics['hit_rate']:.1%} / 순위상관 {metrics['rank_corr']:+.3f} / "
+            f"섹터 정밀도 {metrics['sector_precision']:.1%} / 평균 {metrics['avg_pick_return']:+.3f}% "
+            f"({metrics['active_days']}/{metrics['days']}일, {metrics['picks']}종목)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="한국 관련주 예측 백테스트 (다음 한국 거래일 기준)")
+    parser.add_argument('--start', required=True, help="시작일 (YYYY-MM-DD)")
+    parser.add_argument('--end', help="종료일 (YYYY-MM-DD, 기본: 어제)")
+    parser.add_argument('--store', help="저장소 디렉터리 (기본: data/prices)")
+    parser.add_argument('--watchlist', help="관심 종목 설정 파일")
+    parser.add_argument('--universe', help="한국 유니버스 파일")
+    parser.add_argument('--no-supply-chain', action='store_true', help="공급망 노출 없이 규칙만 평가")
+    parser.add_argument('--sweep', action='store_true', help="임계값 × 가중치 격자 탐색")
+    parser.add_argument('--thresholds', default='0.5,0.75,1.0,1.25,1.5,2.0', help="섹터별 임계값 후보")
+    parser.add_argument('--weight-powers', default='0,1,2', help="가중치 지수 후보")
+    parser.add_argument('--max-configs', type=int, default=10_000,
+                        help="평가할 최대 설정 수 (전체 격자가 더 크면 공통 임계값 + 라틴 하이퍼큐브 표본)")
+    parser.add_argument('--seed', type=int, default=0, help="표본 추출 시드")
+    parser.add_argument('--workers', type=int, help="프로세스 수 (기본: CPU 수)")
+    parser.add_argument('--sort', default='hit_rate',
+                        choices=['hit_rate', 'rank_corr', 'sector_precision', 'avg_pick_return'])
+    parser.add_argument('--top', type=int, default=10, help="출력할 상위 설정 수")
+    parser.add_argument('--mock', action='store_true', help="가상 데이터로 실행 (네트워크/저장소 없음)")
+    args = parser.parse_args(argv)
+
+    start = datetime.strptime(args.start, '%Y-%m-%d').date()
+    end = datetime.strptime(args.end, '%Y-%m-%d').date() if args.end else date.today() - timedelta(days=1)
+
+    indices = load_watchlist(args.watchlist)['indices']
+    universe = load_universe(args.universe)
+    codes = list(universe.stock_codes)
+    kr_tickers = {code: krx_ticker(code) for code in codes}
+
+    if args.mock:
+        histories = MockSource(seed=0).fetch_history(list(indices.values()) + list(kr_tickers.values()), start, end)
+        read = histories.get
+    else:
+        store = PriceStore(args.store)
+        read = lambda ticker: store.read_frame(ticker, start=start, end=end)
+
+    us_close = load_closes(read, indices)
+    kr_close = load_closes(read, kr_tickers)
+    if us_close.empty or kr_close.empty:
+        print("❌ 저장소에 미국 지수 또는 한국 종목 일봉이 없습니다 (backfill.py --korea 먼저 실행)")
+        return 1
+
+    replay = build_replay(us_close, kr_close, codes)
+    supply_chain = None if args.no_supply_chain else load_supply_chain()
+    print(f"📼 재생: {len(replay['dates'])}거래일 ({replay['dates'][0]:%Y-%m-%d} ~ {replay['dates'][-1]:%Y-%m-%d}), "
+          f"미국 {us_close.shape[1]}개 / 한국 {kr_close.shape[1]}개 종목\n")
+
+    baseline = evaluate(KoreanStockMapper(universe=universe, supply_chain=supply_chain or False), replay)
+    print(f"기본 설정: {_format(baseline)}")
+
+    if args.sweep:
+        thresholds = [float(v) for v in args.thresholds.split(',')]
+        powers = [float(v) for v in args.weight_powers.split(',')]
+        configs = make_grid(universe, thresholds, powers, max_configs=args.max_configs, seed=args.seed)
+
+        started = time.perf_counter()
+        results = sweep(universe, replay, configs, workers=args.workers, supply_chain=supply_chain)
+        elapsed = time.perf_counter() - started
+        total = grid_size(universe, thresholds, powers)
+        sampled = f" (전체 격자 {total:,}개 중 표본)" if total > len(results) else ""
+        print(f"\n🔍 {len(results):,}개 설정{sampled} × {len(replay['dates'])}거래일: {elapsed:.1f}초\n")
+
+        ranked = sorted(results, key=lambda r: -np.nan_to_num(r[args.sort], nan=-np.inf))
+        for i, result in enumerate(ranked[:args.top], 1):
+            config = result['config']
+            thresholds_text = ', '.join(f"{key}={value:g}" for key, value in config['thresholds'].items())
+            print(f"{i:>2}. {_format(result)}")
+            print(f"    임계값 [{thresholds_text}] 가중치^{config['weight_power']:g}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
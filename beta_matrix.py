@@ -0,0 +1,299 @@
+# beta_matrix.py
+# Phase 2: 미국 지수/ETF → 한국 종목 베타·상관 행렬 (지수가중 스트리밍 공분산)
+
+import os
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+# 한국 종목 티커 접미사 (Yahoo Finance 기준 KOSPI)
+KRX_SUFFIX = '.KS'
+
+
+def krx_ticker(code: str) -> str:
+    """종목코드 → 일봉 조회용 티커 ('005930' → '005930.KS')"""
+    return code if '.' in code else code + KRX_SUFFIX
+
+
+def align_next_session(us_close: pd.DataFrame, kr_close: pd.DataFrame) -> pd.DataFrame:
+    """
+    미국 거래일 등락률과 그 다음 한국 거래일 등락률을 한 행으로 정렬
+
+    Args:
+        us_close: 날짜 × 미국 이름 종가
+        kr_close: 날짜 × 한국 종목코드 종가
+
+    Returns:
+        미국 거래일 인덱스, (미국 등락률 컬럼, 한국 등락률 컬럼) 2단 컬럼 DataFrame
+        (다음 한국 거래일이 아직 없는 미국 거래일은 빠짐)
+    """
+    us_ret = us_close.sort_index().pct_change(fill_method=None).iloc[1:] * 100
+    kr_ret = kr_close.sort_index().pct_change(fill_method=None).iloc[1:] * 100
+
+    # 미국 d일 마감 → 한국 d일 다음 거래일 장에 반영
+    position = np.searchsorted(kr_ret.index.values, us_ret.index.values, side='right')
+    has_next = position < len(kr_ret)
+    next_kr = kr_ret.iloc[position[has_next]].set_axis(us_ret.index[has_next])
+
+    return pd.concat({'us': us_ret[has_next], 'kr': next_kr}, axis=1)
+
+
+def _pair_sums(x: np.ndarray, y: np.ndarray, weights: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    (n_days, m) × (n_days, n) 쌍별 가중합을 행렬곱으로 한 번에 계산
+
+    NaN은 그 쌍에서만 빠진다 (가중치 0).
+    """
+    vx, vy = ~np.isnan(x), ~np.isnan(y)
+    x0, y0 = np.where(vx, x, 0.0), np.where(vy, y, 0.0)
+    wvx = (weights[:, None] * vx).T
+    wx0 = (weights[:, None] * x0).T
+
+    return {
+        'w': wvx @ vy,
+        'x': wx0 @ vy,
+        'y': wvx @ y0,
+        'xx': (wx0 * x0.T) @ vy,
+        'yy': wvx @ (y0 ** 2),
+        'xy': wx0 @ y0,
+        'count': vx.T.astype(np.int64) @ vy.astype(np.int64),
+    }
+
+
+def _moments(sums: Dict[str, np.ndarray], min_periods: int):
+    """가중합 → (공분산, x 분산, y 분산), 관측 부족 쌍은 NaN"""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_x = sums['x'] / sums['w']
+        mean_y = sums['y'] / sums['w']
+        var_x = sums['xx'] / sums['w'] - mean_x ** 2
+        var_y = sums['yy'] / sums['w'] - mean_y ** 2
+        cov = sums['xy'] / sums['w'] - mean_x * mean_y
+
+    enough = sums['count'] >= min_periods
+    return (
+        np.where(enough, cov, np.nan),
+        np.where(enough & (var_x > 0), var_x, np.nan),
+        np.where(enough & (var_y > 0), var_y, np.nan)
+    )
+
+
+class StreamingBetaMatrix:
+    """
+    미국 등락률(m개) × 한국 등락률(n개) 쌍의 지수가중 베타/상관 행렬
+
+    쌍별 가중합(가중치, x, y, x², y², xy)만 들고 있으므로
+    - 하루치 update()와 기간 전체 fit()이 같은 결과를 낸다 (행렬곱 몇 번으로 일괄 누적)
+    - 기존 상태에 새 구간을 이어 붙일 때는 상태를 감쇠시킨 뒤 더하기만 한다
+    - 한쪽이 휴장(NaN)인 날은 그 쌍에서만 빠진다
+
+    미국 지수끼리의 가중합도 함께 두어, 서로 겹치는 지수(S&P 500/NASDAQ/DOW)의
+    움직임을 중복해 세지 않는 다중 회귀 계수를 바로 풀 수 있다.
+    """
+
+    def __init__(self, us_names: List[str], kr_codes: List[str], halflife: float = 60,
+                 min_periods: int = 20, ridge: float = 0.05):
+        """
+        Args:
+            us_names: 미국 지수/ETF 이름 (행)
+            kr_codes: 한국 종목코드 (열)
+            halflife: 가중치가 절반이 되는 거래일 수
+            min_periods: 베타를 내기 위한 최소 공통 관측일 수
+            ridge: 다중 회귀 안정화 계수 (미국 지수 분산 대비 비율)
+        """
+        self.us_names = list(us_names)
+        self.kr_codes = list(kr_codes)
+        self.halflife = halflife
+        self.min_periods = min_periods
+        self.ridge = ridge
+        self.decay = 0.5 ** (1.0 / halflife)
+        self.last_date = None
+
+        m, n = len(self.us_names), len(self.kr_codes)
+        self._sums = _pair_sums(np.empty((0, m)), np.empty((0, n)), np.empty(0))
+        self._us_sums = _pair_sums(np.empty((0, m)), np.empty((0, m)), np.empty(0))
+
+    def fit(self, us_returns, kr_returns, last_date=None):
+        """
+        여러 날을 한 번에 누적 (기존 상태는 기간 길이만큼 감쇠)
+
+        Args:
+            us_returns: (n_days, m) 미국 등락률 % (NaN = 관측 없음)
+            kr_returns: (n_days, n) 같은 행의 한국 등락률 %
+            last_date: 마지막 행 날짜 (증분 갱신 기준으로 기록)
+        """
+        x = np.atleast_2d(np.asarray(us_returns, dtype='f8'))
+        y = np.atleast_2d(np.asarray(kr_returns, dtype='f8'))
+        n_days = len(x)
+        if n_days == 0:
+            return
+
+        # 최근 행일수록 큰 가중치 (마지막 행 = 1)
+        weights = self.decay ** np.arange(n_days - 1, -1, -1)
+        carry = self.decay ** n_days
+
+        for state, batch in ((self._sums, _pair_sums(x, y, weights)), (self._us_sums, _pair_sums(x, x, weights))):
+            for key, value in batch.items():
+                state[key] = state[key] + value if key == 'count' else state[key] * carry + value
+
+        if last_date is not None:
+            self.last_date = pd.Timestamp(last_date)
+
+    def update(self, us_returns, kr_returns, bar_date=None):
+        """하루치 등락률 반영"""
+        self.fit(np.asarray(us_returns, dtype='f8')[None, :], np.asarray(kr_returns, dtype='f8')[None, :],
+                 bar_date)
+
+    def ingest(self, us_close: pd.DataFrame, kr_close: pd.DataFrame) -> int:
+        """
+        종가 행렬에서 아직 반영하지 않은 날만 누적
+
+        Returns:
+            새로 반영한 거래일 수
+        """
+        aligned = align_next_session(
+            us_close.reindex(columns=self.us_names), kr_close.reindex(columns=self.kr_codes)
+        )
+        if self.last_date is not None:
+            aligned = aligned[aligned.index > self.last_date]
+        if aligned.empty:
+            return 0
+
+        self.fit(aligned['us'].to_numpy(), aligned['kr'].to_numpy(), aligned.index[-1])
+        return len(aligned)
+
+    def beta(self) -> np.ndarray:
+        """(m, n) 미국 지수 하나씩 본 단순 베타 (관측 부족이면 NaN)"""
+        cov, var_x, _ = _moments(self._sums, self.min_periods)
+        return cov / var_x
+
+    def correlation(self) -> np.ndarray:
+        """(m, n) 상관계수 (관측 부족이면 NaN)"""
+        cov, var_x, var_y = _moments(self._sums, self.min_periods)
+        return np.clip(cov / np.sqrt(var_x * var_y), -1.0, 1.0)
+
+    def coefficients(self, rows: List[int] = None) -> np.ndarray:
+        """
+        (len(rows), n) 선택한 미국 지수를 함께 넣은 다중 회귀 계수
+
+        Σxx · B = Σxy 를 푼다. 관측이 부족한 미국 지수는 행에서 빠지고,
+        남은 지수와의 쌍 중 관측 부족이 하나라도 있는 종목 열은 NaN.
+        """
+        rows = list(range(len(self.us_names))) if rows is None else list(rows)
+        cov_xy, _, _ = _moments(self._sums, self.min_periods)
+        cov_xx, var_x, _ = _moments(self._us_sums, self.min_periods)
+
+        # 관측이 충분한 미국 지수만 사용
+        rows = [i for i in rows if not np.isnan(var_x[i, i])]
+        coef = np.full((len(rows), len(self.kr_codes)), np.nan)
+        if not rows:
+            return coef
+
+        sigma = np.nan_to_num(cov_xx[np.ix_(rows, rows)])
+        sigma += self.ridge * np.diag(np.diag(sigma))
+        target = cov_xy[rows]
+        complete = ~np.isnan(target).any(axis=0)
+
+        coef[:, complete] = np.linalg.solve(sigma, target[:, complete])
+        return coef
+
+    def contributions(self, us_market_data: Dict):
+        """
+        오늘 미국 등락률 × 계수 행렬을 지수별로 분해
+
+        Args:
+            us_market_data: {이름: {'change_pct': float, ...}} (없는 지수는 제외)
+
+        Returns:
+            (사용한 미국 이름 목록, (len(이름), n) 종목별 기여 등락률 %)
+        """
+        _, var_x, _ = _moments(self._us_sums, self.min_periods)
+        rows = [
+            i for i, name in enumerate(self.us_names)
+            if (us_market_data.get(name) or {}).get('change_pct') is not None and not np.isnan(var_x[i, i])
+        ]
+        move = np.array([us_market_data[self.us_names[i]]['change_pct'] for i in rows], dtype='f8')
+        return [self.us_names[i] for i in rows], move[:, None] * self.coefficients(rows)
+
+    def expected_moves(self, us_market_data: Dict) -> Dict[str, float]:
+        """
+        오늘 미국 등락률 벡터 × 계수 행렬 → 한국 종목별 예상 등락률 (%)
+
+        Returns:
+            {종목코드: 예상 등락률} (추정 불가 종목은 빠짐)
+        """
+        names, contribution = self.contributions(us_market_data)
+        if not names:
+            return {}
+        scores = contribution.sum(axis=0)
+        return {code: float(score) for code, score in zip(self.kr_codes, scores) if not np.isnan(score)}
+
+    def save(self, path: str):
+        """상태를 .npz로 저장 (임시 파일에 쓴 뒤 교체)"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = path + '.tmp.npz'
+        np.savez(
+            tmp_path,
+            us_names=np.array(self.us_names), kr_codes=np.array(self.kr_codes),
+            params=np.array([self.halflife, self.min_periods, self.ridge]),
+            last_date=np.array(str(self.last_date.date()) if self.last_date is not None else ''),
+            **{f'kr_{key}': value for key, value in self._sums.items()},
+            **{f'us_{key}': value for key, value in self._us_sums.items()}
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'StreamingBetaMatrix':
+        """save()로 저장한 상태 복원"""
+        with np.load(path) as data:
+            halflife, min_periods, ridge = data['params']
+            matrix = cls(data['us_names'].tolist(), data['kr_codes'].tolist(), float(halflife),
+                         int(min_periods), float(ridge))
+            matrix._sums = {key: data[f'kr_{key}'] for key in matrix._sums}
+            matrix._us_sums = {key: data[f'us_{key}'] for key in matrix._us_sums}
+            last_date = str(data['last_date'])
+            matrix.last_date = pd.Timestamp(last_date) if last_date else None
+        return matrix
+
+
+# 테스트
+if __name__ == "__main__":
+    import time
+    from synthetic_market import SyntheticMarketGenerator
+
+    # 미국 지수 경로 + 알려진 계수로 만든 한국 종목 등락률
+    sample = SyntheticMarketGenerator(seed=5).generate(1500)
+    us_names = [name for name in sample['names'] if name != 'VIX']
+    us = sample['change_pct'][1:, [sample['names'].index(name) for name in us_names]]
+
+    rng = np.random.default_rng(5)
+    kr_codes = [f'{i:06d}' for i in range(2000)]
+    true_coef = np.zeros((len(us_names), len(kr_codes)))
+    true_coef[us_names.index('NASDAQ')] = rng.uniform(0.2, 1.2, len(kr_codes))
+    kr = us @ true_coef + rng.standard_normal((len(us), len(kr_codes)))
+    kr[rng.random(kr.shape) < 0.05] = np.nan  # 한국 휴장/거래정지
+
+    matrix = StreamingBetaMatrix(us_names, kr_codes, halflife=250)
+    started = time.perf_counter()
+    matrix.fit(us[:-20], kr[:-20])
+    elapsed = time.perf_counter() - started
+    print(f"=== {len(us) - 20:,}거래일 × {len(us_names)}지수 × {len(kr_codes):,}종목 일괄 추정: {elapsed * 1000:.0f}ms ===")
+
+    started = time.perf_counter()
+    for x, y in zip(us[-20:], kr[-20:]):
+        matrix.update(x, y)
+    elapsed = time.perf_counter() - started
+    print(f"하루치 증분 갱신: {elapsed / 20 * 1000:.1f}ms")
+
+    batch = StreamingBetaMatrix(us_names, kr_codes, halflife=250)
+    batch.fit(us, kr)
+    print(f"일괄 vs 증분 최대 차이: {np.nanmax(np.abs(batch.coefficients() - matrix.coefficients())):.2e}")
+
+    coef = matrix.coefficients()
+    print(f"NASDAQ 계수 추정 오차 (평균 절대): {np.nanmean(np.abs(coef - true_coef)):.3f}")
+    print(f"단순 베타 S&P 500 (지수 간 중복 포함, 평균): {np.nanmean(matrix.beta()[us_names.index('S&P 500')]):.2f}")
+
+    today = {'NASDAQ': {'change_pct': 2.0}, 'S&P 500': {'change_pct': 1.4}, 'DOW': {'change_pct': 0.9}}
+    moves = matrix.expected_moves(today)
+    top = sorted(moves.items(), key=lambda item: -abs(item[1]))[:3]
+    print(f"예상 등락률 상위: {[(code, round(move, 2)) for code, move in top]}")
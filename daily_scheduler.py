@@ -3,8 +3,11 @@
 
 import schedule
 import time
-from datetime import datetime
+import os
+from datetime import datetime, timedelta
 from market_data_collector import MarketDataCollector
+from report_pipeline import ReportPipeline, load_subscribers
+from telegram_notifier import TelegramNotifier
 import logging
 
 # 로깅 설정
@@ -19,6 +22,36 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# 리포트 발송 시각
+REPORT_TIME = "07:00"
+
+# 워밍업 수집 시각 (미국 장 마감 직후 + 발송 직전 재확인)
+PREFETCH_TIMES = ["06:10", "06:50"]
+
+# 발송 시작 후 데이터 수집에 허용하는 최대 시간 (초)
+DATA_DEADLINE_SECONDS = 60
+
+# 워밍업과 발송이 스냅샷을 공유하도록 프로세스당 하나만 생성
+_collector = None
+
+def get_collector():
+    """공유 Collector (환경변수가 있으면 실제 모드, 없으면 Mock)"""
+    global _collector
+    if _collector is None:
+        has_env = os.getenv('TELEGRAM_BOT_TOKEN') and os.getenv('TELEGRAM_CHAT_ID')
+        _collector = MarketDataCollector(mock_mode=not has_env)
+    return _collector
+
+def prefetch_market_data():
+    """발송 전 시장 데이터 미리 수집"""
+    try:
+        collector = get_collector()
+        market_data = collector.prefetch()
+        fetched = sum(1 for data in market_data.values() if data)
+        logger.info(f"📥 워밍업 수집 완료: {fetched}/{len(market_data)}개 지수 {collector.last_timings}")
+    except Exception as e:
+        logger.error(f"❌ 워밍업 수집 오류: {e}", exc_info=True)
+
 def run_daily_report():
     """매일 실행되는 리포트 생성 및 발송"""
     try:
@@ -26,13 +59,27 @@ def run_daily_report():
         logger.info("🚀 마무리 경제 브리핑 시작")
         logger.info("="*70)
         
-        # Collector 생성 (환경변수가 있으면 실제 모드, 없으면 Mock)
-        import os
-        has_env = os.getenv('TELEGRAM_BOT_TOKEN') and os.getenv('TELEGRAM_CHAT_ID')
-        collector = MarketDataCollector(mock_mode=not has_env)
+        collector = get_collector()
+        
+        # 리포트 생성 및 발송 (마감 시각까지 못 받은 지수는 캐시 값 사용)
+        deadline = datetime.now() + timedelta(seconds=DATA_DEADLINE_SECONDS)
+        
+        # 구독자 설정이 있으면 구독자별 리포트 대량 발송
+        subscribers = load_subscribers()
+        if subscribers:
+            broadcast_to_subscribers(collector, subscribers, deadline)
+            return
+        
+        report, data, korea_data, ai_insight, telegram_result = collector.generate_and_send_report(deadline=deadline)
+        
+        # AI 인사이트 출처 (llm / cache / timeout / error) 와 누적 지연 통계
+        insight_stats = collector.analyst.latency_stats()
+        logger.info(f"💡 인사이트: {collector.analyst.last_budget_result.get('source')} "
+                    f"(p50 {insight_stats['p50']}, p90 {insight_stats['p90']}, 대체율 {insight_stats['fallback_rate']})")
         
-        # 리포트 생성 및 발송
-        report, data, korea_data, ai_insight, telegram_result = collector.generate_and_send_report()
+        stale = [name for name, item in data.items() if item and item.get('stale')]
+        if stale:
+            logger.warning(f"⚠️  지연 데이터로 발송: {', '.join(stale)}")
         
         if telegram_result and telegram_result['success']:
             logger.info(f"✅ 리포트 발송 성공! (메시지 ID: {telegram_result['message_id']})")
@@ -46,6 +93,25 @@ def run_daily_report():
     except Exception as e:
         logger.error(f"❌ 오류 발생: {e}", exc_info=True)
 
+def broadcast_to_subscribers(collector, subscribers, deadline):
+    """공통 분석 한 번 → 구독자별 렌더링 → 속도 제한을 지키며 동시 발송"""
+    pipeline = ReportPipeline(collector, subscribers)
+    snapshot = pipeline.build_snapshot(deadline)
+    reports = pipeline.render_all(snapshot)
+    logger.info(f"🧩 구독자 리포트: {pipeline.last_render_stats}")
+    
+    delivery = TelegramNotifier().broadcast(reports)
+    logger.info(f"📨 대량 발송: 성공 {delivery['sent']} / 실패 {delivery['failed']} / 429 {delivery['rate_limited']}회 "
+                f"({delivery['elapsed']}초, {delivery['throughput']}건/초)")
+    
+    failed = {chat_id: result['error'] for chat_id, result in delivery['results'].items() if not result['success']}
+    if failed:
+        logger.warning(f"⚠️  발송 실패 {len(failed)}건: {dict(list(failed.items())[:5])}")
+    
+    logger.info("="*70)
+    logger.info("✅ 마무리 경제 브리핑 완료")
+    logger.info("="*70 + "\n")
+
 def test_immediate_run():
     """즉시 실행 테스트"""
     logger.info("\n🧪 즉시 실행 테스트 모드")
@@ -62,11 +128,14 @@ def start_scheduler(test_mode=False):
         # 테스트: 즉시 실행
         test_immediate_run()
     else:
-        # 실제 운영: 매일 오전 7시 실행
-        schedule.every().day.at("07:00").do(run_daily_report)
+        # 실제 운영: 발송 전 워밍업 수집 후 매일 오전 7시 실행
+        for prefetch_time in PREFETCH_TIMES:
+            schedule.every().day.at(prefetch_time).do(prefetch_market_data)
+        schedule.every().day.at(REPORT_TIME).do(run_daily_report)
         
         logger.info("⏰ 스케줄러 시작!")
         logger.info("   매일 오전 7시에 자동 실행됩니다.")
+        logger.info(f"   워밍업 수집: {', '.join(PREFETCH_TIMES)}")
         logger.info("   중단하려면 Ctrl+C를 누르세요.\n")
         
         # 다음 실행 시간 표시
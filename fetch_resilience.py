@@ -0,0 +1,332 @@
+# fetch_resilience.py
+# Phase 2: 데이터 조회 안정화 (재시도 / 타임아웃 / 서킷 브레이커 / 헤지 요청 / 속도 제한)
+
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from market_data_sources import MarketDataSource
+
+
+class TokenBucket:
+    """
+    초당 rate개, 최대 burst개까지 몰아 쓸 수 있는 토큰 버킷 (스레드 안전)
+    """
+
+    def __init__(self, rate: float, burst: float = None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """
+        토큰을 예약하고 기다려야 할 시간(초) 반환
+
+        먼저 예약한 쪽이 먼저 쓰도록 토큰을 음수까지 당겨 쓴다.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= tokens
+            return max(0.0, -self.tokens / self.rate)
+
+    def acquire(self, tokens: float = 1.0):
+        """토큰이 생길 때까지 대기"""
+        delay = self.reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+
+
+class CircuitBreaker:
+    """
+    연속 실패가 쌓이면 일정 시간 요청을 차단하는 서킷 브레이커
+
+    closed → (연속 실패 threshold회) → open → (cooldown 경과) → half-open
+    half-open에서는 시험 요청 하나만 통과시키고, 성공하면 closed, 실패하면 다시 open
+    """
+
+    def __init__(self, threshold: int = 5, cooldown: float = 300.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self.opened_at is None:
+                return 'closed'
+            if time.monotonic() - self.opened_at >= self.cooldown:
+                return 'half-open'
+            return 'open'
+
+    def allow(self) -> bool:
+        """
+        요청 허용 여부
+
+        half-open에서는 처음 물어본 호출만 시험 요청으로 허용하고,
+        그 결과가 기록될 때까지 다른 호출은 막는다.
+        """
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.cooldown or self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold or self._probing:
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+
+class LatencyTracker:
+    """심볼별 최근 응답 시간 기록 및 백분위 계산"""
+
+    def __init__(self, window: int = 100, min_samples: int = 10):
+        self.min_samples = min_samples
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+
+    def record(self, key: str, seconds: float):
+        with self._lock:
+            self._samples[key].append(seconds)
+
+    def percentile(self, key: str, pct: float) -> Optional[float]:
+        """표본이 부족하면 None"""
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < self.min_samples:
+            return None
+        index = min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))
+        return samples[index]
+
+
+class ResilientSource(MarketDataSource):
+    """
+    다른 소스를 감싸 조회 실패와 지연에 대응
+
+    1. 전체 티커 일괄 조회 (타임아웃 적용)
+    2. 빠진 티커는 심볼별로 지수 백오프(지터 포함) 재시도
+    3. 심볼 응답이 평소 p95보다 느리면 같은 요청을 한 번 더 보내 먼저 온 응답 사용
+       (inner.concurrent_requests가 False인 소스는 헤지하지 않음 — 두 요청이 직렬화되어 이득이 없음)
+    4. 연속 실패가 쌓이면 서킷 브레이커가 열려 즉시 포기 (마감 대체값 사용)
+       실패는 예외/타임아웃과 일괄 조회 전체가 빈 응답인 경우만 센다.
+       응답은 왔는데 일부 심볼만 비어 있으면(상장 전 구간, 상장 폐지 등) 소스 장애로 보지 않음
+    5. limiter가 있으면 inner 호출(일괄/재시도/헤지)마다 요청 티커 수만큼 토큰 차감
+    """
+
+    def __init__(self, inner: MarketDataSource, max_attempts: int = 3, base_delay: float = 0.5,
+                 max_delay: float = 8.0, timeout: float = 15.0, hedge_percentile: float = 95,
+                 max_workers: int = 4, breaker: CircuitBreaker = None, limiter: TokenBucket = None):
+        """
+        Args:
+            inner: 실제 조회를 수행할 소스
+            max_attempts: 심볼별 최대 시도 횟수
+            base_delay: 첫 재시도 대기 상한 (초, 시도마다 2배)
+            max_delay: 재시도 대기 최대값 (초)
+            timeout: 요청 한 번의 최대 대기 시간 (초)
+            hedge_percentile: 이 백분위보다 느리면 중복 요청
+            max_workers: 심볼별 재조회 동시 실행 수
+            breaker: 서킷 브레이커 (None이면 기본값으로 생성)
+            limiter: 원천 서버 요청 속도 제한 (티커 하나 = 요청 하나, 대기는 타임아웃에 포함하지 않음)
+        """
+        super().__init__()
+        self.inner = inner
+        self.name = f"resilient({inner.name})"
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.hedge_percentile = hedge_percentile
+        self.max_workers = max_workers
+        self.breaker = breaker or CircuitBreaker()
+        self.limiter = limiter
+        self.latency = LatencyTracker()
+
+        # 타임아웃된 요청도 끝까지 돌 수 있도록 호출 전용 풀을 따로 둠
+        self._call_executor = ThreadPoolExecutor(max_workers=max_workers * 2 + 1)
+        self._stats_lock = threading.Lock()
+
+    @property
+    def concurrent_requests(self) -> bool:
+        return self.inner.concurrent_requests
+
+    def today(self) -> date:
+        return self.inner.today()
+
+    def fetch_history(self, tickers: List[str], start: date, end: date = None) -> Dict[str, pd.DataFrame]:
+        started = time.perf_counter()
+        # 호출별 통계 (한 인스턴스를 여러 스레드가 공유해도 섞이지 않도록 인스턴스에 두지 않음)
+        stats = {'retries': 0, 'hedged': 0, 'timeouts': 0}
+
+        # 1단계: 일괄 조회
+        histories, inner_timings = {}, {}
+        if self.breaker.allow():
+            histories, inner_timings = self._timed_call('*batch*', tickers, start, end, stats)
+            if histories:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+            histories = histories or {}
+        batch_done = time.perf_counter()
+
+        # 2단계: 빠진 티커만 심볼별 재시도
+        missing = [t for t in tickers if len(histories.get(t, ())) == 0]
+        if missing:
+            workers = max(1, min(self.max_workers, len(missing)))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                frames = executor.map(lambda t: self._fetch_symbol(t, start, end, stats), missing)
+                for ticker, frame in zip(missing, frames):
+                    if frame is not None:
+                        histories[ticker] = frame
+
+        self.last_timings = {
+            **inner_timings,
+            'batch': round(batch_done - started, 3),
+            'retry': round(time.perf_counter() - batch_done, 3),
+            'retried_symbols': missing,
+            **stats,
+            'breaker': self.breaker.state
+        }
+
+        return histories
+
+    def _count(self, stats: Dict, key: str):
+        with self._stats_lock:
+            stats[key] = stats.get(key, 0) + 1
+
+    def _backoff(self, attempt: int) -> float:
+        """지수 백오프 + full jitter"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _fetch_symbol(self, ticker: str, start: date, end: date = None, stats: Dict = None) -> Optional[pd.DataFrame]:
+        """심볼 하나 재시도 조회"""
+        stats = {} if stats is None else stats
+        for attempt in range(self.max_attempts):
+            if not self.breaker.allow():
+                return None
+
+            if attempt > 0:
+                self._count(stats, 'retries')
+
+            histories, _ = self._timed_call(ticker, [ticker], start, end, stats)
+            frame = (histories or {}).get(ticker)
+            if frame is not None and not frame.empty:
+                self.breaker.record_success()
+                return frame
+
+            # 응답은 왔는데 이 심볼만 비었으면 소스 전체의 실패로 세지 않음
+            if histories is None:
+                self.breaker.record_failure()
+            if attempt < self.max_attempts - 1:
+                time.sleep(self._backoff(attempt))
+
+        print(f"Error fetching {ticker}: {self.max_attempts}회 시도 실패")
+        return None
+
+    def _timed_call(self, key: str, tickers: List[str], start: date, end: date = None,
+                    stats: Dict = None) -> Tuple[Optional[Dict[str, pd.DataFrame]], Dict]:
+        """
+        타임아웃과 헤지 요청을 적용한 inner 호출
+
+        Returns:
+            (먼저 성공한 응답 — 모두 비었으면 빈 응답, 타임아웃/예외면 None, 그 응답의 inner 세부 소요 시간)
+        """
+        stats = {} if stats is None else stats
+
+        def call():
+            call_started = time.perf_counter()
+            result = self.inner.fetch_history(tickers, start, end)
+            if result:
+                self.latency.record(key, time.perf_counter() - call_started)
+            # inner.last_timings는 호출한 스레드 기준이므로 여기서 함께 넘김
+            timings = dict(self.inner.last_timings)
+            if self.limiter is not None and timings.get('fallback_symbols'):
+                # inner가 따로 보낸 개별 조회도 요청으로 셈 (다음 호출이 그만큼 더 기다림)
+                self.limiter.reserve(len(timings['fallback_symbols']))
+            return result, timings
+
+        if self.limiter is not None:
+            self.limiter.acquire(len(tickers))
+        deadline = time.monotonic() + self.timeout
+        pending = {self._call_executor.submit(call)}
+
+        # 평소 p95보다 늦으면 같은 요청을 한 번 더 보냄 (동시 요청이 가능한 소스만)
+        hedge_after = None
+        if self.inner.concurrent_requests:
+            hedge_after = self.latency.percentile(key, self.hedge_percentile)
+        if hedge_after is not None and hedge_after < self.timeout:
+            done, _ = wait(pending, timeout=hedge_after)
+            if not done:
+                self._count(stats, 'hedged')
+                if self.limiter is not None:
+                    self.limiter.acquire(len(tickers))
+                pending.add(self._call_executor.submit(call))
+
+        answered = None
+        while pending:
+            done, pending = wait(pending, timeout=max(0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                if answered is not None:
+                    return answered
+                self._count(stats, 'timeouts')
+                return None, {}
+            for future in done:
+                if future.exception() is None:
+                    if future.result()[0]:
+                        return future.result()
+                    answered = ({}, future.result()[1])
+
+        return answered or (None, {})
+
+
+# 테스트
+if __name__ == "__main__":
+    from market_data_sources import MockSource
+
+    class FlakySource(MockSource):
+        """처음 몇 번은 실패하고 가끔 느린 소스"""
+
+        def __init__(self):
+            super().__init__(seed=1)
+            self.calls = 0
+
+        def fetch_history(self, tickers, start, end=None):
+            self.calls += 1
+            if self.calls <= 2:
+                raise ConnectionError("일시적 오류")
+            if random.random() < 0.1:
+                time.sleep(0.5)
+            return super().fetch_history(tickers, start, end)
+
+    source = ResilientSource(FlakySource(), base_delay=0.05, timeout=2)
+    source.latency.min_samples = 3
+    tickers = ['^GSPC', '^IXIC', '^DJI', '^VIX']
+
+    for run in range(20):
+        histories = source.fetch_history(tickers, date.today().replace(day=1))
+        print(f"실행 {run + 1}: {len(histories)}/{len(tickers)}개 수신 {source.last_timings}")
@@ -0,0 +1,182 @@
+# indicators.py
+# Phase 2: 누적 일봉 기반 증분 지표 엔진 (이동평균 / 실현 변동성 / z-score / 백분위 / 고점 대비 낙폭)
+
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+
+class RollingIndicatorEngine:
+    """
+    종목별 롤링 지표를 새 일봉마다 증분 갱신
+
+    - 모든 종목을 한 배열로 다루므로 update() 한 번에 전체 종목이 갱신됨
+    - 이동평균/변동성/z-score는 창에서 빠지는 값을 빼고 새 값을 더하는 누적합으로 O(1)
+    - 백분위는 창 안의 값과 비교하는 벡터 연산 (창 길이에 비례)
+    - 낙폭은 엔진이 본 최고가 기준
+    """
+
+    def __init__(self, symbols: List[str], ma_windows=(5, 20, 60), vol_window: int = 20,
+                 z_window: int = 60, percentile_window: int = 252):
+        """
+        Args:
+            symbols: 종목 이름 목록 (update()에 넘기는 배열 순서)
+            ma_windows: 이동평균 기간 (거래일)
+            vol_window: 실현 변동성 기간
+            z_window: z-score 기간
+            percentile_window: 백분위 기간
+        """
+        self.symbols = list(symbols)
+        self.ma_windows = tuple(ma_windows)
+        self.vol_window = vol_window
+        self.z_window = z_window
+        self.percentile_window = percentile_window
+        self.last_date = None
+
+        n = len(self.symbols)
+        self._size = max(max(self.ma_windows), z_window, percentile_window, vol_window + 1)
+        self._buffer = np.full((self._size, n), np.nan)
+        self._count = np.zeros(n, dtype=np.int64)
+        self._cols = np.arange(n)
+
+        self._ma_sum = {w: np.zeros(n) for w in self.ma_windows}
+        self._ret_sum = np.zeros(n)
+        self._ret_sumsq = np.zeros(n)
+        self._z_sum = np.zeros(n)
+        self._z_sumsq = np.zeros(n)
+        self._high = np.full(n, np.nan)
+        self._last = np.full(n, np.nan)
+        self._percentile = np.full(n, np.nan)
+
+    def _ago(self, k: int, cols: np.ndarray) -> np.ndarray:
+        """k 거래일 전 종가 (해당 종목이 아직 k일을 채우지 못했으면 NaN)"""
+        count = self._count[cols]
+        values = self._buffer[(count - k) % self._size, cols]
+        return np.where(count >= k, values, np.nan)
+
+    def update(self, closes, bar_date=None):
+        """
+        새 일봉 하나 반영
+
+        Args:
+            closes: 종목 순서대로 정렬된 종가 배열 (휴장 등으로 없으면 NaN → 해당 종목 갱신 생략)
+            bar_date: 일봉 날짜 (증분 갱신 기준으로 기록)
+        """
+        x_all = np.asarray(closes, dtype='f8')
+        cols = self._cols[~np.isnan(x_all)]
+        x = x_all[cols]
+
+        # 이동평균 누적합: 창에서 빠지는 값 제거 + 새 값 추가
+        for w, total in self._ma_sum.items():
+            total[cols] += x - np.nan_to_num(self._ago(w, cols))
+
+        # 로그 수익률 누적합 (변동성)
+        prev = self._ago(1, cols)
+        ret_new = np.nan_to_num(np.log(x / prev))
+        ret_old = np.nan_to_num(np.log(self._ago(self.vol_window, cols) / self._ago(self.vol_window + 1, cols)))
+        self._ret_sum[cols] += ret_new - ret_old
+        self._ret_sumsq[cols] += ret_new ** 2 - ret_old ** 2
+
+        # 종가 누적합 (z-score)
+        z_old = np.nan_to_num(self._ago(self.z_window, cols))
+        self._z_sum[cols] += x - z_old
+        self._z_sumsq[cols] += x ** 2 - z_old ** 2
+
+        # 백분위: 새 값 포함 최근 percentile_window개와 비교
+        count = self._count[cols]
+        ages = (count[None, :] - 1 - np.arange(self._size)[:, None]) % self._size
+        window = self._buffer[:, cols]
+        in_window = (ages < np.minimum(count, self.percentile_window - 1)[None, :]) & ~np.isnan(window)
+        below = ((window < x[None, :]) & in_window).sum(axis=0)
+        self._percentile[cols] = (below + 0.5) / (in_window.sum(axis=0) + 1) * 100
+
+        self._high[cols] = np.fmax(self._high[cols], x)
+        self._last[cols] = x
+        self._buffer[count % self._size, cols] = x
+        self._count[cols] += 1
+
+        if bar_date is not None:
+            self.last_date = pd.Timestamp(bar_date)
+
+    def warm_up(self, close: pd.DataFrame):
+        """
+        과거 종가 행렬로 상태 채우기 (이미 반영한 날짜는 건너뜀)
+
+        Args:
+            close: 날짜 × 종목 이름 종가 DataFrame
+        """
+        close = close.reindex(columns=self.symbols).sort_index()
+        if self.last_date is not None:
+            close = close[close.index > self.last_date]
+
+        for bar_date, row in zip(close.index, close.to_numpy(dtype='f8')):
+            self.update(row, bar_date)
+
+    def values(self) -> Dict[str, np.ndarray]:
+        """전체 종목 지표 배열 (데이터가 부족하면 NaN)"""
+        count = self._count
+        result = {}
+
+        for w, total in self._ma_sum.items():
+            result[f'ma_{w}'] = np.where(count >= w, total / w, np.nan)
+
+        n_ret = np.minimum(count - 1, self.vol_window)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            ret_mean = self._ret_sum / n_ret
+            ret_var = self._ret_sumsq / n_ret - ret_mean ** 2
+            result['realized_vol'] = np.where(
+                n_ret >= self.vol_window, np.sqrt(np.maximum(ret_var, 0) * 252) * 100, np.nan
+            )
+
+            z_mean = self._z_sum / self.z_window
+            z_std = np.sqrt(np.maximum(self._z_sumsq / self.z_window - z_mean ** 2, 0))
+            result['zscore'] = np.where(
+                (count >= self.z_window) & (z_std > 0), (self._last - z_mean) / z_std, np.nan
+            )
+
+        result['percentile'] = self._percentile.copy()
+        result['drawdown_pct'] = (self._last / self._high - 1) * 100
+
+        return result
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """
+        종목 이름별 지표
+
+        Returns:
+            {이름: {'ma_5', 'ma_20', 'ma_60', 'realized_vol', 'zscore', 'percentile', 'drawdown_pct'}}
+            값이 없는 지표는 빠짐
+        """
+        values = self.values()
+        return {
+            name: {
+                key: round(float(array[i]), 2)
+                for key, array in values.items() if not np.isnan(array[i])
+            }
+            for i, name in enumerate(self.symbols)
+        }
+
+
+# 테스트
+if __name__ == "__main__":
+    import time
+    from synthetic_market import SyntheticMarketGenerator
+
+    sample = SyntheticMarketGenerator(seed=7).generate(2520)
+    close = pd.DataFrame(sample['close'], index=pd.DatetimeIndex(sample['dates']), columns=sample['names'])
+
+    engine = RollingIndicatorEngine(sample['names'])
+    started = time.perf_counter()
+    engine.warm_up(close)
+    elapsed = time.perf_counter() - started
+    print(f"=== {len(close):,}거래일 × {len(sample['names'])}종목 증분 갱신: {elapsed * 1000:.0f}ms ===\n")
+
+    # 전체 재계산 결과와 비교
+    ma_20 = close.iloc[-20:].mean()
+    vix = close['VIX']
+    vix_z = (vix.iloc[-1] - vix.iloc[-60:].mean()) / vix.iloc[-60:].std(ddof=0)
+
+    for name, values in engine.snapshot().items():
+        print(f"{name}: {values}")
+    print(f"\n검증 MA20 S&P 500: {ma_20['S&P 500']:.2f} / VIX z-score: {vix_z:.2f}")
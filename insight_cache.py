@@ -0,0 +1,221 @@
+# insight_cache.py
+# Phase 2: AI 인사이트 캐시 (양자화한 시장 상태 해시 키 + LRU/TTL + 디스크 저장)
+
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+# 기본 캐시 파일
+DEFAULT_CACHE_PATH = os.path.join(os.getenv('MAMOORI_DATA_DIR', 'data'), 'insight_cache.json')
+
+# 키에 넣는 등락률 (핵심 지수만 — 관심 종목 전체를 넣으면 매일 키가 달라짐, VIX는 수준으로 따로)
+KEY_INDICES = ('S&P 500', 'NASDAQ', 'DOW')
+
+
+def _bucket(value, step: float) -> Optional[float]:
+    """step 단위로 반올림 (-0.0은 0.0으로)"""
+    if value is None:
+        return None
+    return round(round(float(value) / step) * step, 6) + 0.0
+
+
+def quantize_market_state(us_market_data: Dict, korea_impact: Dict, indicators: Dict = None,
+                          change_step: float = 0.5, vix_step: float = 5.0, zscore_step: float = 1.0,
+                          drawdown_step: float = 5.0) -> Dict:
+    """
+    인사이트 입력 → 정규화한 시장 상태
+
+    핵심 지수(KEY_INDICES) 등락률은 change_step 단위로 반올림하고 VIX는 등락률 대신 수준을
+    vix_step 구간(규칙표의 15/20/25 경계)으로 묶어 'NASDAQ +0.4 / S&P +0.3 / VIX 15'처럼
+    사실상 같은 날이 같은 상태가 되게 한다. 한국 쪽은 대표 섹터·심리·트리거·주목 종목 이름만 본다.
+
+    Args:
+        indicators: 롤링 지표 — 규칙표가 읽는 VIX zscore(zscore_step 내림, 'z >= 2' 경계)와
+            S&P 500 drawdown_pct(drawdown_step 올림, '<= -10' 경계)만 쓴다.
+            이동평균 같은 가격 수준은 매일 달라지므로 넣지 않음
+    """
+    market = {}
+    for name in KEY_INDICES:
+        data = us_market_data.get(name)
+        if data and data.get('change_pct') is not None:
+            market[name] = _bucket(data['change_pct'], change_step)
+    vix = (us_market_data.get('VIX') or {}).get('price')
+
+    state = {
+        'market': market,
+        'vix_level': math.floor(vix / vix_step) * vix_step if vix is not None and math.isfinite(vix) else None,
+        'korea': {
+            'sentiment': korea_impact.get('sentiment'),
+            'primary_sector': korea_impact.get('primary_sector'),
+            'trigger_index': korea_impact.get('trigger_index'),
+            'trigger_change': _bucket(korea_impact.get('trigger_change'), change_step),
+            'top_stocks': [stock.get('name') for stock in korea_impact.get('top_stocks', [])[:3]]
+        }
+    }
+
+    if indicators:
+        vix_z = (indicators.get('VIX') or {}).get('zscore')
+        drawdown = (indicators.get('S&P 500') or {}).get('drawdown_pct')
+        state['indicators'] = {
+            'vix_z': math.floor(vix_z / zscore_step) * zscore_step + 0.0 if _finite(vix_z) else None,
+            'sp500_drawdown': math.ceil(drawdown / drawdown_step) * drawdown_step + 0.0 if _finite(drawdown) else None
+        }
+
+    return state
+
+
+def _finite(value) -> bool:
+    return isinstance(value, (int, float)) and math.isfinite(value)
+
+
+def cache_key(state: Dict, namespace: str = '') -> str:
+    """정규화한 상태 → sha256 (키 순서와 무관한 JSON 직렬화)"""
+    canonical = json.dumps([namespace, state], sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class InsightCache:
+    """
+    인사이트 LRU 캐시 (TTL 만료 + JSON 파일 저장, 스레드 안전)
+
+    조회하면 가장 최근 항목으로 옮기고, max_entries를 넘으면 가장 오래 안 쓴 항목부터 뺀다.
+    ttl보다 오래된 항목은 조회 시점에 만료로 처리한다.
+    """
+
+    def __init__(self, path: str = None, max_entries: int = 512, ttl: float = 14 * 86400,
+                 autosave: bool = True):
+        """
+        Args:
+            path: 캐시 파일 (None이면 MAMOORI_DATA_DIR/insight_cache.json, False면 메모리만)
+            max_entries: 최대 항목 수
+            ttl: 항목 유효 기간 (초)
+            autosave: put()마다 파일에 저장
+        """
+        self.path = DEFAULT_CACHE_PATH if path is None else path or None
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.autosave = autosave
+        self.metrics = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if self.path:
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Dict]:
+        """유효한 인사이트 (없거나 만료되면 None)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry['created'] > self.ttl:
+                del self._entries[key]
+                self.metrics['expired'] += 1
+                entry = None
+            if entry is None:
+                self.metrics['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.metrics['hits'] += 1
+            return entry['insight']
+
+    def put(self, key: str, insight: Dict):
+        with self._lock:
+            self._entries[key] = {'created': time.time(), 'insight': insight}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.metrics['evictions'] += 1
+        if self.autosave:
+            self.save()
+
+    def stats(self) -> Dict:
+        """적중/미적중 수와 적중률"""
+        with self._lock:
+            lookups = self.metrics['hits'] + self.metrics['misses']
+            return {
+                **self.metrics,
+                'entries': len(self._entries),
+                'hit_rate': self.metrics['hits'] / lookups if lookups else None
+            }
+
+    def load(self):
+        """파일에서 복원 (만료 항목 제외, 파일이 없거나 깨졌으면 빈 캐시)"""
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                entries = json.load(f)['entries']
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error loading insight cache: {e}")
+            return
+
+        now = time.time()
+        with self._lock:
+            self._entries = OrderedDict(
+                (key, entry) for key, entry in entries if now - entry['created'] <= self.ttl
+            )
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def save(self):
+        """임시 파일에 쓴 뒤 교체 (LRU 순서 유지)"""
+        if not self.path:
+            return
+        with self._lock:
+            entries = list(self._entries.items())
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.{threading.get_ident()}.tmp"  # 동시 저장끼리 임시 파일 공유 방지
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'entries': entries}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+# 테스트
+if __name__ == "__main__":
+    import tempfile
+
+    korea = {'sentiment': 'positive', 'primary_sector': '반도체', 'trigger_index': 'NASDAQ',
+             'trigger_change': 0.4, 'top_stocks': [{'name': '삼성전자'}, {'name': 'SK하이닉스'}]}
+    monday = {'NASDAQ': {'change_pct': 0.42, 'price': 18000}, 'S&P 500': {'change_pct': 0.31, 'price': 5800},
+              'VIX': {'change_pct': -1.0, 'price': 15.2}}
+    thursday = {'NASDAQ': {'change_pct': 0.38, 'price': 18300}, 'S&P 500': {'change_pct': 0.27, 'price': 5850},
+                'VIX': {'change_pct': 2.0, 'price': 16.1}}
+    crash = {'NASDAQ': {'change_pct': -3.1, 'price': 17000}, 'S&P 500': {'change_pct': -2.2, 'price': 5600},
+             'VIX': {'change_pct': 30.0, 'price': 24.0}}
+
+    keys = {name: cache_key(quantize_market_state(data, korea))
+            for name, data in (('월', monday), ('목', thursday), ('급락', crash))}
+    print(f"=== 키: 월 == 목 {keys['월'] == keys['목']}, 월 == 급락 {keys['월'] == keys['급락']} ===")
+
+    # update_indicators() 형태의 지표를 함께 넘겨도 (이동평균·비핵심 종목은 매일 달라짐) 같은 키
+    def indicators(sp500_ma, vix_z, drawdown):
+        return {
+            'S&P 500': {'ma_5': sp500_ma, 'ma_20': sp500_ma - 40, 'ma_60': sp500_ma - 90, 'realized_vol': 12.4,
+                        'zscore': 0.8, 'percentile': 71.0, 'drawdown_pct': drawdown},
+            'VIX': {'ma_5': 15.8, 'ma_20': 16.3, 'ma_60': 17.1, 'realized_vol': 80.2,
+                    'zscore': vix_z, 'percentile': 30.0, 'drawdown_pct': -40.0},
+            'XLK': {'ma_5': sp500_ma / 25, 'ma_20': sp500_ma / 26, 'ma_60': sp500_ma / 27, 'realized_vol': 18.0,
+                    'zscore': vix_z * 2, 'percentile': 64.0, 'drawdown_pct': drawdown * 2}
+        }
+
+    with_indicators = {
+        '월': cache_key(quantize_market_state(monday, korea, indicators(5809.0, -0.6, -1.2))),
+        '목': cache_key(quantize_market_state(thursday, korea, indicators(5750.0, -0.2, -2.3))),
+        'VIX 급등': cache_key(quantize_market_state(thursday, korea, indicators(5750.0, 2.4, -2.3)))
+    }
+    print(f"지표 포함: 월 == 목 {with_indicators['월'] == with_indicators['목']}, "
+          f"월 == VIX 급등 {with_indicators['월'] == with_indicators['VIX 급등']}")
+
+    path = os.path.join(tempfile.mkdtemp(), 'insight_cache.json')
+    cache = InsightCache(path, max_entries=2)
+    cache.put(keys['월'], {'insight': '월요일 인사이트'})
+    print(f"목요일 조회: {cache.get(keys['목'])}, 급락 조회: {cache.get(keys['급락'])}")
+
+    reopened = InsightCache(path)
+    print(f"재시작 후 {len(reopened)}개 복원: {reopened.get(keys['목'])} / {cache.stats()}")
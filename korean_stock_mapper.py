@@ -1,67 +1,71 @@
 # korean_stock_mapper.py
 # Phase 1 Day 2: 한국 관련주 매핑 및 영향 분석
 
+import heapq
 from typing import Dict, List, Tuple
 
+import numpy as np
+
+from report_templates import Template
+from stock_universe import StockUniverse, UniverseWatcher
+from supply_chain import load_supply_chain
+
+# 한국 시장 섹션 템플릿
+KOREA_SECTION = Template("""
+🇰🇷 **한국 시장 영향 예측**
+━━━━━━━━━━━━━━━━━━━━━━
+
+{analysis}
+
+{% if top_stocks %}
+📌 **주목 관련주 TOP 3**
+{% for i, stock in top_stocks %}
+{i}. {stock.direction|direction} **{stock.name}** ({stock.sector})
+{% endfor %}
+{% endif %}
+
+━━━━━━━━━━━━━━━━━━━━━━
+""")
+
 class KoreanStockMapper:
     """미국 시장 동향 기반 한국 관련주 분석"""
     
-    def __init__(self):
-        # 섹터별 한국 관련주 매핑
-        self.sector_mapping = {
-            'tech_semiconductor': {
-                'name': '반도체',
-                'stocks': [
-                    {'name': '삼성전자', 'code': '005930', 'weight': 1.0},
-                    {'name': 'SK하이닉스', 'code': '000660', 'weight': 0.9},
-                ],
-                'us_trigger': 'NASDAQ',
-                'threshold': 1.0,  # 1% 이상 등락
-                'keywords': ['반도체', 'AI', '메모리', '칩']
-            },
-            'tech_platform': {
-                'name': 'IT플랫폼',
-                'stocks': [
-                    {'name': '네이버', 'code': '035420', 'weight': 1.0},
-                    {'name': '카카오', 'code': '035720', 'weight': 0.8},
-                ],
-                'us_trigger': 'NASDAQ',
-                'threshold': 1.5,
-                'keywords': ['빅테크', '플랫폼', 'AI']
-            },
-            'energy': {
-                'name': '에너지',
-                'stocks': [
-                    {'name': 'SK이노베이션', 'code': '096770', 'weight': 1.0},
-                    {'name': 'S-Oil', 'code': '010950', 'weight': 0.9},
-                    {'name': '한국전력', 'code': '015760', 'weight': 0.7},
-                ],
-                'us_trigger': 'S&P 500',
-                'threshold': 1.2,
-                'keywords': ['유가', '에너지', '전력']
-            },
-            'auto': {
-                'name': '자동차',
-                'stocks': [
-                    {'name': '현대차', 'code': '005380', 'weight': 1.0},
-                    {'name': '기아', 'code': '000270', 'weight': 0.9},
-                    {'name': 'LG에너지솔루션', 'code': '373220', 'weight': 0.85},
-                ],
-                'us_trigger': 'DOW',
-                'threshold': 1.0,
-                'keywords': ['전기차', 'EV', '배터리']
-            },
-            'steel_chemical': {
-                'name': '철강/화학',
-                'stocks': [
-                    {'name': 'POSCO홀딩스', 'code': '005490', 'weight': 1.0},
-                    {'name': 'LG화학', 'code': '051910', 'weight': 0.9},
-                ],
-                'us_trigger': 'DOW',
-                'threshold': 1.2,
-                'keywords': ['원자재', '철강', '화학']
-            }
-        }
+    def __init__(self, universe_path: str = None, check_interval: float = 5.0, beta_matrix=None,
+                 min_expected_move: float = 0.3, supply_chain=None, exposure_weight: float = 0.5,
+                 min_exposure: float = 0.5, universe: StockUniverse = None):
+        """
+        Args:
+            universe_path: 섹터/종목 유니버스 파일 (None이면 korea_universe.json 또는 MAMOORI_UNIVERSE)
+            check_interval: 유니버스 파일 변경 확인 간격 (초)
+            beta_matrix: StreamingBetaMatrix (있으면 규칙표 대신 추정 계수로 종목 점수 계산)
+            min_expected_move: 베타 기반 분석에서 이보다 작은 섹터 예상 등락률(%)은 중립으로 봄
+            supply_chain: SupplyChainGraph (None이면 supply_chain.json 로드, False면 사용 안 함)
+            exposure_weight: 공급망 노출(%)을 종목 점수에 더할 때의 배율
+            min_exposure: 상위 섹터 밖 종목을 공급망 노출만으로 후보에 올릴 최소 노출(%)
+            universe: 고정 유니버스 (지정하면 파일을 읽거나 감시하지 않음)
+        """
+        # 섹터별 한국 관련주 매핑 (파일이 바뀌면 다음 분석부터 자동 반영)
+        self.universe_watcher = UniverseWatcher(universe_path, check_interval=check_interval, universe=universe)
+        
+        # 미국 → 한국 계수 행렬 (None이면 섹터별 임계값 규칙 사용)
+        self.beta_matrix = beta_matrix
+        self.min_expected_move = min_expected_move
+        
+        # 미국 기업/테마 → 한국 공급사·고객사·경쟁사 그래프 (2차 노출)
+        if supply_chain is None:
+            supply_chain = load_supply_chain()
+        self.supply_chain = supply_chain or None
+        self.exposure_weight = exposure_weight
+        self.min_exposure = min_exposure
+    
+    @property
+    def universe(self) -> StockUniverse:
+        return self.universe_watcher.current()
+    
+    @property
+    def sector_mapping(self) -> Dict:
+        """기존 중첩 dict 형태의 섹터 매핑 (읽기 전용 사본)"""
+        return self.universe.to_mapping()
     
     def analyze_korea_impact(self, us_market_data: Dict) -> Dict:
         """
@@ -85,13 +89,19 @@ class KoreanStockMapper:
         if not us_market_data:
             return self._empty_analysis()
         
-        # 각 섹터별 영향도 계산
-        sector_impacts = []
+        # 분석 도중 재로드되어도 같은 유니버스를 쓰도록 한 번만 가져옴
+        universe = self.universe
         
-        for sector_key, sector_info in self.sector_mapping.items():
-            trigger_index = sector_info['us_trigger']
-            threshold = sector_info['threshold']
-            
+        # 추정 계수가 있으면 오늘 미국 등락률 벡터 × 계수 행렬로 점수 계산
+        if self.beta_matrix is not None:
+            beta_analysis = self._beta_analysis(us_market_data, universe)
+            if beta_analysis is not None:
+                return beta_analysis
+        
+        # 발동된 섹터만 역색인으로 찾기: (영향도, -순번, 지수, 등락률)
+        candidates = []
+        
+        for trigger_index in universe.trigger_index:
             # 해당 미국 지수 데이터 가져오기
             trigger_data = us_market_data.get(trigger_index)
             if not trigger_data:
@@ -99,33 +109,32 @@ class KoreanStockMapper:
             
             change_pct = trigger_data.get('change_pct', 0)
             
-            # 임계값 초과 여부 확인
-            if abs(change_pct) >= threshold:
-                impact_score = abs(change_pct) / threshold
-                direction = 'positive' if change_pct > 0 else 'negative'
-                
-                sector_impacts.append({
-                    'sector_key': sector_key,
-                    'sector_name': sector_info['name'],
-                    'impact_score': impact_score,
-                    'direction': direction,
-                    'trigger_index': trigger_index,
-                    'change_pct': change_pct,
-                    'stocks': sector_info['stocks'],
-                    'keywords': sector_info['keywords']
-                })
-        
-        # 영향도 순으로 정렬
-        sector_impacts.sort(key=lambda x: x['impact_score'], reverse=True)
+            # 임계값 <= |등락률| 인 섹터
+            for threshold, ordinal in universe.triggered(trigger_index, change_pct):
+                candidates.append((abs(change_pct) / threshold, -ordinal, trigger_index, change_pct))
         
-        if not sector_impacts:
+        if not candidates:
             return self._neutral_analysis(us_market_data)
         
+        # 영향도 상위 2개 섹터만 선택 (동점이면 유니버스 파일 순서 우선)
+        sector_impacts = []
+        for impact_score, neg_ordinal, trigger_index, change_pct in heapq.nlargest(2, candidates):
+            sector_impacts.append({
+                'sector_index': -neg_ordinal,
+                'sector_key': universe.sector_keys[-neg_ordinal],
+                'sector_name': universe.sector_names[-neg_ordinal],
+                'impact_score': impact_score,
+                'direction': 'positive' if change_pct > 0 else 'negative',
+                'trigger_index': trigger_index,
+                'change_pct': change_pct,
+                'keywords': list(universe.sector_keywords[-neg_ordinal])
+            })
+        
         # 가장 큰 영향을 받은 섹터 선택
         primary_sector = sector_impacts[0]
         
         # Top 3 관련주 선정
-        top_stocks = self._select_top_stocks(sector_impacts[:2])  # 상위 2개 섹터에서 선정
+        top_stocks = self._select_top_stocks(sector_impacts, universe, us_market_data)  # 상위 2개 섹터에서 선정
         
         # 분석 텍스트 생성
         analysis_text = self._generate_analysis(primary_sector, us_market_data)
@@ -139,25 +148,231 @@ class KoreanStockMapper:
             'trigger_change': primary_sector['change_pct']
         }
     
-    def _select_top_stocks(self, top_sectors: List[Dict]) -> List[Dict]:
-        """상위 섹터에서 가중치 기반으로 Top 3 종목 선정"""
-        all_stocks = []
-        
-        for sector in top_sectors:
-            for stock in sector['stocks']:
-                all_stocks.append({
-                    'name': stock['name'],
-                    'code': stock['code'],
+    def stock_impact_scores(self, us_market_data: Dict, universe: StockUniverse = None) -> np.ndarray:
+        """
+        유니버스 전 종목의 부호 있는 영향 점수 (구독자 포트폴리오 평가용)
+        
+        - 계수 행렬이 있으면 예상 등락률 % (추정 안 된 종목은 0)
+        - 없으면 발동된 모든 섹터의 (영향도 × 가중치) × 방향
+          (상위 2개 섹터로 제한하지 않는다는 점 외에는 _select_top_stocks 점수와 같음)
+        - 두 경우 모두 공급망 노출 × exposure_weight를 더함
+        
+        Returns:
+            (len(universe),) universe.stock_codes 순서
+        """
+        universe = universe or self.universe
+        scores = np.zeros(len(universe))
+        if not us_market_data:
+            return scores
+        
+        moves = self.beta_matrix.expected_moves(us_market_data) if self.beta_matrix is not None else {}
+        if any(code in moves for code in universe.stock_codes):
+            for code, move in moves.items():
+                k = universe.code_index.get(code)
+                if k is not None:
+                    scores[k] = move
+        else:
+            for trigger_index in universe.trigger_index:
+                trigger_data = us_market_data.get(trigger_index)
+                if not trigger_data:
+                    continue
+                change_pct = trigger_data.get('change_pct', 0)
+                sign = 1.0 if change_pct > 0 else -1.0
+                for threshold, ordinal in universe.triggered(trigger_index, change_pct):
+                    stock_range = universe.sector_stocks(ordinal)
+                    scores[stock_range.start:stock_range.stop] = (
+                        sign * abs(change_pct) / threshold * universe.stock_weights[stock_range.start:stock_range.stop]
+                    )
+        
+        if self.supply_chain is not None:
+            for code, exposure in self.supply_chain.exposures(us_market_data, nodes=universe.stock_codes).items():
+                scores[universe.code_index[code]] += self.exposure_weight * exposure
+        
+        return scores
+    
+    def _select_top_stocks(self, top_sectors: List[Dict], universe: StockUniverse = None,
+                           us_market_data: Dict = None) -> List[Dict]:
+        """
+        상위 섹터에서 가중치 기반으로 Top 3 종목 선정
+        
+        공급망 그래프가 있으면 종목별 2차 노출을 점수에 반영한다.
+        - 상위 섹터 종목: 섹터 방향과 같은 쪽 노출은 가산, 반대쪽은 감산
+        - 그 밖의 종목: 노출이 min_exposure 이상이면 노출만으로 후보 (방향 = 노출 부호)
+        """
+        universe = universe or self.universe
+        
+        exposures = {}
+        if self.supply_chain is not None and us_market_data:
+            exposures = self.supply_chain.exposures(us_market_data, nodes=universe.stock_codes)
+        
+        # (점수, -순서, 섹터 번호, 종목 번호)만 모아 상위 3개 선택 (동점이면 먼저 나온 종목)
+        candidates = []
+        order = 0
+        in_sectors = set()
+        for s_idx, sector in enumerate(top_sectors):
+            sign = 1 if sector['direction'] == 'positive' else -1
+            stock_range = universe.sector_stocks(sector['sector_index'])
+            scores = sector['impact_score'] * universe.stock_weights[stock_range.start:stock_range.stop]
+            for k, score in zip(stock_range, scores.tolist()):
+                exposure = exposures.get(universe.stock_codes[k])
+                if exposure is not None:
+                    score += self.exposure_weight * exposure * sign
+                candidates.append((score, -order, s_idx, k))
+                in_sectors.add(k)
+                order += 1
+        
+        outside = sorted(
+            universe.code_index[code] for code, exposure in exposures.items()
+            if abs(exposure) >= self.min_exposure and universe.code_index[code] not in in_sectors
+        )
+        for k in outside:
+            candidates.append((self.exposure_weight * abs(exposures[universe.stock_codes[k]]), -order, -1, k))
+            order += 1
+        
+        top = heapq.nlargest(3, candidates)
+        
+        # 공급망 노출의 주 경로 (예: 엔비디아 → SK하이닉스)
+        sources = {}
+        if exposures:
+            exposed = [universe.stock_codes[k] for _, _, _, k in top if universe.stock_codes[k] in exposures]
+            sources = self.supply_chain.main_sources(us_market_data, exposed)
+        
+        top_stocks = []
+        for impact_score, _, s_idx, k in top:
+            code = universe.stock_codes[k]
+            if s_idx >= 0:
+                sector = top_sectors[s_idx]
+                stock = {
+                    'name': universe.stock_names[k],
+                    'code': code,
                     'sector': sector['sector_name'],
-                    'impact_score': sector['impact_score'] * stock['weight'],
+                    'impact_score': impact_score,
                     'direction': sector['direction'],
                     'keywords': sector['keywords']
-                })
+                }
+            else:
+                sector_index = universe.stock_sector[k]
+                stock = {
+                    'name': universe.stock_names[k],
+                    'code': code,
+                    'sector': universe.sector_names[sector_index],
+                    'impact_score': impact_score,
+                    'direction': 'positive' if exposures[code] > 0 else 'negative',
+                    'keywords': list(universe.sector_keywords[sector_index])
+                }
+            
+            if code in exposures:
+                stock['exposure'] = exposures[code]
+                stock['via'] = sources.get(code)
+            
+            top_stocks.append(stock)
+        
+        return top_stocks
+    
+    def _beta_analysis(self, us_market_data: Dict, universe: StockUniverse):
+        """
+        계수 행렬 기반 영향 분석
+        
+        종목 예상 등락률 = Σ(미국 지수 등락률 × 계수), 섹터는 유니버스 가중치로 평균한다.
+        유니버스 종목 중 추정된 종목이 없으면 None (규칙 기반으로 대체).
+        
+        관련주 점수에는 stock_impact_scores와 같이 공급망 노출 × exposure_weight를 더하고,
+        계수가 없는 종목도 노출이 min_exposure 이상이면 노출만으로 후보에 올린다.
+        """
+        names, contribution = self.beta_matrix.contributions(us_market_data)
+        if not names:
+            return None
+        
+        # 계수 행렬 열 → 유니버스 종목 번호
+        column = {code: j for j, code in enumerate(self.beta_matrix.kr_codes)}
+        pairs = [(k, column[code]) for k, code in enumerate(universe.stock_codes) if code in column]
+        if not pairs:
+            return None
+        
+        stocks = np.array([k for k, _ in pairs])
+        by_index = contribution[:, [j for _, j in pairs]]
+        expected = by_index.sum(axis=0)
+        known = ~np.isnan(expected)
+        if not known.any():
+            return None
+        stocks, by_index, expected = stocks[known], by_index[:, known], expected[known]
+        
+        # 섹터별 가중 평균 예상 등락률
+        sectors = universe.stock_sector[stocks]
+        weights = universe.stock_weights[stocks]
+        n_sectors = len(universe.sector_keys)
+        weight_sum = np.bincount(sectors, weights=weights, minlength=n_sectors)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            sector_move = np.bincount(sectors, weights=weights * expected, minlength=n_sectors) / weight_sum
+        
+        primary = int(np.nanargmax(np.abs(sector_move)))
+        primary_move = float(sector_move[primary])
+        if abs(primary_move) < self.min_expected_move:
+            return self._neutral_analysis(us_market_data)
+        
+        # 대표 섹터를 가장 크게 움직인 미국 지수
+        in_primary = sectors == primary
+        sector_contribution = (by_index[:, in_primary] * weights[in_primary]).sum(axis=1)
+        trigger_index = names[int(np.argmax(np.abs(sector_contribution)))]
+        trigger_change = us_market_data[trigger_index]['change_pct']
+        
+        primary_sector = {
+            'sector_name': universe.sector_names[primary],
+            'direction': 'positive' if primary_move > 0 else 'negative',
+            'trigger_index': trigger_index,
+            'change_pct': trigger_change,
+            'keywords': list(universe.sector_keywords[primary])
+        }
+        
+        # 종목 점수 = 예상 등락률 + 공급망 노출 × exposure_weight
+        moves = dict(zip(stocks.tolist(), expected.tolist()))
+        scores = dict(moves)
+        exposures = {}
+        if self.supply_chain is not None:
+            exposures = self.supply_chain.exposures(us_market_data, nodes=universe.stock_codes)
+        for code, exposure in exposures.items():
+            k = universe.code_index[code]
+            if k in scores:
+                scores[k] += self.exposure_weight * exposure
+            elif abs(exposure) >= self.min_exposure:
+                scores[k] = self.exposure_weight * exposure
+        
+        # 점수 절댓값 상위 3개 (동점이면 유니버스 순서)
+        top = heapq.nlargest(3, ((abs(score), -k, k) for k, score in scores.items()))
         
-        # 영향도 점수로 정렬
-        all_stocks.sort(key=lambda x: x['impact_score'], reverse=True)
+        # 공급망 노출의 주 경로 (예: 엔비디아 → SK하이닉스)
+        sources = {}
+        exposed = [universe.stock_codes[k] for _, _, k in top if universe.stock_codes[k] in exposures]
+        if exposed:
+            sources = self.supply_chain.main_sources(us_market_data, exposed)
         
-        return all_stocks[:3]
+        top_stocks = []
+        for impact_score, _, k in top:
+            code = universe.stock_codes[k]
+            stock = {
+                'name': universe.stock_names[k],
+                'code': code,
+                'sector': universe.sector_names[universe.stock_sector[k]],
+                'impact_score': impact_score,
+                'direction': 'positive' if scores[k] > 0 else 'negative',
+                'keywords': list(universe.sector_keywords[universe.stock_sector[k]])
+            }
+            if k in moves:
+                stock['expected_move'] = moves[k]
+            if code in exposures:
+                stock['exposure'] = exposures[code]
+                stock['via'] = sources.get(code)
+            top_stocks.append(stock)
+        
+        return {
+            'sentiment': primary_sector['direction'],
+            'primary_sector': primary_sector['sector_name'],
+            'top_stocks': top_stocks,
+            'analysis': self._generate_analysis(primary_sector, us_market_data),
+            'trigger_index': trigger_index,
+            'trigger_change': trigger_change,
+            'expected_move': primary_move
+        }
     
     def _generate_analysis(self, primary_sector: Dict, us_market_data: Dict) -> str:
         """분석 텍스트 자동 생성"""
@@ -176,7 +391,7 @@ class KoreanStockMapper:
         
         analysis = f"{trigger}의 {intensity} {direction}({change:+.2f}%)으로 국내 {sector_name} 섹터 "
         
-        if change > 0:
+        if primary_sector['direction'] == 'positive':
             analysis += "상승이 예상됩니다."
         else:
             analysis += "압박이 예상됩니다."
@@ -214,30 +429,17 @@ class KoreanStockMapper:
             'trigger_change': 0.0
         }
     
-    def format_korea_section(self, impact_analysis: Dict) -> str:
-        """한국 시장 섹션 포맷팅"""
+    def format_korea_section(self, impact_analysis: Dict, target: str = 'markdown') -> str:
+        """
+        한국 시장 섹션 포맷팅
+        
+        Args:
+            target: 출력 형식 ('markdown', 'markdownv2', 'html', 'plain')
+        """
         if impact_analysis['sentiment'] == 'unknown':
             return ""
         
-        section = """
-🇰🇷 **한국 시장 영향 예측**
-━━━━━━━━━━━━━━━━━━━━━━
-
-"""
-        
-        # 분석 내용
-        section += f"{impact_analysis['analysis']}\n\n"
-        
-        # Top 3 관련주
-        if impact_analysis['top_stocks']:
-            section += "📌 **주목 관련주 TOP 3**\n"
-            for i, stock in enumerate(impact_analysis['top_stocks'], 1):
-                emoji = "🟢" if stock.get('direction') == 'positive' else "🔴" if stock.get('direction') == 'negative' else "⚪"
-                section += f"{i}. {emoji} **{stock['name']}** ({stock['sector']})\n"
-        
-        section += "\n━━━━━━━━━━━━━━━━━━━━━━\n"
-        
-        return section
+        return KOREA_SECTION.render(impact_analysis, target)
 
 
 # 테스트 코드
@@ -262,3 +464,26 @@ if __name__ == "__main__":
     
     print("\n" + "="*50)
     print(mapper.format_korea_section(result))
+    
+    # 계수 행렬이 있어도 공급망 노출이 큰 종목은 관련주에 오름
+    # (SK하이닉스: 지수 계수 0 → 직접 영향 없음, 엔비디아 급등의 HBM 노출만 있음)
+    from beta_matrix import StreamingBetaMatrix
+    
+    codes = list(mapper.universe.stock_codes)
+    us_names = ['NASDAQ', 'S&P 500', 'DOW']
+    rng = np.random.default_rng(0)
+    us_returns = rng.standard_normal((250, len(us_names)))
+    true_coef = np.zeros((len(us_names), len(codes)))
+    true_coef[0] = 0.25
+    true_coef[0, codes.index('000660')] = 0.0
+    kr_returns = us_returns @ true_coef + 0.1 * rng.standard_normal((250, len(codes)))
+    
+    mapper.beta_matrix = StreamingBetaMatrix(us_names, codes)
+    mapper.beta_matrix.fit(us_returns, kr_returns)
+    
+    result = mapper.analyze_korea_impact({**test_data, '엔비디아': {'change_pct': 6.2}})
+    print("\n=== 계수 행렬 + 공급망 노출 ===")
+    for stock in result['top_stocks']:
+        print(f"  - {stock['name']} ({stock['sector']}) 점수 {stock['impact_score']:.2f}"
+              f" 예상 {stock.get('expected_move', 0):+.2f}% 노출 {stock.get('exposure', 0):+.2f}% ← {stock.get('via')}")
+    assert '000660' in [stock['code'] for stock in result['top_stocks']]
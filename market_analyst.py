@@ -1,21 +1,268 @@
 # market_analyst.py
 # Phase 1 Day 3: Claude API를 활용한 시장 분석 고도화
 
+import asyncio
+import copy
+import hashlib
 import json
 import os
-from typing import Dict, List
+import re
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from typing import Callable, Dict, Iterator, List
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from fetch_resilience import LatencyTracker
+from insight_cache import InsightCache, cache_key, quantize_market_state
+from report_templates import Template
+from sentiment_rules import load_rule_tables
+
+# Anthropic Messages API (환경변수 ANTHROPIC_BASE_URL로 로컬 대역 서버 지정 가능)
+DEFAULT_API_BASE = 'https://api.anthropic.com'
+ANTHROPIC_VERSION = '2023-06-01'
+DEFAULT_MODEL = 'claude-sonnet-4-5'
+
+# (연결, 읽기) 타임아웃 (초) — 스트리밍에서 읽기 타임아웃은 조각 사이 최대 대기
+DEFAULT_TIMEOUT = (3.05, 30.0)
+
+# 응답 형식 (InsightStreamParser가 읽는 4개 항목 제목)
+ANALYSIS_FORMAT = """
+다음 형식으로 분석해주세요:
+
+1. 핵심 인사이트 (2-3문장)
+2. 주요 포인트 3가지
+3. 주의사항 (1문장)
+4. 투자 시사점 2가지
+
+각 항목 제목을 한 줄로 쓰고, 포인트와 시사점은 '- '로 시작하는 한 줄씩 작성해주세요.
+객관적이고 실용적으로 작성해주세요.
+"""
+
+# 독자별 안내 (analyze_batch의 audience)
+AUDIENCE_GUIDES = {
+    'general': '',
+    'beginner': '투자를 막 시작한 독자를 위해 전문 용어는 쉬운 말로 풀고 문장을 짧게 써주세요.',
+    'trader': '단기 매매를 하는 독자를 위해 장 초반 갭, 변동성, 수급 등 당일 대응 관점을 중심으로 써주세요.',
+    'sector': '{sector} 섹터 채널 구독자를 위해 {sector} 관련 영향과 종목을 중심으로 써주세요.'
+}
+
+# 언어별 안내 (항목 제목은 파싱을 위해 한국어 유지)
+LANGUAGE_GUIDES = {
+    'ko': '',
+    'en': 'Write the content in English, but keep the four section headings in Korean exactly as listed.'
+}
+
+# 인사이트 섹션 템플릿
+INSIGHT_SECTION = Template("""
+💡 **Today's Insight**
+━━━━━━━━━━━━━━━━━━━━━━
+
+{insight}
+
+**📌 주요 포인트**
+{% for i, point in key_points %}
+{i}. {point}
+{% endfor %}
+
+**⚡ 주의사항**
+{risk_note}
+
+{% if action_items %}
+**🎯 투자 시사점**
+{% for item in action_items %}
+• {item}
+{% endfor %}
+{% endif %}
+
+━━━━━━━━━━━━━━━━━━━━━━
+""")
+
+# 프로세스 전체에서 공유하는 keep-alive 세션 (매일 같은 호스트로 TLS 재협상 없이)
+_session = None
+_session_lock = threading.Lock()
+
+# 지연 예산 안에서 기다리는 API 호출용 스레드 (예산이 지나도 호출은 끝까지 진행)
+_llm_executor = None
+
+
+def shared_session(pool_size: int = 8) -> requests.Session:
+    """연결 풀을 쓰는 공유 세션 (처음 호출할 때 생성)"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, max_retries=1)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _session = session
+        return _session
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _llm_executor
+    with _session_lock:
+        if _llm_executor is None:
+            _llm_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='claude')
+        return _llm_executor
+
+
+class ClaudeAPIError(Exception):
+    """API 오류 응답 또는 스트림 중 error 이벤트"""
+
+
+def iter_sse(lines: Iterator[bytes]) -> Iterator[tuple]:
+    """
+    Server-Sent Events 파싱
+
+    Args:
+        lines: 응답 줄 (response.iter_lines())
+
+    Yields:
+        (이벤트 이름, data 문자열)
+    """
+    name, data = None, []
+    for line in lines:
+        if not line:
+            if data:
+                yield name or 'message', '\n'.join(data)
+            name, data = None, []
+            continue
+        line = line.decode('utf-8') if isinstance(line, bytes) else line
+        if line.startswith(':'):
+            continue
+        field, _, value = line.partition(':')
+        value = value[1:] if value.startswith(' ') else value
+        if field == 'event':
+            name = value
+        elif field == 'data':
+            data.append(value)
+    if data:
+        yield name or 'message', '\n'.join(data)
+
+
+class InsightStreamParser:
+    """
+    스트리밍 응답 → 인사이트 dict (줄 단위로 바로 반영)
+
+    프롬프트의 4개 항목 제목(핵심 인사이트 / 주요 포인트 / 주의사항 / 투자 시사점)을
+    만나면 섹션을 바꾸고, 이후 줄은 해당 필드에 채운다.
+    한 섹션이 끝날 때마다 on_section(필드, 현재 결과)를 호출한다.
+    """
+
+    SECTIONS = (
+        ('insight', ('핵심 인사이트', '핵심인사이트')),
+        ('key_points', ('주요 포인트', '주요포인트')),
+        ('risk_note', ('주의사항', '주의 사항')),
+        ('action_items', ('투자 시사점', '투자시사점'))
+    )
+
+    # 줄 앞 장식(#, **, >)과 목록 표시(1. / 1) / - / • / ①)
+    _MARKUP = re.compile(r'^[\s#>*]*(?P<marker>\d+[.)]\s+|[-•·*]\s+|[\u2460-\u2473]\s*)?[\s*]*')
+    
+    # 제목 뒤의 형식 안내 ("3가지", "(2-3문장)")
+    _FORMAT_NOTE = re.compile(r'^\(?\s*\d+(?:\s*-\s*\d+)?\s*(?:가지|문장|개)\s*\)?$')
+
+    def __init__(self, on_section: Callable[[str, Dict], None] = None):
+        self.on_section = on_section
+        self.result = {'insight': '', 'key_points': [], 'risk_note': '', 'action_items': []}
+        self.section = None
+        self._buffer = ''
+
+    def feed(self, text: str):
+        """텍스트 조각 추가 (완성된 줄만 처리)"""
+        self._buffer += text
+        *lines, self._buffer = self._buffer.split('\n')
+        for line in lines:
+            self._line(line)
+
+    def close(self) -> Dict:
+        """남은 줄 처리 후 결과 반환"""
+        if self._buffer:
+            self._line(self._buffer)
+            self._buffer = ''
+        self._finish_section()
+        return self.result
+
+    def _finish_section(self):
+        if self.section and self.on_section:
+            self.on_section(self.section, self.result)
+
+    def _line(self, line: str):
+        match = self._MARKUP.match(line)
+        content = line[match.end():].replace('**', '').strip()
+        if not any(ch.isalnum() for ch in content):
+            return  # 빈 줄, 구분선
+
+        for field, titles in self.SECTIONS:
+            title = next((t for t in titles if content.startswith(t)), None)
+            if title is not None:
+                self._finish_section()
+                self.section = field
+                content = content[len(title):].lstrip(' :：-').strip()
+                if not content or self._FORMAT_NOTE.match(content):
+                    return
+                break
+
+        if self.section is None:
+            return
+        value = self.result[self.section]
+        if isinstance(value, list):
+            # 목록 표시가 없는 줄은 앞 항목의 이어지는 설명
+            if value and not match.group('marker'):
+                value[-1] = f"{value[-1]} {content}"
+            else:
+                value.append(content)
+        else:
+            self.result[self.section] = f"{value} {content}" if value else content
+
 
 class MarketAnalyst:
     """Claude API를 활용한 지능형 시장 분석"""
     
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, base_url: str = None, model: str = None,
+                 timeout: tuple = DEFAULT_TIMEOUT, max_tokens: int = 1024, session: requests.Session = None,
+                 cache: InsightCache = None):
         """
         Args:
             api_key: Anthropic API 키 (환경변수 ANTHROPIC_API_KEY 사용 가능)
+            base_url: API 주소 (환경변수 ANTHROPIC_BASE_URL, 기본 https://api.anthropic.com)
+            model: 모델 이름 (환경변수 ANTHROPIC_MODEL)
+            timeout: (연결, 읽기) 타임아웃 초
+            max_tokens: 응답 최대 토큰
+            session: HTTP 세션 (None이면 프로세스 공유 keep-alive 세션)
+            cache: 인사이트 캐시 (비슷한 시장 상태면 API 호출 없이 재사용)
         """
         self.api_key = api_key or os.getenv('ANTHROPIC_API_KEY')
         self.mock_mode = not self.api_key  # API 키 없으면 Mock 모드
         
+        # API 연결 설정
+        self.base_url = (base_url or os.getenv('ANTHROPIC_BASE_URL') or DEFAULT_API_BASE).rstrip('/')
+        self.model = model or os.getenv('ANTHROPIC_MODEL') or DEFAULT_MODEL
+        self.timeout = timeout
+        self.max_tokens = max_tokens
+        self.session = session or shared_session()
+        
+        # 마지막 API 호출의 토큰 사용량 / 지연 시간
+        self.last_call_metrics = {}
+        
+        # 양자화한 시장 상태 → 인사이트 (None이면 매번 호출)
+        self.cache = cache
+        
+        # 지연 예산 호출 통계: API 응답 시간 + 결과 출처별 횟수
+        self.latency = LatencyTracker(window=200, min_samples=1)
+        self.outcomes = Counter()
+        self.last_budget_result = {}
+        
+        # analyze_batch() 요청별 토큰 사용량 / 지연 시간
+        self.last_batch_metrics = {}
+        
+        # 규칙 기반 인사이트 규칙표 (sentiment_rules.json)
+        self.rules = load_rule_tables()
+        
         # 시장 분석 전문가 페르소나
         self.system_prompt = """당신은 20년 경력의 글로벌 투자 애널리스트입니다.
 
@@ -37,13 +284,14 @@ class MarketAnalyst:
 - 과도한 전문 용어
 """
     
-    def analyze_market(self, us_market_data: Dict, korea_impact: Dict) -> Dict:
+    def analyze_market(self, us_market_data: Dict, korea_impact: Dict, indicators: Dict = None) -> Dict:
         """
         시장 데이터를 종합 분석하여 인사이트 생성
         
         Args:
             us_market_data: 미국 시장 데이터
             korea_impact: 한국 영향 분석 결과
+            indicators: 롤링 지표 (MarketDataCollector.update_indicators() 결과)
             
         Returns:
             {
@@ -54,13 +302,350 @@ class MarketAnalyst:
             }
         """
         if self.mock_mode:
-            return self._generate_mock_insight(us_market_data, korea_impact)
+            return self._generate_mock_insight(us_market_data, korea_impact, indicators)
+        
+        # 사실상 같은 시장 상태의 인사이트가 있으면 재사용
+        key = None
+        if self.cache is not None:
+            key = self.cache_key(us_market_data, korea_impact, indicators)
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.last_call_metrics = {'model': self.model, 'cache_hit': True, 'fallback': False}
+                return copy.deepcopy(cached)
         
         # 실제 Claude API 호출
-        return self._call_claude_api(us_market_data, korea_impact)
+        insight = self._call_claude_api(us_market_data, korea_impact, indicators)
+        
+        # 규칙 기반 대체 결과는 저장하지 않음 (다음 재시도에서 다시 호출)
+        if key is not None and not self.last_call_metrics.get('fallback'):
+            self.cache.put(key, copy.deepcopy(insight))
+        return insight
+    
+    def analyze_market_within(self, us_market_data: Dict, korea_impact: Dict, indicators: Dict = None,
+                              budget: float = 15.0, on_upgrade: Callable[[Dict], None] = None) -> Dict:
+        """
+        지연 예산 안에서 인사이트 생성
+        
+        API 호출은 별도 스레드에서 시작하고, 그동안 규칙 기반 인사이트를 만들어 둔다.
+        budget초 안에 API 결과가 오면 그것을, 아니면 규칙 기반 결과를 바로 돌려준다.
+        늦게 도착한 API 결과는 on_upgrade(인사이트)로 넘겨 발송된 메시지를 고칠 수 있게 한다.
+        
+        Args:
+            budget: 기다릴 최대 시간 (초, 호출 시작 기준)
+            on_upgrade: 예산이 지난 뒤 API 결과가 오면 호출 (API 스레드에서 실행)
+            
+        Returns:
+            analyze_market()과 같은 형식 (last_budget_result에 출처와 대기 시간 기록)
+        """
+        started = time.perf_counter()
+        if self.mock_mode:
+            self._record_outcome('rules', started)
+            return self._generate_mock_insight(us_market_data, korea_impact, indicators)
+        
+        state = {'done': False, 'late': False}
+        state_lock = threading.Lock()
+        
+        def call():
+            insight = self.analyze_market(us_market_data, korea_impact, indicators)
+            metrics = dict(self.last_call_metrics)
+            if not metrics.get('cache_hit'):
+                self.latency.record('llm', time.perf_counter() - started)
+            
+            with state_lock:
+                state['done'] = True
+                late = state['late']
+            if late:
+                if metrics.get('fallback'):
+                    self.outcomes['late_failed'] += 1
+                else:
+                    self.outcomes['late_upgrade'] += 1
+                    if on_upgrade is not None:
+                        try:
+                            on_upgrade(insight)
+                        except Exception as e:
+                            print(f"Error upgrading insight: {e}")
+            return insight, metrics
+        
+        future = _executor().submit(call)
+        fallback = self._generate_mock_insight(us_market_data, korea_impact, indicators)
+        
+        try:
+            insight, metrics = future.result(timeout=max(0.0, budget - (time.perf_counter() - started)))
+        except TimeoutError:
+            # API 스레드가 결과를 확정하기 전이면 늦은 결과로 표시 (이후 on_upgrade로 전달)
+            with state_lock:
+                state['late'] = not state['done']
+            if state['late']:
+                self._record_outcome('timeout', started)
+                return fallback
+            try:
+                insight, metrics = future.result()
+            except Exception as e:
+                print(f"Error generating insight: {e}")
+                self._record_outcome('error', started)
+                return fallback
+        except Exception as e:
+            # API 스레드에서 난 예외도 발송을 막지 않도록 규칙 기반 결과로 대체
+            print(f"Error generating insight: {e}")
+            self._record_outcome('error', started)
+            return fallback
+        
+        if metrics.get('fallback'):
+            self._record_outcome('error', started)
+            return fallback
+        self._record_outcome('cache' if metrics.get('cache_hit') else 'llm', started)
+        return insight
+    
+    def _record_outcome(self, source: str, started: float):
+        self.outcomes[source] += 1
+        self.last_budget_result = {'source': source, 'waited': time.perf_counter() - started}
+    
+    def latency_stats(self) -> Dict:
+        """
+        지연 예산 호출 통계
+        
+        Returns:
+            {'calls', 'p50', 'p90', 'p99' (API 응답 시간 초), 'fallback_rate', 'outcomes'}
+        """
+        calls = sum(self.outcomes[key] for key in ('llm', 'cache', 'timeout', 'error', 'rules'))
+        fallbacks = self.outcomes['timeout'] + self.outcomes['error']
+        return {
+            'calls': calls,
+            'p50': self.latency.percentile('llm', 50),
+            'p90': self.latency.percentile('llm', 90),
+            'p99': self.latency.percentile('llm', 99),
+            'fallback_rate': fallbacks / calls if calls else None,
+            'outcomes': dict(self.outcomes)
+        }
+    
+    def analyze_batch(self, audience_requests: List[Dict], us_market_data: Dict, korea_impact: Dict,
+                      indicators: Dict = None, concurrency: int = 4, use_batch_api: bool = False,
+                      poll_interval: float = 5.0, batch_timeout: float = 3600.0) -> Dict[str, Dict]:
+        """
+        같은 날 여러 독자용 인사이트를 한 번에 생성
+        
+        시스템 프롬프트와 시장 데이터는 모든 요청에 같은 system 블록으로 보내고
+        (cache_control로 프롬프트 캐시 — 두 번째 요청부터 공통 부분은 캐시 읽기),
+        독자/포트폴리오/언어별 안내만 user 메시지로 다르게 보낸다.
+        
+        Args:
+            audience_requests: [{'id', 'audience', 'sector', 'portfolio', 'language'}, ...]
+                - audience: 'general' | 'beginner' | 'trader' | 'sector' (기본 'general')
+                - sector: audience가 'sector'일 때 섹터 이름 (기본 대표 섹터)
+                - portfolio: 보유 종목 이름 목록 또는 {이름: 비중}
+                - language: 'ko' | 'en' (기본 'ko')
+                - id: 결과 키 (기본 'audience:language:순번')
+            concurrency: 동시에 보낼 스트리밍 요청 수
+            use_batch_api: True면 메시지 배치 API로 한 번에 제출하고 끝날 때까지 폴링
+            poll_interval: 배치 상태 확인 간격 (초)
+            batch_timeout: 배치 대기 최대 시간 (초, 넘으면 남은 요청은 규칙 기반)
+            
+        Returns:
+            {요청 id: analyze_market()과 같은 형식} (요청별 지표는 last_batch_metrics)
+        """
+        return asyncio.run(self.analyze_batch_async(
+            audience_requests, us_market_data, korea_impact, indicators, concurrency=concurrency,
+            use_batch_api=use_batch_api, poll_interval=poll_interval, batch_timeout=batch_timeout
+        ))
     
-    def _generate_mock_insight(self, us_market_data: Dict, korea_impact: Dict) -> Dict:
+    async def analyze_batch_async(self, audience_requests: List[Dict], us_market_data: Dict, korea_impact: Dict,
+                                  indicators: Dict = None, concurrency: int = 4, use_batch_api: bool = False,
+                                  poll_interval: float = 5.0, batch_timeout: float = 3600.0) -> Dict[str, Dict]:
+        """analyze_batch()의 코루틴 버전 (이미 이벤트 루프 안에서 호출할 때)"""
+        requests_by_id = {}
+        for i, request in enumerate(audience_requests):
+            request = {
+                'audience': request.get('audience', 'general'),
+                'sector': request.get('sector') or korea_impact.get('primary_sector'),
+                'portfolio': request.get('portfolio'),
+                'language': request.get('language', 'ko'),
+                'id': request.get('id')
+            }
+            request_id = request.pop('id') or f"{request['audience']}:{request['language']}:{i}"
+            if request['audience'] != 'sector':
+                request['sector'] = None
+            requests_by_id[request_id] = request
+        
+        fallback = self._generate_mock_insight(us_market_data, korea_impact, indicators)
+        self.last_batch_metrics = {request_id: self._new_metrics() for request_id in requests_by_id}
+        if self.mock_mode:
+            return {request_id: copy.deepcopy(fallback) for request_id in requests_by_id}
+        
+        # 캐시에 있는 독자는 건너뜀
+        results, keys, pending = {}, {}, {}
+        for request_id, request in requests_by_id.items():
+            if self.cache is not None:
+                keys[request_id] = self.cache_key(us_market_data, korea_impact, indicators, variant=request)
+                cached = self.cache.get(keys[request_id])
+                if cached is not None:
+                    results[request_id] = copy.deepcopy(cached)
+                    self.last_batch_metrics[request_id].update(cache_hit=True, fallback=False)
+                    continue
+            pending[request_id] = request
+        
+        if pending:
+            system = [
+                {'type': 'text', 'text': self.system_prompt},
+                {'type': 'text', 'text': self._build_market_context(us_market_data, korea_impact, indicators),
+                 'cache_control': {'type': 'ephemeral'}}
+            ]
+            prompts = {request_id: self._build_audience_prompt(request) for request_id, request in pending.items()}
+            if use_batch_api:
+                parsed = await self._run_message_batch(system, prompts, poll_interval, batch_timeout)
+            else:
+                parsed = await self._run_concurrent(system, prompts, concurrency)
+            
+            for request_id in pending:
+                metrics = self.last_batch_metrics[request_id]
+                results[request_id] = self._complete_insight(parsed.get(request_id), fallback, metrics)
+                if request_id in keys and not metrics['fallback']:
+                    self.cache.put(keys[request_id], copy.deepcopy(results[request_id]))
+        
+        return {request_id: results[request_id] for request_id in requests_by_id}
+    
+    def _build_audience_prompt(self, request: Dict) -> str:
+        """독자/포트폴리오/언어별 user 메시지 (시장 데이터는 system 블록에 있음)"""
+        prompt = "위 시장 데이터를 바탕으로 분석해주세요.\n"
+        
+        guide = AUDIENCE_GUIDES.get(request['audience'], '')
+        if guide:
+            prompt += "\n【독자】\n" + guide.format(sector=request['sector']) + "\n"
+        
+        portfolio = request['portfolio']
+        if portfolio:
+            prompt += "\n【보유 종목】\n"
+            if isinstance(portfolio, dict):
+                prompt += "".join(f"- {name} ({weight:.0%})\n" for name, weight in portfolio.items())
+            else:
+                prompt += "".join(f"- {name}\n" for name in portfolio)
+            prompt += "보유 종목에 미칠 영향을 포인트에 반영해주세요.\n"
+        
+        prompt += ANALYSIS_FORMAT
+        
+        language = LANGUAGE_GUIDES.get(request['language'], '')
+        if language:
+            prompt += language + "\n"
+        
+        return prompt
+    
+    async def _run_concurrent(self, system: List[Dict], prompts: Dict[str, str], concurrency: int) -> Dict[str, Dict]:
+        """스트리밍 요청을 최대 concurrency개씩 동시에 (공유 keep-alive 세션)"""
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def run(request_id):
+            metrics = self.last_batch_metrics[request_id]
+            async with semaphore:
+                try:
+                    return await asyncio.to_thread(self._stream_message, prompts[request_id],
+                                                   system=system, metrics=metrics)
+                except (requests.exceptions.RequestException, ClaudeAPIError, ValueError) as e:
+                    print(f"Error calling Claude API ({request_id}): {e}")
+                    metrics['error'] = str(e)
+                    return None
+        
+        parsed = await asyncio.gather(*(run(request_id) for request_id in prompts))
+        return dict(zip(prompts, parsed))
+    
+    async def _run_message_batch(self, system: List[Dict], prompts: Dict[str, str], poll_interval: float,
+                                 batch_timeout: float) -> Dict[str, Dict]:
+        """
+        메시지 배치 API: 제출 → 끝날 때까지 폴링 → JSONL 결과 파싱
+        
+        custom_id는 API 형식 제한(영숫자, -, _) 때문에 순번으로 보내고 다시 요청 id로 바꾼다.
+        """
+        ids = list(prompts)
+        started = time.perf_counter()
+        url = f"{self.base_url}/v1/messages/batches"
+        headers = self._request_headers()
+        
+        def call(method, target, **kwargs):
+            response = self.session.request(method, target, headers=headers, timeout=self.timeout, **kwargs)
+            if response.status_code != 200:
+                raise ClaudeAPIError(f"HTTP {response.status_code}: {response.text[:200]}")
+            return response
+        
+        payload = {'requests': [
+            {'custom_id': f"req-{i}", 'params': {
+                'model': self.model,
+                'max_tokens': self.max_tokens,
+                'system': system,
+                'messages': [{'role': 'user', 'content': prompts[request_id]}]
+            }}
+            for i, request_id in enumerate(ids)
+        ]}
+        
+        try:
+            batch = (await asyncio.to_thread(call, 'POST', url, json=payload)).json()
+            while batch.get('processing_status') != 'ended':
+                if time.perf_counter() - started > batch_timeout:
+                    raise ClaudeAPIError(f"batch {batch.get('id')} not finished in {batch_timeout:.0f}s")
+                await asyncio.sleep(poll_interval)
+                batch = (await asyncio.to_thread(call, 'GET', f"{url}/{batch['id']}")).json()
+            
+            response = await asyncio.to_thread(call, 'GET', batch['results_url'])
+        except (requests.exceptions.RequestException, ClaudeAPIError, ValueError) as e:
+            print(f"Error running message batch: {e}")
+            for request_id in ids:
+                self.last_batch_metrics[request_id]['error'] = str(e)
+            return {}
+        
+        # 줄 하나가 깨져도 나머지 결과는 쓰고, 빠진 요청은 호출한 쪽에서 규칙 기반으로 대체
+        parsed = {}
+        for line in response.text.splitlines():
+            if not line.strip():
+                continue
+            request_id = None
+            try:
+                item = json.loads(line)
+                index = int(item['custom_id'].split('-')[1])
+                if not 0 <= index < len(ids):
+                    raise ValueError(f"unknown custom_id {item['custom_id']}")
+                request_id = ids[index]
+                metrics = self.last_batch_metrics[request_id]
+                metrics['total_time'] = time.perf_counter() - started
+                
+                result = item.get('result') or {}
+                if result.get('type') != 'succeeded':
+                    metrics['error'] = result.get('type')
+                    continue
+                message = result['message']
+                usage = message.get('usage') or {}
+                for key in ('input_tokens', 'output_tokens', 'cache_creation_input_tokens', 'cache_read_input_tokens'):
+                    metrics[key] = usage.get(key) or 0
+                metrics['stop_reason'] = message.get('stop_reason')
+                
+                parser = InsightStreamParser()
+                parser.feed(''.join(block.get('text', '') for block in message.get('content') or []))
+                parsed[request_id] = parser.close()
+            except (ValueError, KeyError, IndexError, TypeError, AttributeError) as e:
+                print(f"Error parsing batch result ({request_id or line[:80]}): {e!r}")
+                if request_id is not None:
+                    self.last_batch_metrics[request_id]['error'] = repr(e)
+        
+        for request_id in ids:
+            if request_id not in parsed:
+                self.last_batch_metrics[request_id].setdefault('error', 'missing result')
+        
+        return parsed
+    
+    def cache_key(self, us_market_data: Dict, korea_impact: Dict, indicators: Dict = None,
+                  variant: Dict = None) -> str:
+        """
+        캐시 키 (모델과 시스템 프롬프트가 바뀌면 다른 키)
+        
+        Args:
+            variant: 독자/언어/포트폴리오 등 같은 시장 상태 안에서 결과를 나누는 값
+        """
+        prompt_hash = hashlib.sha256(self.system_prompt.encode('utf-8')).hexdigest()[:16]
+        namespace = f"{self.model}:{prompt_hash}"
+        if variant:
+            namespace += ':' + json.dumps(variant, sort_keys=True, ensure_ascii=False)
+        state = quantize_market_state(us_market_data, korea_impact, indicators)
+        return cache_key(state, namespace=namespace)
+    
+    def _generate_mock_insight(self, us_market_data: Dict, korea_impact: Dict, indicators: Dict = None) -> Dict:
         """Mock 모드: 규칙 기반 인사이트 생성"""
+        indicators = indicators or {}
         
         # 미국 시장 평균 등락률
         nasdaq_change = us_market_data.get('NASDAQ', {}).get('change_pct', 0)
@@ -69,16 +654,21 @@ class MarketAnalyst:
         
         avg_change = (nasdaq_change + sp500_change) / 2
         
+        # 규칙표 평가에 쓰는 값
+        features = {
+            'avg_change': avg_change,
+            'abs_avg_change': abs(avg_change),
+            'vix': vix,
+            'vix_z': indicators.get('VIX', {}).get('zscore', 0),
+            'sp500_drawdown': indicators.get('S&P 500', {}).get('drawdown_pct', 0),
+            'tech_lead': abs(nasdaq_change) - abs(sp500_change),
+            'nasdaq_direction': '상승' if nasdaq_change > 0 else '하락',
+            'sp500_direction': '상승' if sp500_change > 0 else '하락'
+        }
+        
         # 시장 상황 판단
-        if avg_change > 1.5:
-            market_tone = "강세"
-            sentiment = "긍정적"
-        elif avg_change < -1.5:
-            market_tone = "약세"
-            sentiment = "부정적"
-        else:
-            market_tone = "혼조"
-            sentiment = "중립적"
+        tone = self.rules['insight_tone'].first(**features)
+        market_tone = tone['tone']
         
         # 인사이트 생성
         insight = f"미국 증시 {market_tone} 흐름 속에서 "
@@ -86,53 +676,22 @@ class MarketAnalyst:
         if korea_impact.get('primary_sector'):
             insight += f"국내 {korea_impact['primary_sector']} 섹터가 주목받고 있습니다. "
         
-        if vix > 20:
-            insight += "다만 변동성이 높아 단기 조정 가능성에 유의해야 합니다."
-        elif vix < 15:
-            insight += "변동성이 낮아 상대적으로 안정적인 흐름이 예상됩니다."
-        else:
-            insight += "변동성은 보통 수준으로 추세 지속 여부를 지켜봐야 합니다."
+        insight += self.rules['insight_volatility'].first(**features)['text']
         
         # 주요 포인트
-        key_points = []
-        
-        if abs(nasdaq_change) > abs(sp500_change):
-            key_points.append(f"기술주 중심의 {'상승' if nasdaq_change > 0 else '하락'} 장세")
-        else:
-            key_points.append(f"시장 전반적인 {'상승' if sp500_change > 0 else '하락'} 흐름")
+        key_points = [self.rules['insight_trend_point'].first(**features)['text']]
         
         if korea_impact.get('top_stocks'):
             top_stock = korea_impact['top_stocks'][0]['name']
             key_points.append(f"국내 {top_stock} 등 연관주 수혜 예상")
         
-        if vix > 25:
-            key_points.append("공포지수 급등으로 방어적 포지션 고려 필요")
-        elif avg_change > 2:
-            key_points.append("강한 상승이나 과열 여부 점검 필요")
-        else:
-            key_points.append("점진적 흐름으로 추세 추종 전략 유효")
+        key_points.append(self.rules['insight_risk_point'].first(**features)['text'])
         
         # 리스크 노트
-        risk_note = ""
-        if vix > 20:
-            risk_note = "⚠️ 변동성 확대 구간으로 손절매 기준 설정 권장"
-        elif abs(avg_change) > 2.5:
-            risk_note = "⚠️ 급격한 변동 후 조정 가능성 대비 필요"
-        else:
-            risk_note = "💡 안정적 흐름이나 돌발 변수 모니터링 지속"
+        risk_note = self.rules['insight_risk_note'].first(**features)['text']
         
         # 액션 아이템
-        action_items = []
-        
-        if sentiment == "긍정적":
-            action_items.append("상승 모멘텀 활용: 관련주 분할 매수 고려")
-            action_items.append("익절 타이밍 사전 설정으로 이익 실현 준비")
-        elif sentiment == "부정적":
-            action_items.append("방어적 포지션: 현금 비중 확대 검토")
-            action_items.append("저가 매수 기회: 관심 종목 리스트 점검")
-        else:
-            action_items.append("관망: 뚜렷한 방향성 나올 때까지 대기")
-            action_items.append("분할 매매: 리스크 분산하며 포지션 조절")
+        action_items = list(tone['action_items'])
         
         if vix < 15:
             action_items.append("저변동성 활용: 중장기 포지션 구축 적기")
@@ -144,18 +703,121 @@ class MarketAnalyst:
             'action_items': action_items[:2]
         }
     
-    def _call_claude_api(self, us_market_data: Dict, korea_impact: Dict) -> Dict:
-        """실제 Claude API 호출 (Day 3 후반부 구현)"""
+    def _call_claude_api(self, us_market_data: Dict, korea_impact: Dict, indicators: Dict = None,
+                         on_section: Callable[[str, Dict], None] = None) -> Dict:
+        """
+        실제 Claude API 호출 (스트리밍)
         
+        응답 조각이 도착하는 대로 InsightStreamParser로 항목을 채우며,
+        실패하거나 핵심 인사이트가 비면 규칙 기반 인사이트로 대체한다.
+        비어 있는 항목만 규칙 기반 값으로 채운다.
+        
+        Args:
+            on_section: 항목 하나가 완성될 때마다 호출 (필드, 현재 결과)
+        """
         # 분석 요청 프롬프트 구성
-        prompt = self._build_analysis_prompt(us_market_data, korea_impact)
+        prompt = self._build_analysis_prompt(us_market_data, korea_impact, indicators)
+        
+        try:
+            insight = self._stream_message(prompt, on_section)
+        except (requests.exceptions.RequestException, ClaudeAPIError, ValueError) as e:
+            print(f"Error calling Claude API: {e}")
+            self.last_call_metrics['error'] = str(e)
+            insight = None
+        
+        fallback = self._generate_mock_insight(us_market_data, korea_impact, indicators)
+        return self._complete_insight(insight, fallback, self.last_call_metrics)
+    
+    def _complete_insight(self, insight: Dict, fallback: Dict, metrics: Dict) -> Dict:
+        """파싱 결과의 빈 항목을 규칙 기반 값으로 채움 (핵심 인사이트가 비면 전체 대체)"""
+        if not insight or not insight['insight']:
+            metrics['fallback'] = True
+            return copy.deepcopy(fallback)
+        
+        metrics['fallback'] = False
+        return {
+            'insight': insight['insight'],
+            'key_points': insight['key_points'][:3] or list(fallback['key_points']),
+            'risk_note': insight['risk_note'] or fallback['risk_note'],
+            'action_items': insight['action_items'][:2] or list(fallback['action_items'])
+        }
+    
+    def _request_headers(self) -> Dict:
+        return {
+            'x-api-key': self.api_key,
+            'anthropic-version': ANTHROPIC_VERSION,
+            'content-type': 'application/json'
+        }
+    
+    def _new_metrics(self) -> Dict:
+        return {
+            'model': self.model, 'cache_hit': False, 'input_tokens': 0, 'output_tokens': 0,
+            'cache_creation_input_tokens': 0, 'cache_read_input_tokens': 0,
+            'time_to_first_byte': None, 'time_to_first_token': None, 'total_time': None,
+            'stop_reason': None
+        }
+    
+    def _stream_message(self, prompt: str, on_section: Callable[[str, Dict], None] = None,
+                        system=None, metrics: Dict = None) -> Dict:
+        """
+        POST /v1/messages (stream=true) → 파싱된 인사이트
+        
+        토큰 사용량, 첫 바이트/첫 토큰까지 시간, 전체 시간을 metrics에 남긴다
+        (metrics를 주지 않으면 새로 만들어 last_call_metrics로 둔다).
+        
+        Args:
+            system: 시스템 프롬프트 (문자열 또는 블록 목록, None이면 self.system_prompt)
+        """
+        started = time.perf_counter()
+        if metrics is None:
+            metrics = self._new_metrics()
+            self.last_call_metrics = metrics
         
-        # TODO: Anthropic API 호출
-        # 현재는 Mock 모드로 폴백
-        return self._generate_mock_insight(us_market_data, korea_impact)
+        payload = {
+            'model': self.model,
+            'max_tokens': self.max_tokens,
+            'system': self.system_prompt if system is None else system,
+            'messages': [{'role': 'user', 'content': prompt}],
+            'stream': True
+        }
+        parser = InsightStreamParser(on_section)
+        
+        try:
+            with self.session.post(f"{self.base_url}/v1/messages", headers=self._request_headers(),
+                                   json=payload, timeout=self.timeout, stream=True) as response:
+                metrics['time_to_first_byte'] = time.perf_counter() - started
+                metrics['status'] = response.status_code
+                if response.status_code != 200:
+                    raise ClaudeAPIError(f"HTTP {response.status_code}: {response.text[:200]}")
+                
+                for name, data in iter_sse(response.iter_lines()):
+                    event = json.loads(data)
+                    if name == 'message_start':
+                        usage = event['message'].get('usage', {})
+                        for key in ('input_tokens', 'cache_creation_input_tokens', 'cache_read_input_tokens'):
+                            metrics[key] = usage.get(key) or 0
+                    elif name == 'content_block_delta':
+                        text = event['delta'].get('text')
+                        if text:
+                            if metrics['time_to_first_token'] is None:
+                                metrics['time_to_first_token'] = time.perf_counter() - started
+                            parser.feed(text)
+                    elif name == 'message_delta':
+                        metrics['output_tokens'] = event.get('usage', {}).get('output_tokens', metrics['output_tokens'])
+                        metrics['stop_reason'] = event.get('delta', {}).get('stop_reason')
+                    elif name == 'error':
+                        raise ClaudeAPIError(event.get('error', {}).get('message', data))
+        finally:
+            metrics['total_time'] = time.perf_counter() - started
+        
+        return parser.close()
     
-    def _build_analysis_prompt(self, us_market_data: Dict, korea_impact: Dict) -> str:
+    def _build_analysis_prompt(self, us_market_data: Dict, korea_impact: Dict, indicators: Dict = None) -> str:
         """Claude에게 보낼 분석 요청 프롬프트"""
+        return self._build_market_context(us_market_data, korea_impact, indicators) + ANALYSIS_FORMAT
+    
+    def _build_market_context(self, us_market_data: Dict, korea_impact: Dict, indicators: Dict = None) -> str:
+        """프롬프트의 시장 데이터 부분 (같은 날 모든 독자에게 공통)"""
         
         prompt = f"""다음 시장 데이터를 분석해주세요:
 
@@ -165,6 +827,13 @@ class MarketAnalyst:
             if data:
                 prompt += f"- {index}: {data['change_pct']:+.2f}%\n"
         
+        if indicators:
+            prompt += "\n【기술 지표】\n"
+            for index in ('S&P 500', 'NASDAQ', 'VIX'):
+                values = indicators.get(index)
+                if values:
+                    prompt += f"- {index}: " + ", ".join(f"{k} {v}" for k, v in values.items()) + "\n"
+        
         prompt += f"""
 【한국 영향 분석】
 - 주요 섹터: {korea_impact.get('primary_sector', 'N/A')}
@@ -176,47 +845,16 @@ class MarketAnalyst:
         for stock in korea_impact.get('top_stocks', [])[:3]:
             prompt += f"- {stock['name']} ({stock['sector']})\n"
         
-        prompt += """
-다음 형식으로 분석해주세요:
-
-1. 핵심 인사이트 (2-3문장)
-2. 주요 포인트 3가지
-3. 주의사항 (1문장)
-4. 투자 시사점 2가지
-
-객관적이고 실용적으로 작성해주세요.
-"""
-        
         return prompt
     
-    def format_insight_section(self, analysis: Dict) -> str:
-        """인사이트 섹션 포맷팅"""
-        
-        section = """
-💡 **Today's Insight**
-━━━━━━━━━━━━━━━━━━━━━━
-
-"""
-        
-        # 핵심 인사이트
-        section += f"{analysis['insight']}\n\n"
-        
-        # 주요 포인트
-        section += "**📌 주요 포인트**\n"
-        for i, point in enumerate(analysis['key_points'], 1):
-            section += f"{i}. {point}\n"
-        
-        section += f"\n**⚡ 주의사항**\n{analysis['risk_note']}\n\n"
-        
-        # 액션 아이템
-        if analysis.get('action_items'):
-            section += "**🎯 투자 시사점**\n"
-            for item in analysis['action_items']:
-                section += f"• {item}\n"
-        
-        section += "\n━━━━━━━━━━━━━━━━━━━━━━\n"
+    def format_insight_section(self, analysis: Dict, target: str = 'markdown') -> str:
+        """
+        인사이트 섹션 포맷팅
         
-        return section
+        Args:
+            target: 출력 형식 ('markdown', 'markdownv2', 'html', 'plain')
+        """
+        return INSIGHT_SECTION.render(analysis, target)
 
 
 # 테스트
@@ -258,3 +896,56 @@ if __name__ == "__main__":
     
     print("\n" + "="*60)
     print(analyst.format_insight_section(result))
+    
+    # 로컬 대역 서버로 실제 스트리밍 경로 확인
+    from stub_servers import AnthropicStub
+    
+    with AnthropicStub(first_token_delay=0.2, chunk_delay=0.01) as stub:
+        analyst = MarketAnalyst(api_key='test', base_url=stub.url)
+        for _ in range(2):
+            result = analyst.analyze_market(test_us_data, test_korea_impact)
+        metrics = analyst.last_call_metrics
+        
+        # 캐시: 등락률이 조금 다른 날은 API 호출 없이 재사용
+        cached_analyst = MarketAnalyst(api_key='test', base_url=stub.url, cache=InsightCache(path=False))
+        cached_analyst.analyze_market(test_us_data, test_korea_impact)
+        similar_day = {name: {**data, 'change_pct': data['change_pct'] + 0.1} for name, data in test_us_data.items()}
+        cached_analyst.analyze_market(similar_day, test_korea_impact)
+        print("=== 스트리밍 API (로컬 대역) ===")
+        print(analyst.format_insight_section(result))
+        print(f"토큰: 입력 {metrics['input_tokens']} / 출력 {metrics['output_tokens']}, "
+              f"첫 토큰 {metrics['time_to_first_token'] * 1000:.0f}ms, 전체 {metrics['total_time'] * 1000:.0f}ms, "
+              f"연결 {stub.connections}개로 {len(stub.requests)}회 호출")
+        print(f"캐시: {cached_analyst.cache.stats()}")
+    
+    # 지연 예산: 느린 API는 규칙 기반으로 먼저 보내고 도착하면 교체
+    with AnthropicStub(first_token_delay=0.5) as stub:
+        analyst = MarketAnalyst(api_key='test', base_url=stub.url)
+        upgraded = threading.Event()
+        result = analyst.analyze_market_within(test_us_data, test_korea_impact, budget=0.2,
+                                               on_upgrade=lambda insight: upgraded.set())
+        print(f"\n예산 0.2초: {analyst.last_budget_result['source']} ({result['insight'][:20]}...)")
+        print(f"늦은 API 결과 도착: {upgraded.wait(5)}")
+        analyst.analyze_market_within(test_us_data, test_korea_impact, budget=5.0)
+        print(f"예산 5초: {analyst.last_budget_result['source']} / {analyst.latency_stats()}")
+    
+    # 여러 독자용 인사이트: 공통 system 블록은 프롬프트 캐시로 공유
+    audiences = [
+        {'id': 'beginner', 'audience': 'beginner'},
+        {'id': 'trader', 'audience': 'trader'},
+        {'id': 'semiconductor', 'audience': 'sector', 'sector': '반도체'},
+        {'id': 'portfolio-en', 'portfolio': {'삼성전자': 0.6, '현대차': 0.4}, 'language': 'en'}
+    ]
+    with AnthropicStub(first_token_delay=0.2, batch_delay=0.3) as stub:
+        analyst = MarketAnalyst(api_key='test', base_url=stub.url)
+        started = time.perf_counter()
+        results = analyst.analyze_batch(audiences, test_us_data, test_korea_impact, concurrency=4)
+        elapsed = time.perf_counter() - started
+        print(f"\n=== 독자 {len(results)}개 동시 생성: {elapsed:.2f}초 ===")
+        for request_id, metrics in analyst.last_batch_metrics.items():
+            print(f"  {request_id}: 입력 {metrics['input_tokens']} + 캐시 작성 {metrics['cache_creation_input_tokens']}"
+                  f" / 캐시 읽기 {metrics['cache_read_input_tokens']} 토큰")
+        
+        results = analyst.analyze_batch(audiences, test_us_data, test_korea_impact, use_batch_api=True,
+                                        poll_interval=0.1)
+        print(f"메시지 배치 API: {sorted(results)} (대체 {sum(m['fallback'] for m in analyst.last_batch_metrics.values())}건)")
@@ -1,82 +1,710 @@
 # market_data_collector.py
 # Phase 1 Day 1: 미국 시장 데이터 수집기
 
-import yfinance as yf
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, time as dt_time
+from zoneinfo import ZoneInfo
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
 import json
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+from price_store import PriceStore
+from market_data_sources import MockSource, YFinanceSource
+from fetch_resilience import ResilientSource
+from indicators import RollingIndicatorEngine
+from sentiment_rules import load_rule_tables
+from korean_stock_mapper import KoreanStockMapper
+from beta_matrix import StreamingBetaMatrix, krx_ticker
+from news_matcher import NewsMatcher, attach_news, format_news_section, iter_headlines
+from market_analyst import MarketAnalyst
+from insight_cache import InsightCache
+from telegram_notifier import TelegramNotifier
+from report_templates import Template
+
+# 미국 시장 섹션 템플릿 (build_report_context() 결과로 렌더링)
+MARKET_REPORT = Template("""
+📊 **마무리 경제 브리핑** | {date}
+
+━━━━━━━━━━━━━━━━━━━━━━
+🇺🇸 **미국 시장 동향**
+━━━━━━━━━━━━━━━━━━━━━━
+
+{% for index in indices %}
+{index.change_pct|updown} **{index.name}**: {index.price:,.2f} ({index.change_pct:+.2f}%)
+{% endfor %}
+{% if stale %}
+
+⚠️ 지연 데이터: {stale|join} (최근 캐시 값)
+{% endif %}
+
+━━━━━━━━━━━━━━━━━━━━━━
+📈 **시장 분석**
+━━━━━━━━━━━━━━━━━━━━━━
+
+**종합 심리**: {sentiment.sentiment}
+{sentiment.analysis}
+{sentiment.vix_analysis}
+{% if sentiment.indicator_analysis %}
+{sentiment.indicator_analysis}
+{% endif %}
+
+━━━━━━━━━━━━━━━━━━━━━━
+""")
+
+# 기본 관심 종목 설정 파일
+DEFAULT_WATCHLIST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'watchlist.json')
+
+# 리포트와 심리 분석에 항상 필요한 핵심 지수
+CORE_INDICES = {
+    'S&P 500': '^GSPC',
+    'NASDAQ': '^IXIC',
+    'DOW': '^DJI',
+    'VIX': '^VIX'  # 공포지수
+}
+
+# 장중 폴링 대상 세션: (시간대, 개장, 마감) — 평일만
+MARKET_SESSIONS = {
+    'US': ('America/New_York', dt_time(9, 30), dt_time(16, 0)),
+    'KR': ('Asia/Seoul', dt_time(9, 0), dt_time(15, 30))
+}
+
+def is_session_open(sessions=('US', 'KR'), now=None):
+    """지정한 세션 중 하나라도 열려 있는지"""
+    now = now or datetime.now(ZoneInfo('UTC'))
+    for session in sessions:
+        tz, open_time, close_time = MARKET_SESSIONS[session]
+        local = now.astimezone(ZoneInfo(tz))
+        if local.weekday() < 5 and open_time <= local.time() < close_time:
+            return True
+    return False
+
+def expected_session_date(today):
+    """today 기준 마지막으로 마감된 거래일 (직전 평일, 휴장일은 고려하지 않음)"""
+    return np.busday_offset(np.datetime64(today, 'D'), -1, roll='forward').astype(object)
+
+def load_watchlist(path=None):
+    """
+    관심 종목 설정 로드
+    
+    Args:
+        path: JSON 설정 경로 (환경변수 MAMOORI_WATCHLIST 사용 가능)
+        
+    Returns:
+        {
+            'indices': {이름: 티커},  # 전체 그룹을 합친 목록 (핵심 지수 포함)
+            'report': List[str],  # 리포트에 표시할 이름
+            'horizons': List[int],  # 수익률 계산 기간 (거래일)
+            'beta': List[str]  # 한국 종목 베타 추정에 쓸 미국 지수 이름
+        }
+    """
+    path = path or os.getenv('MAMOORI_WATCHLIST') or DEFAULT_WATCHLIST_PATH
+    
+    config = {}
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            config = json.load(f)
+    else:
+        print(f"⚠️  관심 종목 설정 없음: {path} (핵심 지수만 사용)")
+    
+    groups = config.get('groups', {})
+    indices = dict(CORE_INDICES)
+    for group in groups.values():
+        indices.update(group)
+    
+    def names_in(group_names):
+        names = []
+        for group_name in group_names:
+            names.extend(groups.get(group_name, CORE_INDICES if group_name == 'core' else {}))
+        return list(dict.fromkeys(names))
+    
+    return {
+        'indices': indices,
+        'report': names_in(config.get('report_groups', ['core'])),
+        'horizons': sorted(set(config.get('return_horizons', [1])) | {1}),
+        'beta': names_in(config.get('beta_groups', ['core']))
+    }
+
+def summarize_closes(close, horizons=(1,)):
+    """
+    정렬된 종가 행렬 전체를 한 번에 요약 (티커별 파이썬 반복 없음)
+    
+    휴장일이 티커마다 달라 생기는 NaN은 열마다 유효한 값만 아래로 모은 뒤 계산한다.
+    
+    Args:
+        close: 날짜 × 티커 종가 DataFrame
+        horizons: 수익률 계산 기간 (거래일)
+        
+    Returns:
+        {
+            'tickers': List[str],
+            'price': 최근 종가 배열,
+            'date': 최근 종가 날짜 배열,
+            'returns': {기간: 등락률(%) 배열}  # 데이터가 부족하면 NaN
+        }
+    """
+    values = close.to_numpy(dtype='f8')
+    valid = ~np.isnan(values)
+    
+    # 열마다 NaN을 위로, 유효값을 (순서 유지한 채) 아래로 정렬
+    order = np.argsort(valid, axis=0, kind='stable')
+    packed = np.take_along_axis(values, order, axis=0)
+    dates = close.index.to_numpy()[order[-1]] if len(close) else np.array([], dtype='M8[ns]')
+    
+    returns = {}
+    for horizon in horizons:
+        if horizon < len(packed):
+            returns[horizon] = (packed[-1] / packed[-1 - horizon] - 1) * 100
+        else:
+            returns[horizon] = np.full(values.shape[1], np.nan)
+    
+    return {
+        'tickers': list(close.columns),
+        'price': packed[-1] if len(packed) else np.full(values.shape[1], np.nan),
+        'date': dates,
+        'returns': returns
+    }
+
+class _ReportUpgrade:
+    """
+    늦게 도착한 AI 인사이트로 발송된 리포트 교체
+    
+    인사이트 도착과 발송 완료 중 나중에 일어난 쪽에서 한 번만 메시지를 수정한다.
+    """
+    
+    def __init__(self, notifier, build_report):
+        self.notifier = notifier
+        self.build_report = build_report
+        self.message_id = None
+        self.insight = None
+        self.result = None
+        self._lock = threading.Lock()
+    
+    def insight_arrived(self, insight):
+        with self._lock:
+            self.insight = insight
+            ready = self.message_id is not None
+        if ready:
+            self._apply()
+    
+    def message_sent(self, message_id):
+        with self._lock:
+            self.message_id = message_id
+            ready = self.insight is not None
+        if ready:
+            self._apply()
+    
+    def _apply(self):
+        self.result = self.notifier.edit_report(self.message_id, self.build_report(self.insight))
+        if not self.result['success']:
+            print(f"Error upgrading report: {self.result['error']}")
 
 class MarketDataCollector:
     """미국 주요 지수 데이터 수집 클래스"""
     
-    def __init__(self, mock_mode=False):
-        # 주요 지수 티커
-        self.indices = {
-            'S&P 500': '^GSPC',
-            'NASDAQ': '^IXIC',
-            'DOW': '^DJI',
-            'VIX': '^VIX'  # 공포지수
-        }
+    def __init__(self, mock_mode=False, store=None, source=None, watchlist_path=None):
+        """
+        Args:
+            mock_mode: True면 MockSource 사용
+            store: 로컬 일봉 저장소 (yfinance 기본 소스일 때만 자동 생성)
+            source: MarketDataSource 구현체 (yfinance / 재생 / Mock)
+            watchlist_path: 관심 종목 설정 파일 (None이면 watchlist.json)
+        """
+        # 관심 종목 (핵심 지수 + 설정 파일의 그룹)
+        watchlist = load_watchlist(watchlist_path)
+        self.indices = watchlist['indices']
+        self.report_indices = watchlist['report']
+        self.return_horizons = watchlist['horizons']
         self.mock_mode = mock_mode
         
+        # 데이터 소스 (지정하지 않으면 모드에 따라 선택)
+        if source is None:
+            source = MockSource() if mock_mode else ResilientSource(YFinanceSource())
+            if store is None and not mock_mode:
+                store = PriceStore()
+        self.source = source
+        
+        # 로컬 일봉 저장소 (None이면 매번 소스에서 조회)
+        self.store = store
+        
+        # 저장소가 비어 있는 티커의 최초 수집 기간
+        self.initial_history_days = 90
+        
+        # 마지막 실행의 구간별 소요 시간 (초)
+        self.last_timings = {}
+        
+        # 마지막으로 성공한 수집 결과 (마감 시간 초과 시 대체값)
+        self.snapshot = {}
+        self.snapshot_time = None
+        self._snapshot_lock = threading.Lock()
+        
+        # 수집 작업은 한 스레드에서 순서대로 실행 (저장소 동시 쓰기 방지)
+        self._fetch_executor = ThreadPoolExecutor(max_workers=1)
+        
+        # 장중 폴링의 마지막 시세 {이름: 시세}
+        self.last_quotes = {}
+        
+        # 심리 판단 규칙표 (sentiment_rules.json)
+        self.rules = load_rule_tables()
+        
+        # 롤링 지표 엔진 (update_indicators()에서 새 일봉만 반영)
+        self.indicator_engine = None
+        self.indicator_history_days = 400
+        
+        # 한국 관련주 매핑 + 미국 → 한국 계수 행렬 (update_beta_matrix()에서 증분 갱신)
+        self.korea_mapper = KoreanStockMapper()
+        self.beta_names = watchlist['beta']
+        self.beta_history_days = 750
+        self.beta_matrix = None
+        
+        # 뉴스 피드 (None이면 MAMOORI_NEWS 또는 data/news) — 최근 수정된 파일만 매칭
+        self.news_matcher = NewsMatcher()
+        self.news_paths = None
+        self.news_max_age_hours = 24
+        
+        # AI 인사이트 (캐시로 재실행·재시도의 API 왕복 생략, data/insight_cache.json)
+        # 리포트 발송은 insight_budget초까지만 기다리고 늦은 API 결과는 발송 후 메시지 수정으로 반영
+        self.insight_cache = InsightCache()
+        self.analyst = MarketAnalyst(cache=self.insight_cache)
+        self.insight_budget = 15.0
+        
     def get_market_data(self):
         """전날 시장 데이터 수집"""
+        started = time.perf_counter()
+        tickers = list(self.indices.values())
         
-        # Mock 모드: 실제 같은 데이터 생성
-        if self.mock_mode:
-            import random
-            return {
-                'S&P 500': {
-                    'price': round(5732.45 + random.uniform(-50, 50), 2),
-                    'change_pct': round(random.uniform(-2, 2), 2),
-                    'date': (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
-                },
-                'NASDAQ': {
-                    'price': round(18315.20 + random.uniform(-100, 100), 2),
-                    'change_pct': round(random.uniform(-2.5, 2.5), 2),
-                    'date': (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
-                },
-                'DOW': {
-                    'price': round(42863.00 + random.uniform(-300, 300), 2),
-                    'change_pct': round(random.uniform(-1.5, 1.5), 2),
-                    'date': (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
-                },
-                'VIX': {
-                    'price': round(17.5 + random.uniform(-3, 3), 2),
-                    'change_pct': round(random.uniform(-10, 10), 2),
-                    'date': (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+        # 저장소 기준 누락 구간의 시작일 (None이면 이미 최신)
+        start = self._missing_start(tickers)
+        
+        # 1단계: 누락 구간만 소스에서 조회 (받지 못한 티커는 failed)
+        histories = {}
+        failed = set()
+        if start is not None:
+            try:
+                histories = self.source.fetch_history(tickers, start)
+            except Exception as e:
+                print(f"Error fetching from {self.source.name}: {e}")
+            failed = {ticker for ticker in tickers if histories.get(ticker) is None or len(histories[ticker]) == 0}
+        fetch_done = time.perf_counter()
+        
+        # 2단계: 새 일봉을 저장소에 병합하고 최근 일봉은 로컬에서 읽기
+        if self.store is not None:
+            for ticker in tickers:
+                self.store.write(ticker, histories.get(ticker))
+                histories[ticker] = self.store.read_frame(ticker, tail=max(self.return_horizons) + 1)
+        store_done = time.perf_counter()
+        
+        # 3단계: 전체 종목 등락률을 한 번에 계산
+        market_summary = self._summarize_histories(histories)
+        
+        missing = [name for name, data in market_summary.items() if data is None]
+        if missing:
+            print(f"Error fetching {', '.join(missing)}: 데이터 없음")
+        
+        # 저장소의 옛 일봉으로 채운 지수는 지연 데이터로 표시
+        self._mark_stale(market_summary, failed)
+        
+        self.last_timings = {
+            'source': self.source.name,
+            'fetch': round(fetch_done - started, 3),
+            **(self.source.last_timings if start is not None else {}),
+            'store': round(store_done - fetch_done, 3),
+            'compute': round(time.perf_counter() - store_done, 3),
+            'total': round(time.perf_counter() - started, 3),
+            'symbols': len(tickers)
+        }
+        
+        return market_summary
+    
+    def prefetch(self):
+        """
+        발송 전 워밍업 수집 (스케줄러가 미국 장 마감 직후 호출)
+        
+        결과는 스냅샷과 로컬 저장소에 남아 발송 시점의 대체값으로 쓰인다.
+        한국 종목 일봉 보충과 계수 행렬 재추정도 여기서 해 두고, 발송 경로는 저장된 행렬만 읽는다.
+        """
+        market_data = self._submit_fetch().result()
+        
+        started = time.perf_counter()
+        try:
+            self._fetch_executor.submit(self.update_beta_matrix).result()
+        except Exception as e:
+            print(f"Error updating beta matrix: {e}")
+        self.last_timings['beta'] = round(time.perf_counter() - started, 3)
+        
+        return market_data
+    
+    def get_market_data_by(self, deadline):
+        """
+        마감 시각까지 시장 데이터 수집
+        
+        Args:
+            deadline: 발송 마감 시각 (datetime)
+            
+        Returns:
+            get_market_data()와 같은 형태.
+            마감까지 받지 못한 지수는 최근 캐시 값으로 채우고 'stale': True 표시
+        """
+        remaining = (deadline - datetime.now()).total_seconds()
+        future = self._submit_fetch()
+        
+        try:
+            market_data = future.result(timeout=max(0, remaining))
+        except TimeoutError:
+            print(f"⏰ 마감 시각 초과: 캐시 데이터로 대체 ({self.source.name})")
+            market_data = {name: None for name in self.indices}
+        except Exception as e:
+            print(f"Error fetching market data: {e}")
+            market_data = {name: None for name in self.indices}
+        
+        return self._fill_from_cache(market_data)
+    
+    def _submit_fetch(self):
+        """수집 작업 제출 (완료되면 스냅샷 갱신)"""
+        future = self._fetch_executor.submit(self.get_market_data)
+        future.add_done_callback(self._remember_snapshot)
+        return future
+    
+    def _remember_snapshot(self, future):
+        """성공한 지수만 스냅샷에 반영"""
+        if future.cancelled() or future.exception() is not None:
+            return
+        
+        fresh = {name: data for name, data in future.result().items() if data}
+        if fresh:
+            with self._snapshot_lock:
+                self.snapshot.update(fresh)
+                self.snapshot_time = datetime.now()
+    
+    def _mark_stale(self, market_summary, failed=()):
+        """
+        조회에 실패했거나 마지막 일봉이 직전 거래일보다 오래된 지수에 'stale': True 표시
+        
+        Args:
+            failed: 이번 조회에서 받지 못한 티커
+        """
+        expected = expected_session_date(self.source.today()).isoformat()
+        for name, data in market_summary.items():
+            if data and (self.indices[name] in failed or data['date'] < expected):
+                data['stale'] = True
+        return market_summary
+    
+    def _fill_from_cache(self, market_data):
+        """빠진 지수를 스냅샷 → 로컬 저장소 순으로 채움"""
+        filled = dict(market_data)
+        
+        for name, ticker in self.indices.items():
+            if filled.get(name):
+                continue
+            
+            with self._snapshot_lock:
+                cached = self.snapshot.get(name)
+            
+            if cached is None and self.store is not None:
+                hist = self.store.read_frame(ticker, tail=max(self.return_horizons) + 1)
+                cached = self._summarize_histories({ticker: hist}).get(name)
+            
+            if cached is not None:
+                filled[name] = {**cached, 'stale': True}
+        
+        return filled
+    
+    def update_indicators(self):
+        """
+        확정된 일봉으로 롤링 지표 엔진 증분 갱신
+        
+        처음에는 indicator_history_days만큼 채우고, 이후에는 엔진이 마지막으로
+        반영한 날짜 이후의 일봉만 넣는다. 저장소가 있으면 네트워크 없이 계산된다.
+        
+        Returns:
+            {이름: {'ma_5', 'ma_20', 'ma_60', 'realized_vol', 'zscore', 'percentile', 'drawdown_pct'}}
+        """
+        if self.indicator_engine is None:
+            self.indicator_engine = RollingIndicatorEngine(list(self.indices))
+        engine = self.indicator_engine
+        
+        # 진행 중인 당일 일봉은 제외
+        end = self.source.today() - timedelta(days=1)
+        if engine.last_date is not None:
+            start = engine.last_date.date() + timedelta(days=1)
+        else:
+            start = end - timedelta(days=self.indicator_history_days)
+        
+        if start <= end:
+            if self.store is not None:
+                histories = {
+                    ticker: self.store.read_frame(ticker, start=start, end=end)
+                    for ticker in self.indices.values()
                 }
+            else:
+                histories = self.source.fetch_history(list(self.indices.values()), start, end)
+            
+            closes = {
+                name: histories[ticker]['Close'] for name, ticker in self.indices.items()
+                if ticker in histories and len(histories[ticker]) > 0
             }
+            if closes:
+                close = pd.concat(closes, axis=1).sort_index()
+                close.index = pd.DatetimeIndex(close.index).tz_localize(None).normalize()
+                engine.warm_up(close.groupby(level=0).last())
         
-        # 실제 데이터 수집
-        market_summary = {}
+        return engine.snapshot()
+    
+    def update_beta_matrix(self):
+        """
+        로컬 저장소 일봉으로 미국 지수 → 한국 종목 계수 행렬 증분 갱신
+        
+        한국 종목({코드}.KS)은 저장소에 빠진 구간만 소스에서 받아 병합한다.
+        상태는 저장소 옆 beta_matrix.npz에 남아 다음 실행에서는 새 거래일만 반영한다.
+        유니버스나 대상 지수가 바뀌면 처음부터 다시 추정한다.
+        
+        Returns:
+            StreamingBetaMatrix (저장소가 없으면 None → 규칙 기반 매핑 유지)
+        """
+        if self.store is None:
+            return None
+        
+        codes = list(self.korea_mapper.universe.stock_codes)
+        path = self._beta_matrix_path()
+        
+        matrix = self.beta_matrix
+        if matrix is None and os.path.exists(path):
+            matrix = StreamingBetaMatrix.load(path)
+        if matrix is None or matrix.us_names != self.beta_names or matrix.kr_codes != codes:
+            matrix = StreamingBetaMatrix(self.beta_names, codes)
+        
+        # 한국 종목 일봉 보충
+        kr_tickers = [krx_ticker(code) for code in codes]
+        start = self._missing_start(kr_tickers)
+        if start is not None:
+            histories = self.source.fetch_history(kr_tickers, start)
+            for ticker in kr_tickers:
+                self.store.write(ticker, histories.get(ticker))
+        
+        # 이미 반영한 날 직전부터 읽기 (등락률 계산과 다음 거래일 정렬에 여유분 필요)
+        end = self.source.today() - timedelta(days=1)
+        if matrix.last_date is not None:
+            start = matrix.last_date.date() - timedelta(days=10)
+        else:
+            start = end - timedelta(days=self.beta_history_days)
+        
+        def closes(columns):
+            frames = {
+                column: self.store.read_frame(ticker, start=start, end=end)['Close']
+                for column, ticker in columns.items()
+            }
+            frames = {column: frame for column, frame in frames.items() if len(frame) > 0}
+            return pd.concat(frames, axis=1) if frames else pd.DataFrame()
+        
+        us_close = closes({name: self.indices[name] for name in self.beta_names if name in self.indices})
+        kr_close = closes(dict(zip(codes, kr_tickers)))
+        
+        if not us_close.empty and not kr_close.empty and matrix.ingest(us_close, kr_close):
+            matrix.save(path)
+        
+        self.beta_matrix = matrix
+        self.korea_mapper.beta_matrix = matrix
+        return matrix
+    
+    def load_beta_matrix(self):
+        """
+        prefetch()에서 갱신해 둔 계수 행렬 적용 (발송 경로용 — 네트워크 없이 저장된 파일만 읽음)
+        
+        유니버스나 대상 지수가 바뀌어 맞지 않으면 다음 prefetch()까지 규칙 기반 매핑을 쓴다.
+        
+        Returns:
+            StreamingBetaMatrix 또는 None
+        """
+        if self.store is None:
+            return None
+        
+        matrix = self.beta_matrix
+        path = self._beta_matrix_path()
+        if matrix is None and os.path.exists(path):
+            matrix = StreamingBetaMatrix.load(path)
+        if matrix is not None and (matrix.us_names != self.beta_names
+                                   or matrix.kr_codes != list(self.korea_mapper.universe.stock_codes)):
+            matrix = None
+        
+        self.beta_matrix = matrix
+        self.korea_mapper.beta_matrix = matrix
+        return matrix
+    
+    def _beta_matrix_path(self):
+        """계수 행렬 상태 파일 (저장소 옆 beta_matrix.npz)"""
+        return os.path.join(os.path.dirname(os.path.abspath(self.store.root)), 'beta_matrix.npz')
+    
+    def attach_news(self, korea_data):
+        """
+        최근 뉴스 헤드라인을 한국 관련주 분석에 매칭해 korea_data['news']로 추가
+        
+        Returns:
+            매칭 요약 (피드 파일이 없으면 None)
+        """
+        since = time.time() - self.news_max_age_hours * 3600
+        headlines = iter_headlines(self.news_paths, since=since)
+        digest = self.news_matcher.scan(headlines, self.korea_mapper.universe)
+        if not digest['scanned']:
+            return None
+        
+        attach_news(korea_data, digest)
+        self.last_timings['news'] = digest['elapsed']
+        return digest
+    
+    def poll_quote_changes(self, names=None, min_change_pct=0.0):
+        """
+        시세를 한 번 조회해 직전 스냅샷 대비 바뀐 종목만 반환
         
+        Args:
+            names: 대상 이름 목록 (None이면 전체 관심 종목)
+            min_change_pct: 직전 가격 대비 이 비율(%) 이상 움직여야 변경으로 봄
+            
+        Returns:
+            {이름: {'price', 'change_pct', 'time', 'prev_price'}}  # 처음 본 종목은 prev_price None
+        """
+        names = names or list(self.indices)
+        tickers = {self.indices[name]: name for name in names}
+        
+        try:
+            quotes = self.source.fetch_quotes(list(tickers))
+        except Exception as e:
+            print(f"Error polling quotes: {e}")
+            return {}
+        
+        changes = {}
+        for ticker, quote in quotes.items():
+            name = tickers[ticker]
+            last = self.last_quotes.get(name)
+            
+            if last is not None:
+                moved_pct = abs(quote['price'] - last['price']) / last['price'] * 100 if last['price'] else 0
+                if quote['price'] == last['price'] or moved_pct < min_change_pct:
+                    continue
+            
+            self.last_quotes[name] = quote
+            changes[name] = {
+                'price': round(quote['price'], 2),
+                'change_pct': round(quote['change_pct'], 2),
+                'time': quote['time'],
+                'prev_price': round(last['price'], 2) if last else None
+            }
+        
+        return changes
+    
+    def stream_quotes(self, interval=60, sessions=('US', 'KR'), names=None,
+                      min_change_pct=0.0, max_polls=None, stop_event=None):
+        """
+        장중 폴링 스트림 (변경분만 내보내는 제너레이터)
+        
+        Args:
+            interval: 폴링 간격 (초)
+            sessions: 폴링할 세션 ('US', 'KR'), None이면 시간과 무관하게 폴링
+            names: 대상 이름 목록 (None이면 전체 관심 종목)
+            min_change_pct: 변경으로 볼 최소 가격 변화율 (%)
+            max_polls: 최대 폴링 횟수 (None이면 무한)
+            stop_event: 설정되면 종료하는 threading.Event
+            
+        Yields:
+            poll_quote_changes()와 같은 형태 (바뀐 종목이 있을 때만)
+        """
+        stop_event = stop_event or threading.Event()
+        polls = 0
+        while (max_polls is None or polls < max_polls) and not stop_event.is_set():
+            started = time.monotonic()
+            
+            if sessions is None or is_session_open(sessions):
+                polls += 1
+                changes = self.poll_quote_changes(names, min_change_pct)
+                if changes:
+                    yield changes
+            
+            stop_event.wait(max(0, interval - (time.monotonic() - started)))
+    
+    def stream_quotes_to_queue(self, out_queue, stop_event, **kwargs):
+        """
+        stream_quotes() 결과를 큐로 전달 (별도 스레드에서 실행)
+        
+        Args:
+            out_queue: 변경분을 넣을 queue.Queue
+            stop_event: 설정되면 종료하는 threading.Event
+            **kwargs: stream_quotes() 인자
+        """
+        for changes in self.stream_quotes(stop_event=stop_event, **kwargs):
+            out_queue.put(changes)
+    
+    def _missing_start(self, tickers):
+        """
+        저장소에 없는 구간의 시작일
+        
+        마지막 저장일부터 다시 받아 장중에 저장된 종가도 확정 종가로 갱신한다.
+        저장소가 없으면 가장 긴 수익률 기간을 덮을 만큼 받는다.
+        """
+        today = self.source.today()
+        if self.store is None:
+            return today - timedelta(days=max(self.return_horizons) * 7 // 5 + 7)
+        
+        starts = []
+        for ticker in tickers:
+            last = self.store.last_date(ticker)
+            if last is None:
+                starts.append(today - timedelta(days=self.initial_history_days))
+            elif last < today:
+                starts.append(last)
+        
+        return min(starts) if starts else None
+    
+    def _summarize_histories(self, histories):
+        """
+        {ticker: 일봉} → {이름: {'price', 'change_pct', 'date', 'returns'}}
+        
+        종가를 날짜 기준으로 정렬한 행렬 하나로 모아 summarize_closes()로 계산한다.
+        최근 2일 종가가 없는 종목은 None.
+        """
+        closes = {
+            ticker: hist['Close'] for ticker, hist in histories.items()
+            if hist is not None and len(hist) > 0
+        }
+        if not closes:
+            return {name: None for name in self.indices}
+        
+        close = pd.concat(closes, axis=1).sort_index()
+        close.index = pd.DatetimeIndex(close.index).tz_localize(None).normalize()
+        close = close.groupby(level=0).last()
+        
+        summary = summarize_closes(close, self.return_horizons)
+        column = {ticker: i for i, ticker in enumerate(summary['tickers'])}
+        price = np.round(summary['price'], 2)
+        dates = pd.DatetimeIndex(summary['date']).strftime('%Y-%m-%d')
+        returns = {h: np.round(r, 2) for h, r in summary['returns'].items()}
+        
+        market_summary = {}
         for name, ticker in self.indices.items():
-            try:
-                # 최근 2일 데이터 가져오기
-                stock = yf.Ticker(ticker)
-                hist = stock.history(period='2d')
-                
-                if len(hist) >= 2:
-                    # 전날 종가와 전전날 종가
-                    latest_close = hist['Close'].iloc[-1]
-                    prev_close = hist['Close'].iloc[-2]
-                    
-                    # 등락률 계산
-                    change_pct = ((latest_close - prev_close) / prev_close) * 100
-                    
-                    market_summary[name] = {
-                        'price': round(latest_close, 2),
-                        'change_pct': round(change_pct, 2),
-                        'date': hist.index[-1].strftime('%Y-%m-%d')
-                    }
-            except Exception as e:
-                print(f"Error fetching {name}: {e}")
+            i = column.get(ticker)
+            if i is None or np.isnan(returns[1][i]):
                 market_summary[name] = None
+                continue
+            
+            market_summary[name] = {
+                'price': float(price[i]),
+                'change_pct': float(returns[1][i]),
+                'date': dates[i],
+                'returns': {
+                    f'{h}d': float(r[i]) for h, r in returns.items()
+                    if h != 1 and not np.isnan(r[i])
+                }
+            }
         
         return market_summary
     
-    def analyze_market_sentiment(self, market_data):
-        """시장 심리 분석"""
+    def analyze_market_sentiment(self, market_data, indicators=None):
+        """
+        시장 심리 분석
+        
+        Args:
+            market_data: get_market_data() 결과
+            indicators: update_indicators() 결과 (있으면 'indicator_analysis' 추가)
+        """
         sp500_data = market_data.get('S&P 500')
         nasdaq_data = market_data.get('NASDAQ')
         vix_data = market_data.get('VIX')
@@ -90,68 +718,166 @@ class MarketDataCollector:
         
         sp500_change = sp500_data.get('change_pct', 0)
         nasdaq_change = nasdaq_data.get('change_pct', 0)
-        vix = vix_data.get('price', 0) if vix_data else 0
-        
-        # 기본 분석
-        if sp500_change > 1 and nasdaq_change > 1:
-            sentiment = "강세"
-            analysis = "주요 지수가 모두 강한 상승세를 보이고 있습니다."
-        elif sp500_change < -1 and nasdaq_change < -1:
-            sentiment = "약세"
-            analysis = "주요 지수가 모두 하락세를 나타내고 있습니다."
-        elif nasdaq_change < -2 and sp500_change > -1:
-            sentiment = "기술주 약세"
-            analysis = "나스닥이 상대적으로 큰 하락을 보이며 기술주 중심으로 매도세가 나타났습니다."
-        else:
-            sentiment = "혼조"
-            analysis = "시장이 방향성 없이 혼조세를 보이고 있습니다."
-        
-        # VIX 분석
-        if vix > 25:
-            vix_analysis = "공포지수(VIX)가 높아 시장 불안감이 큽니다."
-        elif vix < 15:
-            vix_analysis = "공포지수(VIX)가 낮아 시장이 안정적입니다."
-        else:
-            vix_analysis = "공포지수(VIX)는 보통 수준입니다."
+        vix = vix_data.get('price') if vix_data else None
         
-        return {
+        # 기본 분석 / VIX 분석 (데이터가 없으면 수준을 판단하지 않음)
+        market = self.rules['market_sentiment'].first(sp500_change=sp500_change, nasdaq_change=nasdaq_change)
+        vix_level = self.rules['vix_level'].first(vix=float('nan') if vix is None else vix)
+        
+        sentiment = market['sentiment']
+        analysis = market['analysis']
+        vix_analysis = vix_level['vix_analysis']
+        
+        result = {
             'sentiment': sentiment,
             'analysis': analysis,
             'vix_analysis': vix_analysis
         }
+        
+        if indicators:
+            result['indicator_analysis'] = self._analyze_indicators(market_data, indicators)
+        
+        return result
     
-    def generate_report(self):
-        """일일 리포트 생성"""
-        market_data = self.get_market_data()
-        sentiment = self.analyze_market_sentiment(market_data)
+    def _analyze_indicators(self, market_data, indicators):
+        """롤링 지표 기반 추가 분석 (해당 사항이 없으면 빈 문자열)"""
+        notes = []
         
-        report = f"""
-📊 **마무리 경제 브리핑** | {datetime.now().strftime('%Y년 %m월 %d일')}
-
-━━━━━━━━━━━━━━━━━━━━━━
-🇺🇸 **미국 시장 동향**
-━━━━━━━━━━━━━━━━━━━━━━
-
-"""
+        vix = indicators.get('VIX', {})
+        if vix.get('zscore', 0) >= 2:
+            notes.append(f"VIX가 60일 평균 대비 급등했습니다 (z={vix['zscore']:+.1f}, 1년 백분위 {vix.get('percentile', 0):.0f}%).")
+        elif vix.get('zscore', 0) <= -1.5:
+            notes.append(f"VIX가 60일 평균보다 크게 낮은 안정 구간입니다 (z={vix['zscore']:+.1f}).")
         
-        for name, data in market_data.items():
-            if data:
-                emoji = "🔴" if data['change_pct'] < 0 else "🟢"
-                report += f"{emoji} **{name}**: {data['price']:,.2f} ({data['change_pct']:+.2f}%)\n"
+        sp500 = indicators.get('S&P 500', {})
+        if sp500.get('drawdown_pct', 0) <= -10:
+            notes.append(f"S&P 500은 고점 대비 {sp500['drawdown_pct']:.1f}% 조정 구간입니다.")
         
-        report += f"""
-━━━━━━━━━━━━━━━━━━━━━━
-📈 **시장 분석**
-━━━━━━━━━━━━━━━━━━━━━━
-
-**종합 심리**: {sentiment['sentiment']}
-{sentiment['analysis']}
-{sentiment['vix_analysis']}
-
-━━━━━━━━━━━━━━━━━━━━━━
-"""
+        nasdaq = indicators.get('NASDAQ', {})
+        nasdaq_data = market_data.get('NASDAQ')
+        if nasdaq_data and 'ma_20' in nasdaq:
+            position = "상회" if nasdaq_data['price'] >= nasdaq['ma_20'] else "하회"
+            notes.append(f"NASDAQ은 20일 이동평균({nasdaq['ma_20']:,.0f})을 {position}하고 있습니다.")
+        
+        return " ".join(notes)
+    
+    def generate_report(self, market_data=None, indicators=None, target='markdown'):
+        """
+        일일 리포트 생성
+        
+        Args:
+            market_data: 이미 수집한 데이터 (None이면 새로 수집)
+            indicators: 롤링 지표 (있으면 시장 분석에 반영)
+            target: 출력 형식 ('markdown', 'markdownv2', 'html', 'plain')
+        """
+        if market_data is None:
+            market_data = self.get_market_data()
+        context = self.build_report_context(market_data, indicators)
         
-        return report, market_data
+        return MARKET_REPORT.render(context, target), market_data
+    
+    def build_report_context(self, market_data, indicators=None):
+        """미국 시장 섹션 렌더링용 데이터 (출력 형식과 무관)"""
+        indices = [dict(market_data[name], name=name) for name in self.report_indices if market_data.get(name)]
+        
+        return {
+            'date': datetime.now().strftime('%Y년 %m월 %d일'),
+            'indices': indices,
+            # 마감 시각까지 갱신되지 않은 지수 안내
+            'stale': [index['name'] for index in indices if index.get('stale')],
+            'sentiment': self.analyze_market_sentiment(market_data, indicators)
+        }
+    
+    def prepare_report(self, deadline=None, on_upgrade=None):
+        """
+        리포트 공통 입력 계산 (수집 → 지표 → 베타 → 한국 영향 → 뉴스 → AI 인사이트)
+        
+        Args:
+            deadline: 데이터 수집 마감 시각 (None이면 수집 완료까지 대기)
+            on_upgrade: 예산 초과 후 늦게 도착한 AI 인사이트를 받을 콜백
+            
+        Returns:
+            {'market_data', 'valid_data', 'indicators', 'report_context', 'korea_data', 'ai_insight'}
+        """
+        if deadline is not None:
+            market_data = self.get_market_data_by(deadline)
+        else:
+            market_data = self.get_market_data()
+        
+        # 롤링 지표 (실패해도 리포트는 발송)
+        try:
+            indicators = self.update_indicators()
+        except Exception as e:
+            print(f"Error updating indicators: {e}")
+            indicators = None
+        
+        # 한국 종목 계수 행렬 (prefetch()에서 갱신한 파일만 읽음, 실패하면 규칙 기반 매핑)
+        try:
+            self.load_beta_matrix()
+        except Exception as e:
+            print(f"Error loading beta matrix: {e}")
+        
+        report_context = self.build_report_context(market_data, indicators)
+        valid_data = {name: data for name, data in market_data.items() if data}
+        
+        # 한국 관련주 영향 분석
+        korea_data = self.korea_mapper.analyze_korea_impact(valid_data)
+        
+        # 섹터 키워드/종목명 뉴스 매칭 (피드가 없으면 건너뜀)
+        try:
+            self.attach_news(korea_data)
+        except Exception as e:
+            print(f"Error matching news: {e}")
+        
+        # AI 인사이트 (예산 초과 시 규칙 기반 결과, API 결과는 on_upgrade로)
+        started = time.perf_counter()
+        ai_insight = self.analyst.analyze_market_within(valid_data, korea_data, indicators,
+                                                        budget=self.insight_budget, on_upgrade=on_upgrade)
+        self.last_timings['insight'] = time.perf_counter() - started
+        
+        return {
+            'market_data': market_data,
+            'valid_data': valid_data,
+            'indicators': indicators,
+            'report_context': report_context,
+            'korea_data': korea_data,
+            'ai_insight': ai_insight
+        }
+    
+    def render_report(self, report_context, korea_data, ai_insight, target='markdown'):
+        """전체 브리핑 텍스트 (미국 시장 + AI 인사이트 + 한국 영향 + 관련 뉴스)"""
+        return (
+            MARKET_REPORT.render(report_context, target)
+            + self.analyst.format_insight_section(ai_insight, target)
+            + self.korea_mapper.format_korea_section(korea_data, target)
+            + format_news_section(korea_data, target)
+        )
+    
+    def generate_and_send_report(self, deadline=None):
+        """
+        전체 브리핑 생성 (미국 시장 + AI 인사이트 + 한국 영향) 및 Telegram 발송
+        
+        Args:
+            deadline: 데이터 수집 마감 시각 (None이면 수집 완료까지 대기)
+            
+        Returns:
+            (report, market_data, korea_data, ai_insight, telegram_result)
+        """
+        # 예산 초과 시 규칙 기반으로 먼저 발송, API 결과가 오면 메시지 수정
+        notifier = TelegramNotifier()
+        upgrade = _ReportUpgrade(notifier, lambda insight: self.render_report(
+            inputs['report_context'], inputs['korea_data'], insight
+        ))
+        
+        inputs = self.prepare_report(deadline, on_upgrade=upgrade.insight_arrived)
+        report = self.render_report(inputs['report_context'], inputs['korea_data'], inputs['ai_insight'])
+        
+        # Telegram 발송
+        telegram_result = notifier.send_report(report)
+        if telegram_result.get('success'):
+            upgrade.message_sent(telegram_result['message_id'])
+        
+        return report, inputs['market_data'], inputs['korea_data'], inputs['ai_insight'], telegram_result
 
 # 테스트 실행
 if __name__ == "__main__":
@@ -160,6 +886,10 @@ if __name__ == "__main__":
     report, data = collector.generate_report()
     print(report)
     
+    # 구간별 소요 시간 (실제 모드에서만 기록됨)
+    if collector.last_timings:
+        print(f"⏱️  수집 시간: {collector.last_timings}")
+    
     # JSON 저장 (나중에 DB로 대체)
     with open(f'market_data_{datetime.now().strftime("%Y%m%d")}.json', 'w', encoding='utf-8') as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,360 @@
+# market_data_sources.py
+# Phase 2: 시장 데이터 소스 (yfinance / 녹화 데이터 재생 / Mock)
+
+import os
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+from synthetic_market import (DEFAULT_EQUITY_PROFILE, EQUITY_PROFILES, VOLATILITY_TICKERS,
+                              SyntheticMarketGenerator)
+
+# 모든 소스가 반환하는 일봉 컬럼
+HISTORY_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+# Mock 경로 시작일 (이보다 앞선 구간은 빈 결과)
+MOCK_START = date(2000, 1, 3)
+
+# yf.download는 결과를 모듈 전역(shared._DFS/_ERRORS)에 모으고 호출마다 초기화하므로
+# 여러 스레드에서 동시에 부르면 서로의 결과를 덮어씀 → 프로세스 전체에서 한 번에 하나만
+_DOWNLOAD_LOCK = threading.Lock()
+
+
+class MarketDataSource(ABC):
+    """
+    일봉 데이터 소스 인터페이스
+
+    모든 소스는 {ticker: DataFrame} 형태로 반환한다.
+    DataFrame은 날짜 인덱스와 Open/High/Low/Close/Volume 컬럼을 가진다.
+    조회 실패한 티커는 결과에서 빠진다.
+    """
+
+    name = 'base'
+
+    # 여러 스레드에서 동시에 조회하면 실제로 병렬 요청이 나가는지
+    # (False면 내부에서 직렬화됨 — ResilientSource는 헤지 요청을, 백필은 병렬 작업을 하지 않음)
+    concurrent_requests = True
+
+    def __init__(self):
+        # 마지막 조회의 소스별 세부 소요 시간 (스레드별 — 여러 스레드가 한 소스를 공유해도 섞이지 않음)
+        self._local = threading.local()
+
+    @property
+    def last_timings(self) -> Dict:
+        """현재 스레드에서 마지막으로 조회한 세부 소요 시간"""
+        return getattr(self._local, 'last_timings', {})
+
+    @last_timings.setter
+    def last_timings(self, timings: Dict):
+        self._local.last_timings = timings
+
+    @abstractmethod
+    def fetch_history(self, tickers: List[str], start: date, end: date = None) -> Dict[str, pd.DataFrame]:
+        """
+        일봉 조회
+
+        Args:
+            tickers: 티커 목록
+            start: 시작일 (포함)
+            end: 종료일 (포함, None이면 최신까지)
+        """
+
+    def today(self) -> date:
+        """소스 기준 오늘 날짜 (재생 소스는 녹화 시점 기준)"""
+        return datetime.now().date()
+
+    def fetch_quotes(self, tickers: List[str]) -> Dict[str, Dict]:
+        """
+        현재 시세 조회 (장중이면 당일 진행 중인 일봉 기준)
+
+        Returns:
+            {ticker: {'price': float, 'change_pct': float, 'time': str}}
+        """
+        histories = self.fetch_history(tickers, self.today() - timedelta(days=7))
+
+        quotes = {}
+        for ticker, frame in histories.items():
+            closes = frame['Close'].dropna()
+            if len(closes) < 2:
+                continue
+            price = float(closes.iloc[-1])
+            prev_close = float(closes.iloc[-2])
+            quotes[ticker] = {
+                'price': price,
+                'change_pct': (price / prev_close - 1) * 100,
+                'time': closes.index[-1].strftime('%Y-%m-%d %H:%M')
+            }
+
+        return quotes
+
+
+class YFinanceSource(MarketDataSource):
+    """Yahoo Finance 일괄 다운로드 + 누락 티커 개별 조회"""
+
+    name = 'yfinance'
+
+    # 일괄 다운로드는 _DOWNLOAD_LOCK으로 직렬화됨
+    concurrent_requests = False
+
+    def __init__(self, max_workers: int = 4):
+        """
+        Args:
+            max_workers: 개별 조회 폴백 시 최대 동시 요청 수
+        """
+        super().__init__()
+        self.max_workers = max_workers
+
+    def fetch_history(self, tickers: List[str], start: date, end: date = None) -> Dict[str, pd.DataFrame]:
+        started = time.perf_counter()
+
+        # 1단계: 전체 티커를 한 번의 요청으로 일괄 다운로드
+        histories = self._download_batch(tickers, start, end)
+        batch_done = time.perf_counter()
+
+        # 2단계: 일괄 다운로드에서 빠진 티커만 개별 조회 (스레드 풀)
+        missing = [t for t in tickers if len(histories.get(t, ())) == 0]
+        if missing:
+            histories.update(self._download_individually(missing, start, end))
+
+        self.last_timings = {
+            'batch': round(batch_done - started, 3),
+            'fallback': round(time.perf_counter() - batch_done, 3),
+            'fallback_symbols': missing
+        }
+
+        return histories
+
+    @staticmethod
+    def _date_range(start: date, end: date = None) -> Dict:
+        """yfinance 조회 구간 (end는 yfinance에서 미포함이라 하루 더함)"""
+        params = {'start': start.strftime('%Y-%m-%d')}
+        if end is not None:
+            params['end'] = (end + timedelta(days=1)).strftime('%Y-%m-%d')
+        return params
+
+    def _download_batch(self, tickers, start, end=None):
+        """전체 티커 일괄 다운로드 → {ticker: 일봉 DataFrame}"""
+        try:
+            with _DOWNLOAD_LOCK:
+                data = yf.download(
+                    tickers,
+                    group_by='ticker',
+                    threads=False,
+                    progress=False,
+                    **self._date_range(start, end)
+                )
+        except Exception as e:
+            print(f"Error batch fetching: {e}")
+            return {}
+
+        if data is None or data.empty:
+            return {}
+
+        histories = {}
+        for ticker in tickers:
+            try:
+                # 티커가 하나면 컬럼이 단일 레벨로 반환됨
+                frame = data[ticker] if len(tickers) > 1 else data
+                frame = frame.dropna(subset=['Close'])
+            except KeyError:
+                continue
+            if not frame.empty:
+                histories[ticker] = frame
+
+        return histories
+
+    def _download_individually(self, tickers, start, end=None):
+        """개별 티커 조회 (동시 요청 수 제한)"""
+        def fetch(ticker):
+            try:
+                return ticker, yf.Ticker(ticker).history(**self._date_range(start, end))
+            except Exception as e:
+                print(f"Error fetching {ticker}: {e}")
+                return ticker, None
+
+        workers = max(1, min(self.max_workers, len(tickers)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return {
+                ticker: hist for ticker, hist in executor.map(fetch, tickers)
+                if hist is not None and not hist.empty
+            }
+
+
+def _fixture_path(fixture_dir: str, ticker: str) -> str:
+    """티커 → 녹화 파일 경로 ('^GSPC' → '_GSPC.csv')"""
+    return os.path.join(fixture_dir, re.sub(r'[^A-Za-z0-9.=-]', '_', ticker) + '.csv')
+
+
+class ReplaySource(MarketDataSource):
+    """디스크에 녹화된 응답(CSV)을 재생하는 오프라인 소스"""
+
+    name = 'replay'
+
+    def __init__(self, fixture_dir: str, as_of: date = None):
+        """
+        Args:
+            fixture_dir: RecordingSource가 저장한 CSV 디렉터리
+            as_of: 재생 기준일 (None이면 녹화된 마지막 거래일 다음 날)
+        """
+        super().__init__()
+        self.fixture_dir = fixture_dir
+        self.as_of = as_of
+        self._frames = {}
+
+    def _load(self, ticker: str):
+        """녹화 파일 로드 (한 번 읽으면 메모리에 유지)"""
+        if ticker not in self._frames:
+            path = _fixture_path(self.fixture_dir, ticker)
+            if os.path.exists(path):
+                self._frames[ticker] = pd.read_csv(path, index_col='Date', parse_dates=True)
+            else:
+                self._frames[ticker] = None
+        return self._frames[ticker]
+
+    def fetch_history(self, tickers: List[str], start: date, end: date = None) -> Dict[str, pd.DataFrame]:
+        end = min(end, self.today()) if end is not None else self.today()
+
+        histories = {}
+        for ticker in tickers:
+            frame = self._load(ticker)
+            if frame is None:
+                continue
+            frame = frame.loc[pd.Timestamp(start):pd.Timestamp(end)]
+            if not frame.empty:
+                histories[ticker] = frame
+
+        return histories
+
+    def today(self) -> date:
+        if self.as_of is not None:
+            return self.as_of
+
+        last_dates = [
+            frame.index[-1].date()
+            for frame in (self._load(name[:-4]) for name in self._fixture_names())
+            if frame is not None and not frame.empty
+        ]
+        return max(last_dates) + timedelta(days=1) if last_dates else datetime.now().date()
+
+    def _fixture_names(self) -> List[str]:
+        if not os.path.isdir(self.fixture_dir):
+            return []
+        return [name for name in os.listdir(self.fixture_dir) if name.endswith('.csv')]
+
+
+class RecordingSource(MarketDataSource):
+    """다른 소스의 응답을 그대로 반환하면서 ReplaySource용 CSV로 녹화"""
+
+    name = 'recording'
+
+    def __init__(self, inner: MarketDataSource, fixture_dir: str):
+        super().__init__()
+        self.inner = inner
+        self.fixture_dir = fixture_dir
+        os.makedirs(fixture_dir, exist_ok=True)
+
+    @property
+    def concurrent_requests(self) -> bool:
+        return self.inner.concurrent_requests
+
+    def fetch_history(self, tickers: List[str], start: date, end: date = None) -> Dict[str, pd.DataFrame]:
+        histories = self.inner.fetch_history(tickers, start, end)
+        self.last_timings = self.inner.last_timings
+
+        for ticker, frame in histories.items():
+            path = _fixture_path(self.fixture_dir, ticker)
+            frame = frame[[c for c in HISTORY_COLUMNS if c in frame]]
+            frame.index = pd.DatetimeIndex(frame.index).tz_localize(None)
+            frame.index.name = 'Date'
+
+            # 기존 녹화분과 병합 (같은 날짜는 새 응답 우선)
+            if os.path.exists(path):
+                recorded = pd.read_csv(path, index_col='Date', parse_dates=True)
+                frame = pd.concat([frame, recorded])
+                frame = frame[~frame.index.duplicated(keep='first')].sort_index()
+
+            frame.to_csv(path)
+
+        return histories
+
+    def today(self) -> date:
+        return self.inner.today()
+
+
+class MockSource(MarketDataSource):
+    """
+    Mock 모드: 상관관계가 있는 가상 일봉 (SyntheticMarketGenerator)
+
+    티커마다 고정 구간(MOCK_START ~ 다음 해 말)의 경로를 한 번 만들어 두고 요청 구간만 잘라 준다.
+    그래서 같은 날짜는 조회 구간과 관계없이 항상 같은 종가다 (지표와 리포트 가격이 어긋나지 않음).
+    """
+
+    name = 'mock'
+
+    def __init__(self, seed: int = None, as_of: date = None):
+        """
+        Args:
+            seed: 난수 시드 (None이면 인스턴스마다 임의 — 인스턴스 안에서는 항상 같은 경로)
+            as_of: 기준일 (None이면 오늘, 경로 끝은 기준일 다음 해 말로 고정)
+        """
+        super().__init__()
+        self.seed = seed if seed is not None else int(np.random.SeedSequence().entropy % 2 ** 32)
+        self.as_of = as_of
+        self.anchor = date((as_of or datetime.now().date()).year + 1, 12, 31)
+        self._paths: Dict[str, pd.DataFrame] = {}
+        self._lock = threading.Lock()
+
+    def today(self) -> date:
+        return self.as_of or datetime.now().date()
+
+    def fetch_history(self, tickers: List[str], start: date, end: date = None) -> Dict[str, pd.DataFrame]:
+        end = min(end, self.today() - timedelta(days=1)) if end is not None else self.today() - timedelta(days=1)
+        histories = {}
+        for ticker in tickers:
+            frame = self._path(ticker).loc[pd.Timestamp(start):pd.Timestamp(end)]
+            if not frame.empty:
+                histories[ticker] = frame.copy()
+        return histories
+
+    def _path(self, ticker: str) -> pd.DataFrame:
+        """티커 전체 경로 (처음 요청 때 생성, 기준일 무렵 가격이 프로필 가격이 되도록 배율 조정)"""
+        with self._lock:
+            frame = self._paths.get(ticker)
+        if frame is not None:
+            return frame
+
+        n_days = int(np.busday_count(MOCK_START, self.anchor + timedelta(days=1)))
+        generator = SyntheticMarketGenerator({ticker: ticker}, seed=self.seed, per_ticker_streams=True)
+        frame = generator.histories(n_days, end=self.anchor)[ticker]
+        if ticker not in VOLATILITY_TICKERS:
+            reference = frame['Close'].asof(pd.Timestamp(self.today()))
+            price = EQUITY_PROFILES.get(ticker, DEFAULT_EQUITY_PROFILE)[0]
+            frame = frame * np.array([price / reference] * 4 + [1.0])
+
+        with self._lock:
+            return self._paths.setdefault(ticker, frame)
+
+
+# 테스트
+if __name__ == "__main__":
+    import tempfile
+
+    fixture_dir = tempfile.mkdtemp()
+    tickers = ['^GSPC', '^IXIC', '^DJI', '^VIX']
+    start = date.today() - timedelta(days=7)
+
+    # Mock 응답을 녹화한 뒤 그대로 재생
+    recorded = RecordingSource(MockSource(seed=7), fixture_dir).fetch_history(tickers, start)
+    replayed = ReplaySource(fixture_dir).fetch_history(tickers, start)
+
+    for ticker in tickers:
+        same = recorded[ticker]['Close'].round(6).tolist() == replayed[ticker]['Close'].round(6).tolist()
+        print(f"{ticker}: {replayed[ticker]['Close'].round(2).tolist()} (재생 일치: {same})")
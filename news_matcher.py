@@ -0,0 +1,431 @@
+# news_matcher.py
+# Phase 2: 뉴스 헤드라인 스트리밍 + 섹터 키워드/종목명 다중 패턴 매칭 (Aho-Corasick)
+
+import json
+import os
+import time
+import xml.etree.ElementTree as ET
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from report_templates import Template
+from stock_universe import StockUniverse
+
+# 기본 뉴스 피드 디렉터리 (환경변수 MAMOORI_NEWS로 파일/디렉터리 여러 개 지정 가능)
+DEFAULT_NEWS_DIR = os.path.join(os.getenv('MAMOORI_DATA_DIR', 'data'), 'news')
+
+# 피드로 읽는 확장자
+FEED_EXTENSIONS = ('.xml', '.rss', '.atom', '.json', '.jsonl', '.ndjson')
+
+_ATOM = '{http://www.w3.org/2005/Atom}'
+
+# 관련 뉴스 섹션 템플릿
+NEWS_SECTION = Template("""📰 **{primary_sector} 관련 뉴스** ({news.primary_count}건)
+{% for title in news.primary_headlines %}
+  • {title}
+{% endfor %}
+""")
+
+
+def _is_word_char(ch: str) -> bool:
+    """ASCII 영숫자 (영문 키워드 경계 판단용 — 한글은 조사가 붙으므로 경계를 보지 않음)"""
+    return ch.isascii() and ch.isalnum()
+
+
+class KeywordAutomaton:
+    """
+    다중 패턴 매칭 오토마톤 (Aho-Corasick)
+
+    패턴 수와 관계없이 헤드라인을 한 번만 훑는다.
+    실패 링크를 미리 따라가 상태마다 전이 dict를 완성해 두므로 (루트 전이는 공유)
+    글자당 dict 조회 한두 번으로 다음 상태가 정해진다.
+    영문은 대소문자를 구분하지 않고, 영숫자로 시작/끝나는 패턴은 단어 경계에서만 인정한다
+    ('AI'가 'said'에, 'EV'가 'every'에 걸리지 않도록).
+    """
+
+    def __init__(self, patterns: Dict[str, List]):
+        """
+        Args:
+            patterns: {패턴 문자열: [라벨, ...]} (라벨은 매칭 시 그대로 돌려줌)
+        """
+        goto = [{}]
+        outputs = [[]]
+        for pattern, labels in patterns.items():
+            pattern = pattern.lower()
+            if not pattern:
+                continue
+            state = 0
+            for ch in pattern:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    outputs.append([])
+                state = nxt
+            check_start = _is_word_char(pattern[0])
+            check_end = _is_word_char(pattern[-1])
+            outputs[state].extend((len(pattern), check_start, check_end, label) for label in labels)
+
+        # 너비 우선으로 실패 링크 계산 + 전이/출력 완성
+        # delta[s]: 실패 체인을 따라 루트 직전까지 모은 전이 (없으면 루트 전이로)
+        root = goto[0]
+        delta = [None] * len(goto)
+        delta[0] = {}
+        fail = [0] * len(goto)
+        queue = deque()
+        for nxt in goto[0].values():
+            queue.append(nxt)
+        while queue:
+            state = queue.popleft()
+            delta[state] = {**delta[fail[state]], **goto[state]}
+            outputs[state] = outputs[state] + outputs[fail[state]]
+            for ch, nxt in goto[state].items():
+                fail[nxt] = delta[fail[state]].get(ch) or root.get(ch, 0)
+                queue.append(nxt)
+
+        self.root = root
+        self.delta = delta
+        self.outputs = [tuple(out) if out else None for out in outputs]
+        self.states = len(goto)
+
+    def findall(self, text: str) -> List[Tuple[int, int, object]]:
+        """
+        Returns:
+            [(시작 위치, 끝 위치, 라벨), ...] (겹치는 매칭 포함, 끝 위치 순)
+        """
+        lowered = text.lower()
+        root = self.root
+        delta = self.delta
+        outputs = self.outputs
+        found = []
+        state = 0
+        for end, ch in enumerate(lowered, 1):
+            state = delta[state].get(ch) or root.get(ch, 0)
+            out = outputs[state]
+            if out is None:
+                continue
+            for length, check_start, check_end, label in out:
+                start = end - length
+                if check_start and start > 0 and _is_word_char(lowered[start - 1]):
+                    continue
+                if check_end and end < len(lowered) and _is_word_char(lowered[end]):
+                    continue
+                found.append((start, end, label))
+        return found
+
+    def labels(self, text: str) -> set:
+        """텍스트에 나온 라벨 집합"""
+        return {label for _, _, label in self.findall(text)}
+
+
+class NewsMatcher:
+    """
+    헤드라인 → 섹터/종목 매칭
+
+    섹터 키워드는 ('sector', 섹터 순번), 종목명과 종목코드는 ('stock', 종목 번호) 라벨이 된다.
+    종목이 언급되면 그 종목의 섹터도 언급된 것으로 센다.
+    오토마톤은 유니버스가 바뀔 때만 다시 만든다.
+    """
+
+    def __init__(self, universe: StockUniverse = None, include_codes: bool = True):
+        """
+        Args:
+            universe: 매칭 대상 유니버스 (None이면 첫 scan()에서 지정)
+            include_codes: 종목코드('005930')도 패턴으로 사용
+        """
+        self.include_codes = include_codes
+        self._universe = None
+        self._automaton = None
+        if universe is not None:
+            self._build(universe)
+
+    def _build(self, universe: StockUniverse) -> KeywordAutomaton:
+        if self._universe is not universe:
+            patterns = {}
+            for i, keywords in enumerate(universe.sector_keywords):
+                for keyword in keywords:
+                    patterns.setdefault(keyword, []).append(('sector', i))
+            for k, name in enumerate(universe.stock_names):
+                patterns.setdefault(name, []).append(('stock', k))
+                if self.include_codes:
+                    patterns.setdefault(universe.stock_codes[k], []).append(('stock', k))
+            self._automaton = KeywordAutomaton(patterns)
+            self._universe = universe
+        return self._automaton
+
+    def match(self, title: str, universe: StockUniverse = None) -> Tuple[set, set]:
+        """
+        Returns:
+            (섹터 순번 집합, 종목 번호 집합)
+        """
+        universe = universe or self._universe
+        sectors, stocks = set(), set()
+        for kind, i in self._build(universe).labels(title):
+            if kind == 'stock':
+                stocks.add(i)
+                sectors.add(int(universe.stock_sector[i]))
+            else:
+                sectors.add(i)
+        return sectors, stocks
+
+    def scan(self, headlines: Iterable[Dict], universe: StockUniverse = None, max_examples: int = 3) -> Dict:
+        """
+        헤드라인 스트림 전체 매칭 (같은 제목은 한 번만)
+
+        Args:
+            headlines: [{'title', 'source', 'published', 'link'}, ...] (iter_headlines() 결과)
+            universe: 매칭 대상 유니버스
+            max_examples: 섹터/종목별로 보관할 헤드라인 수
+
+        Returns:
+            {
+                'scanned': 읽은 헤드라인 수, 'matched': 하나 이상 매칭된 수,
+                'sectors': {섹터 key: {'name', 'count', 'headlines': [...]}},
+                'stocks': {종목코드: {'name', 'count', 'headlines': [...]}},
+                'elapsed': 초
+            }
+        """
+        universe = universe or self._universe
+        automaton = self._build(universe)
+        started = time.perf_counter()
+
+        sector_count = [0] * len(universe.sector_keys)
+        stock_count = [0] * len(universe)
+        sector_examples = [[] for _ in universe.sector_keys]
+        stock_examples = [[] for _ in range(len(universe))]
+        stock_sector = universe.stock_sector.tolist()
+
+        seen = set()
+        scanned = matched = 0
+        for item in headlines:
+            title = item.get('title')
+            if not title:
+                continue
+            key = ' '.join(title.lower().split())
+            if key in seen:
+                continue
+            seen.add(key)
+            scanned += 1
+
+            labels = automaton.labels(title)
+            if not labels:
+                continue
+            matched += 1
+
+            sectors = set()
+            for kind, i in labels:
+                if kind == 'stock':
+                    stock_count[i] += 1
+                    if len(stock_examples[i]) < max_examples:
+                        stock_examples[i].append(item)
+                    sectors.add(stock_sector[i])
+                else:
+                    sectors.add(i)
+            for i in sectors:
+                sector_count[i] += 1
+                if len(sector_examples[i]) < max_examples:
+                    sector_examples[i].append(item)
+
+        return {
+            'scanned': scanned,
+            'matched': matched,
+            'sectors': {
+                universe.sector_keys[i]: {
+                    'name': universe.sector_names[i], 'count': count, 'headlines': sector_examples[i]
+                }
+                for i, count in enumerate(sector_count) if count
+            },
+            'stocks': {
+                universe.stock_codes[k]: {
+                    'name': universe.stock_names[k], 'count': count, 'headlines': stock_examples[k]
+                }
+                for k, count in enumerate(stock_count) if count
+            },
+            'elapsed': time.perf_counter() - started
+        }
+
+
+def attach_news(impact_analysis: Dict, digest: Dict, max_headlines: int = 3) -> Dict:
+    """
+    한국 시장 영향 분석에 뉴스 매칭 결과 추가 (impact_analysis를 수정해 반환)
+
+    - impact_analysis['news']: 읽은/매칭 수, 대표 섹터 언급 수와 헤드라인, 언급 많은 섹터 순위
+    - top_stocks 각 종목: 'news_count', 'headlines'
+    """
+    sectors = digest['sectors']
+    primary = impact_analysis.get('primary_sector')
+    primary_news = [news for news in sectors.values() if news['name'] == primary]
+
+    for stock in impact_analysis.get('top_stocks', []):
+        news = digest['stocks'].get(stock.get('code'))
+        stock['news_count'] = news['count'] if news else 0
+        stock['headlines'] = [item['title'] for item in news['headlines'][:max_headlines]] if news else []
+
+    impact_analysis['news'] = {
+        'scanned': digest['scanned'],
+        'matched': digest['matched'],
+        'primary_count': sum(news['count'] for news in primary_news),
+        'primary_headlines': [
+            item['title'] for news in primary_news for item in news['headlines']
+        ][:max_headlines],
+        'sectors': sorted(
+            ((news['name'], news['count']) for news in sectors.values()), key=lambda item: -item[1]
+        )
+    }
+    return impact_analysis
+
+
+def _text(element, *tags) -> str:
+    for tag in tags:
+        child = element.find(tag)
+        if child is not None and child.text:
+            return child.text.strip()
+    return ''
+
+
+def _read_xml(path: str) -> Iterator[Dict]:
+    """RSS <item> / Atom <entry>를 하나씩 (파일 전체를 트리로 올리지 않음)"""
+    source = os.path.basename(path)
+    for _, element in ET.iterparse(path, events=('end',)):
+        if element.tag == 'item':
+            link = _text(element, 'link')
+            published = _text(element, 'pubDate')
+        elif element.tag == _ATOM + 'entry':
+            link_element = element.find(_ATOM + 'link')
+            link = link_element.get('href', '') if link_element is not None else ''
+            published = _text(element, _ATOM + 'updated', _ATOM + 'published')
+        else:
+            continue
+        yield {
+            'title': _text(element, 'title', _ATOM + 'title'),
+            'source': source,
+            'published': published,
+            'link': link
+        }
+        element.clear()
+
+
+def _from_record(record, source: str) -> Dict:
+    if isinstance(record, str):
+        return {'title': record, 'source': source, 'published': '', 'link': ''}
+    return {
+        'title': record.get('title') or record.get('headline') or '',
+        'source': record.get('source') or source,
+        'published': record.get('published') or record.get('pubDate') or '',
+        'link': record.get('link') or record.get('url') or ''
+    }
+
+
+def _read_json(path: str) -> Iterator[Dict]:
+    """JSON 배열 / {'items'|'articles': [...]} / 한 줄 하나 JSONL"""
+    source = os.path.basename(path)
+    if path.lower().endswith(('.jsonl', '.ndjson')):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield _from_record(json.loads(line), source)
+        return
+
+    with open(path, encoding='utf-8') as f:
+        spec = json.load(f)
+    if isinstance(spec, dict):
+        spec = spec.get('items') or spec.get('articles') or []
+    for record in spec:
+        yield _from_record(record, source)
+
+
+def feed_files(paths: List[str] = None, since: float = None) -> List[str]:
+    """
+    피드 파일 목록 (디렉터리는 하위까지, 파일명 순)
+
+    Args:
+        paths: 파일/디렉터리 목록 (None이면 MAMOORI_NEWS 또는 data/news)
+        since: 이 시각(epoch) 이후 수정된 파일만
+    """
+    if paths is None:
+        env = os.getenv('MAMOORI_NEWS')
+        paths = env.split(os.pathsep) if env else [DEFAULT_NEWS_DIR]
+
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(
+                    os.path.join(root, name) for name in sorted(names) if name.lower().endswith(FEED_EXTENSIONS)
+                )
+        elif os.path.isfile(path):
+            files.append(path)
+
+    if since is not None:
+        files = [path for path in files if os.path.getmtime(path) >= since]
+    return files
+
+
+def iter_headlines(paths: List[str] = None, since: float = None) -> Iterator[Dict]:
+    """
+    피드 파일들의 헤드라인 스트림
+
+    읽을 수 없는 파일은 건너뛴다 (한 피드가 깨져도 나머지는 매칭).
+    """
+    for path in feed_files(paths, since):
+        reader = _read_xml if path.lower().endswith(('.xml', '.rss', '.atom')) else _read_json
+        try:
+            yield from reader(path)
+        except (OSError, ValueError, ET.ParseError, AttributeError) as e:
+            print(f"Error reading news feed {path}: {e}")
+
+
+def format_news_section(impact_analysis: Dict, target: str = 'markdown') -> str:
+    """한국 시장 섹션 아래 붙일 관련 뉴스 (target: 출력 형식)"""
+    news = impact_analysis.get('news')
+    if not news or not news['primary_headlines']:
+        return ""
+    return NEWS_SECTION.render(impact_analysis, target)
+
+
+# 테스트
+if __name__ == "__main__":
+    import tempfile
+    import numpy as np
+    from korean_stock_mapper import KoreanStockMapper
+
+    mapper = KoreanStockMapper()
+    universe = mapper.universe
+
+    # 샘플 피드 (RSS + JSONL)
+    feed_dir = tempfile.mkdtemp()
+    with open(os.path.join(feed_dir, 'sample.rss'), 'w', encoding='utf-8') as f:
+        f.write("""<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0"><channel><title>샘플</title>
+<item><title>SK하이닉스, HBM 메모리 공급 확대</title><link>https://example.com/1</link></item>
+<item><title>Nvidia said AI demand remains strong</title><link>https://example.com/2</link></item>
+<item><title>현대차 EV 판매 호조… every region up</title><link>https://example.com/3</link></item>
+</channel></rss>""")
+    with open(os.path.join(feed_dir, 'wire.jsonl'), 'w', encoding='utf-8') as f:
+        f.write(json.dumps({'title': '삼성전자 반도체 실적 전망 상향', 'url': 'https://example.com/4'}, ensure_ascii=False) + '\n')
+        f.write(json.dumps({'title': '카카오, 플랫폼 규제 우려'}, ensure_ascii=False) + '\n')
+        f.write(json.dumps({'title': 'SK하이닉스, HBM 메모리 공급 확대'}, ensure_ascii=False) + '\n')
+
+    matcher = NewsMatcher(universe)
+    digest = matcher.scan(iter_headlines([feed_dir]))
+    print(f"=== 샘플 피드: {digest['scanned']}건 중 {digest['matched']}건 매칭 ===")
+    for key, news in digest['sectors'].items():
+        print(f"  {news['name']}: {news['count']}건 — {[item['title'] for item in news['headlines']]}")
+
+    analysis = mapper.analyze_korea_impact({'NASDAQ': {'change_pct': 2.3}, 'DOW': {'change_pct': 0.5}})
+    attach_news(analysis, digest)
+    print(mapper.format_korea_section(analysis) + format_news_section(analysis))
+
+    # 처리량: 가상 헤드라인 10만 건
+    rng = np.random.default_rng(0)
+    words = ['시장', '전망', '상승', '하락', 'report', 'says', 'market', '투자자', '실적', '발표', '금리', 'Fed']
+    vocabulary = words * 4 + list(universe.stock_names) + [k for keywords in universe.sector_keywords for k in keywords]
+    titles = [
+        {'title': ' '.join(rng.choice(vocabulary, size=rng.integers(6, 14))) + f' #{i}'}
+        for i in range(100_000)
+    ]
+    digest = matcher.scan(titles)
+    print(f"\n{digest['scanned']:,}건 매칭: {digest['elapsed']:.2f}초"
+          f" (분당 {digest['scanned'] / digest['elapsed'] * 60:,.0f}건, {matcher._automaton.states}개 상태)")
@@ -0,0 +1,201 @@
+# portfolio_scoring.py
+# Phase 2: 구독자별 보유 종목 영향 평가 (희소 보유 행렬 × 종목 영향 점수, 한 번에 계산)
+
+import csv
+import sys
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+
+from korean_stock_mapper import KoreanStockMapper
+from report_templates import Template
+from stock_universe import StockUniverse
+
+# 포트폴리오 영향 섹션 템플릿
+PORTFOLIO_SECTION = Template("""
+💼 **내 보유 종목 영향** {direction|direction} ({exposure:+.2f})
+{% for stock in top_stocks %}
+  {stock.direction|direction} {stock.name} ({stock.sector}) {stock.contribution:+.2f}
+{% endfor %}
+""")
+
+
+class PortfolioBook:
+    """
+    구독자 × 종목 보유 비중 (희소 COO)
+
+    보유 한 건마다 (구독자 번호, 종목코드, 비중)만 병렬 배열로 저장한다.
+    종목코드 → 유니버스 종목 번호 변환은 유니버스가 바뀔 때만 다시 한다.
+    """
+
+    def __init__(self, holdings: Iterable[Tuple[str, str, float]]):
+        """
+        Args:
+            holdings: [(구독자 id, 종목코드, 비중), ...] (비중 단위는 자유, 보통 평가금액 비율)
+        """
+        subscriber_index = {}
+        rows, codes, weights = [], [], []
+        for subscriber, code, weight in holdings:
+            subscriber = str(subscriber)
+            if subscriber not in subscriber_index:
+                subscriber_index[sys.intern(subscriber)] = len(subscriber_index)
+            rows.append(subscriber_index[subscriber])
+            codes.append(sys.intern(str(code)))
+            weights.append(float(weight))
+
+        self.subscribers = list(subscriber_index)
+        self.subscriber_index = subscriber_index
+        self.codes = codes
+        self._rows = np.array(rows, dtype=np.int32)
+        self._weights = np.array(weights, dtype='f8')
+
+        # 유니버스별 종목 번호 (-1 = 유니버스에 없는 종목)
+        self._resolved_for = None
+        self._stock_index = None
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _resolve(self, universe: StockUniverse) -> np.ndarray:
+        if self._resolved_for is not universe:
+            self._stock_index = np.array([universe.code_index.get(code, -1) for code in self.codes], dtype=np.int32)
+            self._resolved_for = universe
+        return self._stock_index
+
+    def score(self, impact: np.ndarray, universe: StockUniverse, top_k: int = 3) -> Dict:
+        """
+        전 구독자 노출과 종목별 기여 상위 top_k를 한 번에 계산
+
+        노출[구독자] = Σ 비중 × 영향 점수 (COO 행렬 × 점수 벡터를 np.bincount 한 번으로)
+        상위 종목은 (구독자, -|기여|) 순으로 정렬한 뒤 구독자별 앞쪽 top_k개만 남긴다.
+
+        Args:
+            impact: (len(universe),) KoreanStockMapper.stock_impact_scores() 결과
+            universe: impact와 같은 순서의 유니버스
+            top_k: 구독자별 상위 종목 수
+
+        Returns:
+            {
+                'subscribers': 구독자 id 목록,
+                'exposure': (n_subscribers,) 가중 영향 점수,
+                'top_rows': (m,) 구독자 번호, 'top_stocks': (m,) 유니버스 종목 번호,
+                'top_contribution': (m,) 기여 점수  — 구독자 번호 순, 구독자 안에서는 |기여| 내림차순
+                'unknown': 유니버스에 없는 보유 건수
+            }
+        """
+        stock_index = self._resolve(universe)
+        known = stock_index >= 0
+        rows = self._rows[known]
+        stocks = stock_index[known]
+
+        contribution = self._weights[known] * np.asarray(impact, dtype='f8')[stocks]
+        exposure = np.bincount(rows, weights=contribution, minlength=len(self.subscribers))
+
+        # 구독자별 |기여| 내림차순 (동점이면 입력 순서)
+        order = np.lexsort((np.arange(len(rows)), -np.abs(contribution), rows))
+        sorted_rows = rows[order]
+        group_start = np.searchsorted(sorted_rows, sorted_rows, side='left')
+        keep = (np.arange(len(order)) - group_start < top_k) & (contribution[order] != 0)
+        picked = order[keep]
+
+        return {
+            'subscribers': self.subscribers,
+            'exposure': exposure,
+            'top_rows': rows[picked],
+            'top_stocks': stocks[picked],
+            'top_contribution': contribution[picked],
+            'unknown': int((~known).sum())
+        }
+
+
+def score_subscribers(mapper: KoreanStockMapper, book: PortfolioBook, us_market_data: Dict,
+                      top_k: int = 3, impact: np.ndarray = None, universe: StockUniverse = None) -> Dict[str, Dict]:
+    """
+    오늘 미국 시장 기준 구독자별 포트폴리오 영향
+
+    analyze_korea_impact()를 구독자마다 부르지 않고 종목 점수 벡터를 한 번 만든 뒤
+    전 구독자를 한 번의 희소 행렬곱으로 평가한다.
+
+    Args:
+        impact: 이미 계산한 종목 점수 벡터 (None이면 us_market_data로 계산)
+        universe: impact를 계산한 유니버스 (None이면 mapper의 현재 유니버스)
+
+    Returns:
+        {구독자 id: {'exposure': float, 'direction': str,
+                     'top_stocks': [{'name', 'code', 'sector', 'contribution', 'direction'}, ...]}}
+    """
+    if universe is None:
+        universe = mapper.universe
+    if impact is None:
+        impact = mapper.stock_impact_scores(us_market_data, universe)
+    scored = book.score(impact, universe, top_k=top_k)
+
+    def direction(value):
+        return 'positive' if value > 0 else 'negative' if value < 0 else 'neutral'
+
+    results = {
+        subscriber: {'exposure': float(exposure), 'direction': direction(exposure), 'top_stocks': []}
+        for subscriber, exposure in zip(scored['subscribers'], scored['exposure'])
+    }
+    for row, k, value in zip(scored['top_rows'].tolist(), scored['top_stocks'].tolist(),
+                             scored['top_contribution'].tolist()):
+        results[scored['subscribers'][row]]['top_stocks'].append({
+            'name': universe.stock_names[k],
+            'code': universe.stock_codes[k],
+            'sector': universe.sector_names[universe.stock_sector[k]],
+            'contribution': value,
+            'direction': direction(value)
+        })
+
+    return results
+
+
+def load_portfolios(path: str) -> PortfolioBook:
+    """
+    보유 종목 CSV 로드
+
+    컬럼: subscriber, code, weight (weight 생략 시 1)
+    """
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        return PortfolioBook(
+            (row['subscriber'], row['code'], row.get('weight') or 1.0) for row in csv.DictReader(f)
+        )
+
+
+def format_portfolio_section(result: Dict, target: str = 'markdown') -> str:
+    """구독자 한 명의 포트폴리오 영향 섹션 (target: 출력 형식)"""
+    if not result['top_stocks']:
+        return ""
+    return PORTFOLIO_SECTION.render(result, target)
+
+
+# 테스트
+if __name__ == "__main__":
+    import time
+
+    mapper = KoreanStockMapper()
+    universe = mapper.universe
+    today = {
+        'NASDAQ': {'change_pct': 2.3},
+        'S&P 500': {'change_pct': 1.1},
+        'DOW': {'change_pct': -1.3},
+        '엔비디아': {'change_pct': 5.0},
+        '테슬라': {'change_pct': -3.0}
+    }
+
+    # 가상 구독자 20,000명 × 3~8종목
+    rng = np.random.default_rng(0)
+    holdings = []
+    for i in range(20_000):
+        picks = rng.choice(len(universe), size=rng.integers(3, 9), replace=False)
+        weights = rng.dirichlet(np.ones(len(picks)))
+        holdings.extend((f'user{i}', universe.stock_codes[k], w) for k, w in zip(picks, weights))
+
+    book = PortfolioBook(holdings)
+    started = time.perf_counter()
+    results = score_subscribers(mapper, book, today)
+    elapsed = time.perf_counter() - started
+
+    print(f"=== 구독자 {len(book.subscribers):,}명 / 보유 {len(book):,}건 평가: {elapsed * 1000:.1f}ms ===")
+    for subscriber in book.subscribers[:3]:
+        print(f"\n[{subscriber}]" + format_portfolio_section(results[subscriber]))
@@ -0,0 +1,147 @@
+# price_store.py
+# Phase 2: 종목별 일봉(OHLCV) 로컬 저장소
+
+import os
+import re
+from datetime import date
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+# 종목별 파일 한 개 = 날짜순 정렬된 구조화 배열
+PRICE_DTYPE = np.dtype([
+    ('date', 'M8[D]'),
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('volume', '<f8'),
+])
+
+# yfinance 컬럼명 → 저장소 필드명
+_FRAME_COLUMNS = {
+    'Open': 'open',
+    'High': 'high',
+    'Low': 'low',
+    'Close': 'close',
+    'Volume': 'volume',
+}
+
+
+class PriceStore:
+    """심볼별 .npy 파일에 일봉을 저장하고 memory-map으로 읽는 컬럼형 저장소"""
+
+    def __init__(self, root: str = None):
+        """
+        Args:
+            root: 저장 디렉터리 (환경변수 MAMOORI_DATA_DIR/prices 사용 가능)
+        """
+        self.root = root or os.path.join(os.getenv('MAMOORI_DATA_DIR', 'data'), 'prices')
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, symbol: str) -> str:
+        """심볼 → 파일 경로 ('^GSPC' → '_GSPC.npy')"""
+        return os.path.join(self.root, re.sub(r'[^A-Za-z0-9.=-]', '_', symbol) + '.npy')
+
+    def symbols(self) -> List[str]:
+        """저장된 파일 목록 (파일명 기준)"""
+        return sorted(name[:-4] for name in os.listdir(self.root) if name.endswith('.npy'))
+
+    def read(self, symbol: str, start=None, end=None, tail: int = None) -> np.ndarray:
+        """
+        저장된 일봉 조회 (파싱 없이 memory-map)
+
+        Args:
+            symbol: 티커
+            start: 시작일 (포함)
+            end: 종료일 (포함)
+            tail: 최근 N개만
+
+        Returns:
+            PRICE_DTYPE 구조화 배열 (없으면 빈 배열)
+        """
+        path = self._path(symbol)
+        if not os.path.exists(path):
+            return np.empty(0, dtype=PRICE_DTYPE)
+
+        rows = np.load(path, mmap_mode='r')
+
+        # 날짜가 정렬되어 있으므로 이진 탐색으로 구간 자르기
+        if start is not None:
+            rows = rows[np.searchsorted(rows['date'], np.datetime64(start, 'D'), side='left'):]
+        if end is not None:
+            rows = rows[:np.searchsorted(rows['date'], np.datetime64(end, 'D'), side='right')]
+        if tail is not None:
+            rows = rows[-tail:]
+
+        return rows
+
+    def read_frame(self, symbol: str, start=None, end=None, tail: int = None) -> pd.DataFrame:
+        """read() 결과를 yfinance와 같은 형태의 DataFrame으로 변환"""
+        rows = self.read(symbol, start=start, end=end, tail=tail)
+        frame = pd.DataFrame(
+            {column: rows[field] for column, field in _FRAME_COLUMNS.items()},
+            index=pd.DatetimeIndex(rows['date'], name='Date')
+        )
+        return frame
+
+    def last_date(self, symbol: str) -> Optional[date]:
+        """마지막으로 저장된 거래일"""
+        rows = self.read(symbol, tail=1)
+        if len(rows) == 0:
+            return None
+        return rows['date'][0].astype(object)
+
+    def write(self, symbol: str, frame: pd.DataFrame) -> int:
+        """
+        새 일봉 병합 저장 (같은 날짜는 새 값으로 덮어씀)
+
+        Args:
+            symbol: 티커
+            frame: Open/High/Low/Close/Volume 컬럼과 날짜 인덱스를 가진 DataFrame
+
+        Returns:
+            새로 추가된 거래일 수
+        """
+        if frame is None or frame.empty:
+            return 0
+
+        frame = frame.dropna(subset=['Close'])
+        new_rows = np.empty(len(frame), dtype=PRICE_DTYPE)
+        new_rows['date'] = pd.DatetimeIndex(frame.index).tz_localize(None).values.astype('M8[D]')
+        for column, field in _FRAME_COLUMNS.items():
+            new_rows[field] = frame[column].to_numpy(dtype='f8') if column in frame else np.nan
+
+        existing = np.array(self.read(symbol))
+        merged = np.concatenate([new_rows, existing])
+
+        # 날짜 기준 중복 제거 (앞쪽 = 새 데이터 우선) 후 정렬
+        _, first = np.unique(merged['date'], return_index=True)
+        merged = merged[first]
+
+        # 임시 파일에 쓴 뒤 교체 → 읽는 쪽은 항상 완전한 파일만 봄
+        path = self._path(symbol)
+        tmp_path = path + '.tmp.npy'
+        np.save(tmp_path, merged)
+        os.replace(tmp_path, path)
+
+        return len(merged) - len(existing)
+
+
+# 테스트
+if __name__ == "__main__":
+    import tempfile
+
+    store = PriceStore(tempfile.mkdtemp())
+
+    sample = pd.DataFrame(
+        {'Open': [1.0, 2.0, 3.0], 'High': [1.5, 2.5, 3.5], 'Low': [0.5, 1.5, 2.5],
+         'Close': [1.2, 2.2, 3.2], 'Volume': [100, 200, 300]},
+        index=pd.date_range('2025-10-20', periods=3)
+    )
+
+    print(f"추가된 일봉: {store.write('^GSPC', sample)}")
+    print(f"중복 재저장: {store.write('^GSPC', sample.iloc[-1:])}")
+    print(f"마지막 거래일: {store.last_date('^GSPC')}")
+    print(store.read_frame('^GSPC', start='2025-10-21'))
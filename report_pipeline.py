@@ -0,0 +1,256 @@
+# report_pipeline.py
+# Phase 2: 구독자별 리포트 구성 (공통 분석은 한 번 → 구독자별로는 섹션 선택/렌더링만)
+
+import json
+import os
+import time
+from types import MappingProxyType
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+from market_data_collector import MARKET_REPORT, MarketDataCollector
+from news_matcher import format_news_section
+from portfolio_scoring import PortfolioBook, format_portfolio_section, score_subscribers
+from report_templates import PARSE_MODE_TARGETS
+
+# 구독자 설정 파일 (환경변수 MAMOORI_SUBSCRIBERS로 변경 가능)
+DEFAULT_SUBSCRIBERS_PATH = os.path.join(os.getenv('MAMOORI_DATA_DIR', 'data'), 'subscribers.json')
+
+# 리포트 섹션 (기본 순서)
+SECTIONS = ('market', 'insight', 'korea', 'portfolio', 'news')
+
+
+def freeze(value):
+    """dict → 읽기 전용 매핑, list → tuple, ndarray → 쓰기 금지 복사본 (재귀)"""
+    if isinstance(value, (dict, MappingProxyType)):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    if isinstance(value, np.ndarray):
+        value = value.copy()
+        value.flags.writeable = False
+    return value
+
+
+class MarketSnapshot:
+    """
+    하루 한 번 계산하는 공통 단계 결과 (읽기 전용)
+
+    시장 데이터·지표·심리(report_context)·한국 영향·AI 인사이트와
+    종목 영향 점수 벡터를 얼려 두고, 구독자별 단계는 여기서 읽기만 한다.
+    """
+
+    __slots__ = ('created_at', 'market_data', 'indicators', 'report_context', 'korea_data', 'ai_insight',
+                 'universe', 'impact_scores')
+
+    def __init__(self, inputs: Dict, universe, impact_scores: np.ndarray):
+        """
+        Args:
+            inputs: MarketDataCollector.prepare_report() 결과
+            universe: impact_scores를 계산한 StockUniverse
+            impact_scores: 유니버스 종목별 영향 점수
+        """
+        values = {
+            'created_at': time.time(),
+            'market_data': freeze(inputs['market_data']),
+            'indicators': freeze(inputs['indicators']),
+            'report_context': freeze(inputs['report_context']),
+            'korea_data': freeze(inputs['korea_data']),
+            'ai_insight': freeze(inputs['ai_insight']),
+            'universe': universe,
+            'impact_scores': freeze(impact_scores)
+        }
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("MarketSnapshot is read-only")
+
+    def __delattr__(self, name):
+        raise AttributeError("MarketSnapshot is read-only")
+
+
+def normalize_subscriber(subscriber: Dict) -> Dict:
+    """
+    구독자 설정 정리
+
+    {'chat_id', 'sections', 'watchlist', 'parse_mode'}
+        - sections: SECTIONS 중 보낼 섹션 (순서대로, 기본: 전체 — 관심 종목이 없으면 portfolio 제외)
+        - watchlist: 종목코드 목록 또는 {종목코드: 비중}
+        - parse_mode: 'MarkdownV2' | 'HTML' | 'Markdown' | None (기본 MarkdownV2)
+    """
+    watchlist = subscriber.get('watchlist') or {}
+    if not isinstance(watchlist, dict):
+        watchlist = {code: 1.0 for code in watchlist}
+
+    sections = subscriber.get('sections')
+    if sections is None:
+        sections = [name for name in SECTIONS if name != 'portfolio' or watchlist]
+    unknown = [name for name in sections if name not in SECTIONS]
+    if unknown:
+        raise ValueError(f"unknown sections for {subscriber.get('chat_id')}: {unknown}")
+
+    parse_mode = subscriber.get('parse_mode', 'MarkdownV2')
+    if parse_mode not in PARSE_MODE_TARGETS:
+        raise ValueError(f"unknown parse_mode for {subscriber.get('chat_id')}: {parse_mode}")
+
+    return {
+        'chat_id': str(subscriber['chat_id']),
+        'sections': tuple(sections),
+        'watchlist': {str(code): float(weight) for code, weight in watchlist.items()},
+        'parse_mode': parse_mode
+    }
+
+
+def load_subscribers(path: str = None) -> List[Dict]:
+    """구독자 설정 JSON 로드 (파일이 없으면 빈 목록)"""
+    path = path or os.getenv('MAMOORI_SUBSCRIBERS') or DEFAULT_SUBSCRIBERS_PATH
+    try:
+        with open(path, encoding='utf-8') as f:
+            return [normalize_subscriber(subscriber) for subscriber in json.load(f)]
+    except FileNotFoundError:
+        return []
+
+
+class ReportPipeline:
+    """
+    공통 단계(build_snapshot) 한 번 + 구독자별 단계(render_all)
+
+    구독자별 단계는 섹션 선택과 렌더링만 한다. (섹션, 형식, 포트폴리오 결과)가 같은 섹션과
+    (섹션 목록, 형식, 포트폴리오 결과)가 같은 리포트는 한 번만 만들어 공유한다.
+    관심 종목 영향은 전 구독자를 한 번의 희소 행렬곱으로 계산한다 (portfolio_scoring).
+    """
+
+    def __init__(self, collector: MarketDataCollector, subscribers: Iterable[Dict] = (), top_k: int = 3):
+        """
+        Args:
+            collector: 공통 단계를 계산할 MarketDataCollector
+            subscribers: 구독자 설정 목록 (normalize_subscriber 형식)
+            top_k: 포트폴리오 섹션에 보여줄 종목 수
+        """
+        self.collector = collector
+        self.top_k = top_k
+        self.subscribers = [normalize_subscriber(subscriber) for subscriber in subscribers]
+        holdings = [
+            (subscriber['chat_id'], code, weight)
+            for subscriber in self.subscribers if 'portfolio' in subscriber['sections']
+            for code, weight in subscriber['watchlist'].items()
+        ]
+        self.book = PortfolioBook(holdings) if holdings else None
+        self.last_render_stats = {}
+
+    def build_snapshot(self, deadline=None) -> MarketSnapshot:
+        """공통 단계: 수집 → 지표 → 한국 영향 → 뉴스 → AI 인사이트 → 종목 영향 점수"""
+        inputs = self.collector.prepare_report(deadline)
+        mapper = self.collector.korea_mapper
+        universe = mapper.universe
+        impact = mapper.stock_impact_scores(inputs['valid_data'], universe)
+        return MarketSnapshot(inputs, universe, impact)
+
+    def render_all(self, snapshot: MarketSnapshot) -> Dict[str, Dict]:
+        """
+        구독자별 단계: 섹션 선택 + 렌더링
+
+        Returns:
+            {chat_id: {'text': str, 'parse_mode': str or None}}
+        """
+        started = time.perf_counter()
+        portfolios = {}
+        if self.book is not None:
+            portfolios = score_subscribers(self.collector.korea_mapper, self.book, snapshot.market_data,
+                                           top_k=self.top_k, impact=snapshot.impact_scores,
+                                           universe=snapshot.universe)
+        scored = time.perf_counter()
+
+        section_memo, report_memo = {}, {}
+        renders = 0
+        results = {}
+        for subscriber in self.subscribers:
+            sections = subscriber['sections']
+            target = PARSE_MODE_TARGETS[subscriber['parse_mode']]
+            portfolio = portfolios.get(subscriber['chat_id']) if 'portfolio' in sections else None
+            variant = _portfolio_key(portfolio)
+
+            text = report_memo.get((sections, target, variant))
+            if text is None:
+                parts = []
+                for name in sections:
+                    key = (name, target, variant if name == 'portfolio' else None)
+                    part = section_memo.get(key)
+                    if part is None:
+                        part = section_memo[key] = self._render_section(snapshot, name, target, portfolio)
+                        renders += 1
+                    parts.append(part)
+                text = report_memo[(sections, target, variant)] = ''.join(parts)
+
+            results[subscriber['chat_id']] = {'text': text, 'parse_mode': subscriber['parse_mode']}
+
+        finished = time.perf_counter()
+        self.last_render_stats = {
+            'subscribers': len(results),
+            'unique_reports': len(report_memo),
+            'section_renders': renders,
+            'portfolio_time': round(scored - started, 4),
+            'render_time': round(finished - scored, 4),
+            'per_subscriber_us': round((finished - started) / max(len(results), 1) * 1e6, 2)
+        }
+        return results
+
+    def _render_section(self, snapshot: MarketSnapshot, name: str, target: str, portfolio: Dict = None) -> str:
+        collector = self.collector
+        if name == 'market':
+            return MARKET_REPORT.render(snapshot.report_context, target)
+        if name == 'insight':
+            return collector.analyst.format_insight_section(snapshot.ai_insight, target)
+        if name == 'korea':
+            return collector.korea_mapper.format_korea_section(snapshot.korea_data, target)
+        if name == 'news':
+            return format_news_section(snapshot.korea_data, target)
+        return format_portfolio_section(portfolio, target) if portfolio else ""
+
+
+def _portfolio_key(portfolio: Dict = None):
+    """포트폴리오 섹션 출력이 같으면 같은 키 (표시 자릿수 기준)"""
+    if not portfolio:
+        return None
+    return (portfolio['direction'], f"{portfolio['exposure']:+.2f}") + tuple(
+        (stock['name'], stock['sector'], stock['direction'], f"{stock['contribution']:+.2f}")
+        for stock in portfolio['top_stocks']
+    )
+
+
+# 테스트
+if __name__ == "__main__":
+    import random
+
+    collector = MarketDataCollector(mock_mode=True)
+    codes = collector.korea_mapper.universe.stock_codes
+
+    # 가상 구독자 10,000명 (섹션 선택 / 형식 / 관심 종목이 제각각)
+    rng = random.Random(0)
+    subscribers = []
+    for i in range(10_000):
+        subscriber = {'chat_id': 100000 + i, 'parse_mode': rng.choice(['MarkdownV2', 'HTML', None])}
+        if rng.random() < 0.6:
+            subscriber['watchlist'] = rng.sample(codes, rng.randint(1, 5))
+        if rng.random() < 0.3:
+            subscriber['sections'] = rng.sample(['market', 'insight', 'korea', 'news'], 2)
+        subscribers.append(subscriber)
+
+    pipeline = ReportPipeline(collector, subscribers)
+
+    started = time.perf_counter()
+    snapshot = pipeline.build_snapshot()
+    print(f"=== 공통 단계: {time.perf_counter() - started:.3f}초 ===")
+
+    reports = pipeline.render_all(snapshot)
+    print(f"구독자 단계: {pipeline.last_render_stats}")
+
+    chat_id = next(chat_id for chat_id, report in reports.items() if report['parse_mode'] == 'HTML')
+    print(f"\n[{chat_id}] HTML\n{reports[chat_id]['text'][:400]}")
+
+    try:
+        snapshot.ai_insight = {}
+    except AttributeError as e:
+        print(f"\n스냅샷 수정 시도: {e}")
@@ -0,0 +1,250 @@
+# report_templates.py
+# Phase 2: 리포트 템플릿 엔진 (한 번 컴파일 → 출력 형식별 렌더링)
+
+import html
+import re
+from types import MappingProxyType
+from typing import Callable, Dict, List
+
+# 출력 형식 → Telegram parse_mode
+TARGETS = {
+    'markdown': 'Markdown',      # 기존 리포트 텍스트 (**굵게**, 이스케이프 없음)
+    'markdownv2': 'MarkdownV2',  # Telegram MarkdownV2 (특수문자 이스케이프)
+    'html': 'HTML',
+    'plain': None
+}
+
+# Telegram parse_mode → 출력 형식
+PARSE_MODE_TARGETS = {parse_mode: target for target, parse_mode in TARGETS.items()}
+
+_MARKDOWNV2_ESCAPES = str.maketrans({char: '\\' + char for char in '_*[]()~`>#+-=|{}.!\\'})
+
+# 형식별 (이스케이프, 굵게 시작, 굵게 끝)
+_STYLES = {
+    'markdown': (str, '**', '**'),
+    'markdownv2': (lambda text: text.translate(_MARKDOWNV2_ESCAPES), '*', '*'),
+    'html': (lambda text: html.escape(text, quote=False), '<b>', '</b>'),
+    'plain': (str, '', '')
+}
+
+
+def _direction_emoji(direction) -> str:
+    return "🟢" if direction == 'positive' else "🔴" if direction == 'negative' else "⚪"
+
+
+# {값|필터} — 템플릿 안에서 쓰는 값 변환
+FILTERS: Dict[str, Callable] = {
+    'direction': _direction_emoji,                          # positive/negative/그 외 → 🟢/🔴/⚪
+    'updown': lambda value: "🔴" if value < 0 else "🟢",    # 등락률 부호
+    'join': lambda values: ', '.join(str(value) for value in values)
+}
+
+_TOKEN = re.compile(r'\{%\s*(.+?)\s*%\}\n?|\{([^{}]+)\}|\*\*')
+_FIELD = re.compile(r'^\s*([\w.]+)\s*(?:\|\s*(\w+)\s*)?(?::(.*))?$')
+
+
+def convert_markup(text: str, target: str) -> str:
+    """
+    이미 만들어진 기존 형식(**굵게**) 텍스트 → target 형식
+
+    짝이 맞지 않는 마지막 ** 는 글자 그대로 이스케이프한다.
+    """
+    escape, bold_open, bold_close = _STYLES[target]
+    if target == 'markdown':
+        return text
+
+    parts = text.split('**')
+    if len(parts) % 2 == 0:
+        parts[-2:] = [parts[-2] + '**' + parts[-1]]
+    out = []
+    for i, part in enumerate(parts):
+        if i % 2:
+            out += [bold_open, escape(part), bold_close]
+        else:
+            out.append(escape(part))
+    return ''.join(out)
+
+
+def _getter(path: str) -> Callable:
+    """'stock.name' → scope에서 값을 꺼내는 함수 (없으면 None)"""
+    head, *rest = path.split('.')
+    if not rest:
+        return lambda scope: scope.get(head)
+
+    def get(scope):
+        value = scope.get(head)
+        for key in rest:
+            if value is None:
+                return None
+            value = value.get(key) if isinstance(value, (dict, MappingProxyType)) else getattr(value, key, None)
+        return value
+
+    return get
+
+
+class TemplateSyntaxError(ValueError):
+    pass
+
+
+class Template:
+    """
+    리포트 템플릿 (생성 시 한 번 파싱, 형식별 렌더 함수는 처음 쓸 때 한 번 컴파일)
+
+    문법:
+        {경로}, {경로:서식}, {경로|필터}, {경로|필터:서식}   값 (경로는 'stock.name'처럼 점으로)
+        {% for item in 목록 %} … {% endfor %}           반복 ({% for i, item in 목록 %}이면 i는 1부터)
+        {% if 경로 %} … {% else %} … {% endif %}        조건 ('if not 경로'도 가능)
+        **굵게**                                          형식별 굵게 표시로 변환
+
+    태그 바로 뒤의 줄바꿈 하나는 출력하지 않는다.
+    글자 부분은 컴파일할 때, 값은 렌더링할 때 형식에 맞게 이스케이프한다.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self._tree = self._parse(source)
+        self._compiled: Dict[str, List] = {}
+
+    def render(self, context: Dict, target: str = 'markdown') -> str:
+        ops = self._compiled.get(target)
+        if ops is None:
+            ops = self._compiled[target] = self._compile(self._tree, target, [0])
+        out = []
+        _run(ops, context, out)
+        return ''.join(out)
+
+    @staticmethod
+    def _parse(source: str) -> List:
+        """소스 → 노드 트리 ('text', str) / ('bold',) / ('var', ...) / ('for', ...) / ('if', ...)"""
+        root = []
+        stack = [('root', root)]
+        position = 0
+        for match in _TOKEN.finditer(source):
+            body = stack[-1][1]
+            if match.start() > position:
+                body.append(('text', source[position:match.start()]))
+            position = match.end()
+
+            tag, field = match.group(1), match.group(2)
+            if tag is None and field is None:
+                body.append(('bold',))
+            elif field is not None:
+                parsed = _FIELD.match(field)
+                if not parsed:
+                    raise TemplateSyntaxError(f"bad field: {{{field}}}")
+                path, filter_name, spec = parsed.groups()
+                if filter_name and filter_name not in FILTERS:
+                    raise TemplateSyntaxError(f"unknown filter: {filter_name}")
+                body.append(('var', _getter(path), FILTERS.get(filter_name), spec or ''))
+            else:
+                words = tag.split()
+                if words[0] == 'for' and len(words) >= 4 and words[-2] == 'in':
+                    names = [name.strip() for name in ' '.join(words[1:-2]).split(',')]
+                    node = ('for', names, _getter(words[-1]), [])
+                    body.append(node)
+                    stack.append(('for', node[3]))
+                elif words[0] == 'if' and len(words) in (2, 3):
+                    negate = len(words) == 3 and words[1] == 'not'
+                    node = ('if', _getter(words[-1]), negate, [], [])
+                    body.append(node)
+                    stack.append(('if', node[3], node))
+                elif words == ['else'] and stack[-1][0] == 'if':
+                    stack[-1] = ('else', stack[-1][2][4])
+                elif words == ['endfor'] and stack[-1][0] == 'for':
+                    stack.pop()
+                elif words == ['endif'] and stack[-1][0] in ('if', 'else'):
+                    stack.pop()
+                else:
+                    raise TemplateSyntaxError(f"unexpected tag: {{% {tag} %}}")
+
+        if len(stack) > 1:
+            raise TemplateSyntaxError(f"unclosed {{% {stack[-1][0]} %}}")
+        if position < len(source):
+            root.append(('text', source[position:]))
+        return root
+
+    def _compile(self, nodes: List, target: str, bold_count: List[int]) -> List:
+        """노드 트리 → 렌더 연산 목록 (글자는 미리 이스케이프해 이웃끼리 합침)"""
+        escape, bold_open, bold_close = _STYLES[target]
+        ops = []
+
+        def emit(text):
+            if ops and isinstance(ops[-1], str):
+                ops[-1] += text
+            else:
+                ops.append(text)
+
+        for node in nodes:
+            kind = node[0]
+            if kind == 'text':
+                emit(escape(node[1]))
+            elif kind == 'bold':
+                emit(bold_close if bold_count[0] % 2 else bold_open)
+                bold_count[0] += 1
+            elif kind == 'var':
+                ops.append(('var', node[1], node[2], node[3], escape))
+            elif kind == 'for':
+                ops.append(('for', node[1], node[2], self._compile(node[3], target, bold_count)))
+            else:
+                ops.append(('if', node[1], node[2], self._compile(node[3], target, bold_count),
+                            self._compile(node[4], target, bold_count)))
+        return ops
+
+
+def _run(ops: List, scope: Dict, out: List):
+    append = out.append
+    for op in ops:
+        if op.__class__ is str:
+            append(op)
+            continue
+        kind = op[0]
+        if kind == 'var':
+            _, get, filter_func, spec, escape = op
+            value = get(scope)
+            if filter_func is not None:
+                value = filter_func(value)
+            elif value is None:
+                continue
+            append(escape(format(value, spec)))
+        elif kind == 'for':
+            _, names, get, body = op
+            inner = dict(scope)
+            for i, item in enumerate(get(scope) or (), 1):
+                if len(names) == 2:
+                    inner[names[0]] = i
+                inner[names[-1]] = item
+                _run(body, inner, out)
+        else:
+            _, get, negate, body, else_body = op
+            _run(body if bool(get(scope)) != negate else else_body, scope, out)
+
+
+# 테스트
+if __name__ == "__main__":
+    import time
+
+    template = Template("""📌 **주목 관련주 TOP {count}**
+{% for i, stock in top_stocks %}
+{i}. {stock.direction|direction} **{stock.name}** ({stock.sector}) {stock.change:+.1f}%
+{% endfor %}
+{% if note %}
+⚠️ {note}
+{% endif %}
+""")
+    context = {
+        'count': 2,
+        'top_stocks': [
+            {'name': '삼성전자', 'sector': '반도체', 'direction': 'positive', 'change': 1.25},
+            {'name': 'LG_에너지솔루션', 'sector': '2차전지', 'direction': 'negative', 'change': -0.8}
+        ],
+        'note': '<장 초반 변동성 주의!>'
+    }
+
+    for target in TARGETS:
+        print(f"=== {target} ===")
+        print(template.render(context, target))
+
+    started = time.perf_counter()
+    for _ in range(10_000):
+        template.render(context, 'markdownv2')
+    print(f"렌더링 1회: {(time.perf_counter() - started) / 10_000 * 1e6:.1f}µs")
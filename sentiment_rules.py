@@ -0,0 +1,196 @@
+# sentiment_rules.py
+# Phase 2: 표 기반 시장 심리 규칙 엔진 (하루 단위 / 전체 기간 일괄 평가)
+
+import json
+import os
+from typing import Dict, List
+
+import numpy as np
+
+# 기본 규칙 파일
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sentiment_rules.json')
+
+# 조건 연산자 (isnan/notnan은 기준값 무시)
+OPERATORS = {
+    '>': np.greater,
+    '>=': np.greater_equal,
+    '<': np.less,
+    '<=': np.less_equal,
+    '==': np.equal,
+    'isnan': lambda values, _: np.isnan(values),
+    'notnan': lambda values, _: ~np.isnan(values),
+}
+
+
+class RuleTable:
+    """
+    컴파일된 규칙 표
+
+    규칙은 위에서부터 먼저 맞는 것이 적용되는 if/elif 사다리와 같다.
+    각 규칙의 조건(AND)을 날짜 배열 전체에 대한 불리언 마스크로 계산하고,
+    맞는 첫 규칙 번호를 argmax로 한 번에 고른다.
+    """
+
+    def __init__(self, name: str, spec: Dict):
+        """
+        Args:
+            name: 표 이름
+            spec: {'rules': [{'when': [[필드, 연산자, 기준값], ...], 출력...}, ...], 'default': {출력...}}
+        """
+        self.name = name
+        self.outputs = [
+            {key: value for key, value in rule.items() if key != 'when'}
+            for rule in spec['rules']
+        ] + [dict(spec['default'])]
+
+        # 조건을 평탄화해 기준값을 한 배열로 관리 (임계값 변형 격자 평가에 사용)
+        self.conditions = []
+        for rule_index, rule in enumerate(spec['rules']):
+            for field, op, threshold in rule['when']:
+                if op not in OPERATORS:
+                    raise ValueError(f"{name}: 지원하지 않는 연산자 '{op}'")
+                self.conditions.append((rule_index, field, op))
+        self.thresholds = np.array(
+            [float(threshold) for rule in spec['rules'] for _, _, threshold in rule['when']]
+        )
+        self.fields = sorted({field for _, field, _ in self.conditions})
+
+    @property
+    def default_index(self) -> int:
+        return len(self.outputs) - 1
+
+    def evaluate(self, features: Dict[str, np.ndarray], thresholds: np.ndarray = None) -> np.ndarray:
+        """
+        날짜별 적용 규칙 번호 계산
+
+        Args:
+            features: {필드: (n_days,) 배열}
+            thresholds: 기준값 (n_conditions,) 또는 변형 격자 (..., n_conditions)
+                        None이면 표에 정의된 값
+
+        Returns:
+            규칙 번호 배열 (thresholds 앞쪽 차원 + (n_days,)), 맞는 규칙이 없으면 default_index
+        """
+        thresholds = self.thresholds if thresholds is None else np.asarray(thresholds, dtype='f8')
+        lead_shape = thresholds.shape[:-1]
+        n_days = len(np.atleast_1d(features[self.fields[0]])) if self.fields else 1
+
+        masks = np.ones((len(self.outputs),) + lead_shape + (n_days,), dtype=bool)
+        for c, (rule_index, field, op) in enumerate(self.conditions):
+            values = np.asarray(features[field], dtype='f8')
+            with np.errstate(invalid='ignore'):
+                masks[rule_index] &= OPERATORS[op](values, thresholds[..., c, None])
+
+        # 마지막 행(default)은 항상 True → 맞는 첫 규칙 번호
+        return np.argmax(masks, axis=0)
+
+    def select(self, indices: np.ndarray, key: str) -> np.ndarray:
+        """규칙 번호 배열 → 출력값 배열"""
+        values = np.empty(len(self.outputs), dtype=object)
+        values[:] = [output[key] for output in self.outputs]
+        return values[indices]
+
+    def first(self, **features) -> Dict:
+        """
+        하루치 값으로 평가해 적용된 규칙의 출력 반환
+
+        텍스트 출력의 {필드} 자리는 같은 이름의 값으로 채운다.
+        """
+        index = int(self.evaluate({k: np.array([v], dtype='f8') for k, v in features.items()
+                                   if isinstance(v, (int, float))})[0])
+        return {
+            key: value.format(**features) if isinstance(value, str) else value
+            for key, value in self.outputs[index].items()
+        }
+
+
+def load_rule_tables(path: str = None) -> Dict[str, RuleTable]:
+    """
+    규칙 파일 로드 및 컴파일
+
+    Args:
+        path: JSON 규칙 파일 (환경변수 MAMOORI_RULES 사용 가능)
+    """
+    path = path or os.getenv('MAMOORI_RULES') or DEFAULT_RULES_PATH
+    with open(path, encoding='utf-8') as f:
+        specs = json.load(f)
+    return {name: RuleTable(name, spec) for name, spec in specs.items()}
+
+
+def threshold_grid(table: RuleTable, variations: Dict[int, List[float]]) -> np.ndarray:
+    """
+    기준값 변형 격자 생성
+
+    Args:
+        table: 규칙 표
+        variations: {조건 번호: 시험할 기준값 목록} (나머지 조건은 표의 값 유지)
+
+    Returns:
+        (n_variants, n_conditions) 기준값 배열
+    """
+    axes = [variations.get(c, [t]) for c, t in enumerate(table.thresholds)]
+    mesh = np.meshgrid(*axes, indexing='ij')
+    return np.stack([m.ravel() for m in mesh], axis=-1)
+
+
+def score_history(tables: Dict[str, RuleTable], change_pct: Dict[str, np.ndarray],
+                  price: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    전체 기간의 종합 심리/VIX 판단을 한 번에 계산
+
+    Args:
+        tables: load_rule_tables() 결과
+        change_pct: {'S&P 500': 배열, 'NASDAQ': 배열, ...} 일별 등락률
+        price: {'VIX': 배열, ...} 일별 종가
+
+    Returns:
+        {'sentiment': 배열, 'vix_analysis': 배열}
+    """
+    market = tables['market_sentiment']
+    vix = tables['vix_level']
+
+    features = {
+        'sp500_change': change_pct['S&P 500'],
+        'nasdaq_change': change_pct['NASDAQ'],
+        'vix': price.get('VIX', np.full(len(change_pct['S&P 500']), np.nan)),
+    }
+
+    return {
+        'sentiment': market.select(market.evaluate(features), 'sentiment'),
+        'vix_analysis': vix.select(vix.evaluate(features), 'vix_analysis'),
+    }
+
+
+# 테스트
+if __name__ == "__main__":
+    import time
+    from synthetic_market import SyntheticMarketGenerator
+
+    tables = load_rule_tables()
+    sample = SyntheticMarketGenerator(seed=11).generate(2520)
+    names = sample['names']
+    change_pct = {name: sample['change_pct'][:, j] for j, name in enumerate(names)}
+    price = {name: sample['close'][:, j] for j, name in enumerate(names)}
+
+    started = time.perf_counter()
+    scored = score_history(tables, change_pct, price)
+    elapsed = time.perf_counter() - started
+
+    print(f"=== 10년({len(sample['dates']):,}거래일) 종합 심리 평가: {elapsed * 1000:.1f}ms ===")
+    labels, counts = np.unique(scored['sentiment'], return_counts=True)
+    for label, count in zip(labels, counts):
+        print(f"  {label}: {count:,}일")
+
+    # 강세/약세 기준값(±0.5 ~ ±2.0%) 격자를 한 번에 평가
+    market = tables['market_sentiment']
+    levels = np.linspace(0.5, 2.0, 7)
+    grid = threshold_grid(market, {0: levels, 1: levels})
+    features = {'sp500_change': change_pct['S&P 500'], 'nasdaq_change': change_pct['NASDAQ']}
+
+    started = time.perf_counter()
+    indices = market.evaluate(features, grid)
+    elapsed = time.perf_counter() - started
+
+    print(f"\n=== 기준값 변형 {len(grid)}개 × {len(sample['dates']):,}거래일: {elapsed * 1000:.1f}ms ===")
+    for thresholds, row in list(zip(grid, indices))[::8]:
+        print(f"  강세 기준 S&P>{thresholds[0]:.2f}, 나스닥>{thresholds[1]:.2f}: 강세 {np.mean(row == 0):.1%}")
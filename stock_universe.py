@@ -0,0 +1,284 @@
+# stock_universe.py
+# Phase 2: 한국 섹터/종목 유니버스 (외부 파일 로드 + 압축 저장 + 변경 시 자동 재로드)
+
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from bisect import bisect_right
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# 기본 유니버스 파일
+DEFAULT_UNIVERSE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'korea_universe.json')
+
+
+class StockUniverse:
+    """
+    섹터/종목 유니버스 (불변)
+
+    종목 하나마다 dict를 두지 않고 섹터 순서로 묶은 병렬 배열에 저장한다.
+    섹터 i의 종목은 stock_* 배열의 [sector_start[i], sector_start[i + 1]) 구간이며
+    구간 안의 순서는 파일에 적힌 순서를 따른다. 문자열은 sys.intern으로 공유한다.
+    """
+
+    __slots__ = (
+        'sector_keys', 'sector_names', 'sector_triggers', 'sector_thresholds', 'sector_keywords',
+        'sector_start', 'stock_codes', 'stock_names', 'stock_weights', 'stock_sector',
+        'code_index', 'trigger_index', 'source_path', 'source_mtime'
+    )
+
+    def __init__(self, sectors: List[Dict], stocks: List[Tuple], source_path: str = None,
+                 source_mtime: float = None):
+        """
+        Args:
+            sectors: [{'key', 'name', 'us_trigger', 'threshold', 'keywords'}, ...] (순서 = 동점 시 우선순위)
+            stocks: [(종목코드, 종목명, 섹터 key, 가중치), ...]
+            source_path: 로드한 파일 경로
+            source_mtime: 로드 시점 파일 수정 시각
+        """
+        ordinal = {}
+        for i, sector in enumerate(sectors):
+            if sector['key'] in ordinal:
+                raise ValueError(f"중복 섹터: {sector['key']}")
+            ordinal[sector['key']] = i
+
+        self.sector_keys = tuple(sys.intern(s['key']) for s in sectors)
+        self.sector_names = tuple(sys.intern(s['name']) for s in sectors)
+        self.sector_triggers = tuple(sys.intern(s['us_trigger']) for s in sectors)
+        self.sector_thresholds = tuple(float(s['threshold']) for s in sectors)
+        self.sector_keywords = tuple(tuple(sys.intern(k) for k in s.get('keywords', ())) for s in sectors)
+
+        # 섹터 순으로 안정 정렬 → 섹터별 연속 구간
+        try:
+            sector_of = np.array([ordinal[stock[2]] for stock in stocks], dtype=np.int32)
+        except KeyError as e:
+            raise ValueError(f"정의되지 않은 섹터: {e.args[0]}") from None
+        order = np.argsort(sector_of, kind='stable')
+
+        self.stock_codes = tuple(sys.intern(str(stocks[i][0])) for i in order)
+        self.stock_names = tuple(sys.intern(stocks[i][1]) for i in order)
+        self.stock_weights = np.array([float(stocks[i][3]) for i in order], dtype='f8')
+        self.stock_sector = sector_of[order]
+        self.sector_start = np.searchsorted(self.stock_sector, np.arange(len(sectors) + 1)).astype(np.int32)
+        self.code_index = {code: k for k, code in enumerate(self.stock_codes)}
+
+        # 미국 지수 → (오름차순 임계값, 같은 순서의 섹터 순번)
+        by_trigger = {}
+        for i, (trigger, threshold) in enumerate(zip(self.sector_triggers, self.sector_thresholds)):
+            by_trigger.setdefault(trigger, []).append((threshold, i))
+        self.trigger_index = {
+            trigger: (tuple(t for t, _ in sorted(entries)), tuple(i for _, i in sorted(entries)))
+            for trigger, entries in by_trigger.items()
+        }
+
+        self.source_path = source_path
+        self.source_mtime = source_mtime
+
+    def __len__(self) -> int:
+        return len(self.stock_codes)
+
+    def triggered(self, trigger: str, change_pct: float) -> List[Tuple[float, int]]:
+        """
+        |등락률|이 임계값 이상인 섹터
+
+        Returns:
+            [(임계값, 섹터 순번), ...]
+        """
+        thresholds, ordinals = self.trigger_index.get(trigger, ((), ()))
+        count = bisect_right(thresholds, abs(change_pct))
+        return list(zip(thresholds[:count], ordinals[:count]))
+
+    def sector_stocks(self, ordinal: int) -> range:
+        """섹터의 종목 번호 구간"""
+        return range(int(self.sector_start[ordinal]), int(self.sector_start[ordinal + 1]))
+
+    def with_overrides(self, thresholds: Dict[str, float] = None, weights: Dict[str, float] = None) -> 'StockUniverse':
+        """
+        임계값/가중치만 바꾼 새 유니버스 (백테스트 파라미터 탐색용)
+
+        Args:
+            thresholds: {섹터 key: 임계값}
+            weights: {종목코드: 가중치}
+        """
+        thresholds = thresholds or {}
+        weights = weights or {}
+        sectors = [
+            {
+                'key': key,
+                'name': self.sector_names[i],
+                'us_trigger': self.sector_triggers[i],
+                'threshold': thresholds.get(key, self.sector_thresholds[i]),
+                'keywords': self.sector_keywords[i]
+            }
+            for i, key in enumerate(self.sector_keys)
+        ]
+        stocks = [
+            (code, self.stock_names[k], self.sector_keys[self.stock_sector[k]],
+             weights.get(code, float(self.stock_weights[k])))
+            for k, code in enumerate(self.stock_codes)
+        ]
+        return StockUniverse(sectors, stocks)
+
+    def to_mapping(self) -> Dict[str, Dict]:
+        """기존 중첩 dict 형태 (sector_mapping 호환용, 호출할 때마다 새로 생성)"""
+        return {
+            key: {
+                'name': self.sector_names[i],
+                'stocks': [
+                    {'name': self.stock_names[k], 'code': self.stock_codes[k], 'weight': float(self.stock_weights[k])}
+                    for k in self.sector_stocks(i)
+                ],
+                'us_trigger': self.sector_triggers[i],
+                'threshold': self.sector_thresholds[i],
+                'keywords': list(self.sector_keywords[i])
+            }
+            for i, key in enumerate(self.sector_keys)
+        }
+
+
+def _read_csv(path: str) -> Tuple[List[Dict], List[Tuple]]:
+    """
+    CSV 유니버스 (종목 한 줄씩)
+
+    컬럼: code, name, sector, weight, sector_name, us_trigger, threshold, keywords('|' 구분)
+    섹터 속성은 해당 섹터가 처음 나온 줄에서 읽는다.
+    """
+    sectors = {}
+    stocks = []
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        for row in csv.DictReader(f):
+            key = row['sector']
+            if key not in sectors:
+                sectors[key] = {
+                    'key': key,
+                    'name': row.get('sector_name') or key,
+                    'us_trigger': row['us_trigger'],
+                    'threshold': row['threshold'],
+                    'keywords': [k for k in (row.get('keywords') or '').split('|') if k]
+                }
+            stocks.append((row['code'], row['name'], key, row.get('weight') or 1.0))
+    return list(sectors.values()), stocks
+
+
+def load_universe(path: str = None) -> StockUniverse:
+    """
+    유니버스 파일 로드
+
+    Args:
+        path: JSON 또는 CSV 파일 (환경변수 MAMOORI_UNIVERSE 사용 가능)
+              JSON: {'sectors': [{'key', 'name', 'us_trigger', 'threshold', 'keywords'}, ...],
+                     'stocks': [[code, name, sector, weight], ...]}
+    """
+    path = path or os.getenv('MAMOORI_UNIVERSE') or DEFAULT_UNIVERSE_PATH
+    mtime = os.path.getmtime(path)
+
+    if path.lower().endswith('.csv'):
+        sectors, stocks = _read_csv(path)
+    else:
+        with open(path, encoding='utf-8') as f:
+            spec = json.load(f)
+        sectors, stocks = spec['sectors'], spec['stocks']
+
+    return StockUniverse(sectors, stocks, source_path=path, source_mtime=mtime)
+
+
+class UniverseWatcher:
+    """
+    유니버스 파일 변경 감시
+
+    current()를 호출할 때 check_interval초에 한 번만 수정 시각을 확인하고,
+    바뀌었으면 새 유니버스를 끝까지 만든 뒤 참조 하나만 교체한다.
+    읽는 쪽은 교체 전이나 후의 완전한 유니버스 중 하나만 보게 된다.
+    새 파일이 잘못되었으면 기존 유니버스를 계속 사용한다.
+    """
+
+    def __init__(self, path: str = None, check_interval: float = 5.0, universe: StockUniverse = None):
+        """
+        Args:
+            path: 유니버스 파일 (None이면 load_universe 기본값)
+            check_interval: 파일 수정 시각 확인 간격 (초, 0이면 매번)
+            universe: 이미 만든 유니버스 (파일 없이 고정, 재로드하지 않음)
+        """
+        self.universe = universe if universe is not None else load_universe(path)
+        self.path = self.universe.source_path
+        self.check_interval = check_interval
+        self.reloads = 0
+        self._next_check = time.monotonic() + check_interval
+        self._lock = threading.Lock()
+
+    def current(self) -> StockUniverse:
+        """최신 유니버스"""
+        if time.monotonic() >= self._next_check:
+            self.reload_if_changed()
+        return self.universe
+
+    def reload_if_changed(self) -> bool:
+        """파일이 바뀌었으면 다시 로드 → 교체 여부"""
+        # 다른 스레드가 이미 확인 중이면 기존 유니버스로 진행
+        if not self._lock.acquire(blocking=False):
+            return False
+        try:
+            self._next_check = time.monotonic() + self.check_interval
+            if self.path is None:
+                return False
+            try:
+                mtime = os.path.getmtime(self.path)
+            except OSError:
+                return False
+            if mtime == self.universe.source_mtime:
+                return False
+
+            try:
+                universe = load_universe(self.path)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                print(f"Error reloading universe: {e}")
+                return False
+
+            self.universe = universe
+            self.reloads += 1
+            return True
+        finally:
+            self._lock.release()
+
+
+# 테스트
+if __name__ == "__main__":
+    import tempfile
+    import tracemalloc
+
+    universe = load_universe()
+    print(f"=== 기본 유니버스: {len(universe.sector_keys)}개 섹터, {len(universe)}개 종목 ===")
+    print(f"NASDAQ +1.2% 발동 섹터: {[universe.sector_names[i] for _, i in universe.triggered('NASDAQ', 1.2)]}")
+
+    # 전체 상장사 규모(2,500종목) 가상 유니버스로 메모리 확인
+    rng = np.random.default_rng(0)
+    sectors = [
+        {'key': f's{i}', 'name': f'섹터{i % 40}', 'us_trigger': ['NASDAQ', 'S&P 500', 'DOW'][i % 3],
+         'threshold': round(float(rng.uniform(0.5, 2.0)), 2), 'keywords': ['반도체', 'AI']}
+        for i in range(40)
+    ]
+    stocks = [(f'{i:06d}', f'종목{i}', f's{rng.integers(40)}', round(float(rng.uniform(0.3, 1.0)), 2))
+              for i in range(2500)]
+    path = os.path.join(tempfile.mkdtemp(), 'universe.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'sectors': sectors, 'stocks': stocks}, f, ensure_ascii=False)
+
+    tracemalloc.start()
+    watcher = UniverseWatcher(path, check_interval=0)
+    compact = tracemalloc.get_traced_memory()[0]
+    mapping = watcher.current().to_mapping()
+    nested = tracemalloc.get_traced_memory()[0] - compact
+    tracemalloc.stop()
+    print(f"\n2,500종목 메모리: 병렬 배열(문자열 포함) {compact / 1024:.0f}KB"
+          f" / 같은 내용을 중첩 dict로 만들면 추가 {nested / 1024:.0f}KB")
+
+    # 파일 수정 → 다음 조회에서 교체
+    stocks.append(('999999', '신규상장', 's0', 1.0))
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'sectors': sectors, 'stocks': stocks}, f, ensure_ascii=False)
+    os.utime(path, (time.time() + 1, time.time() + 1))
+    print(f"재로드 후: {len(watcher.current())}개 종목 (재로드 {watcher.reloads}회)")
@@ -0,0 +1,391 @@
+# stub_servers.py
+# Phase 2: 외부 API 로컬 대역 서버 (네트워크 없이 실제 HTTP 경로 점검용)
+
+import json
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+# 기본 응답 (MarketAnalyst 프롬프트의 4개 항목 형식)
+DEFAULT_INSIGHT_REPLY = """1. 핵심 인사이트
+미국 기술주 강세가 이어지며 국내 반도체 섹터에 우호적인 흐름이 예상됩니다. 다만 금리 경로에 대한 경계는 남아 있습니다.
+
+2. 주요 포인트
+- 나스닥 중심의 상승으로 성장주 선호 확대
+- 메모리 업황 기대가 국내 대형 반도체주로 연결
+- 변동성 지수 안정으로 위험선호 회복
+
+3. 주의사항
+단기 급등 이후 차익 실현 매물이 나올 수 있습니다.
+
+4. 투자 시사점
+- 분할 접근으로 변동성 관리
+- 실적 발표 일정 확인 후 비중 조절
+"""
+
+
+class _QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass  # 클라이언트가 먼저 끊은 연결 (타임아웃 점검 등)
+
+
+class StubServer:
+    """
+    백그라운드 스레드에서 도는 로컬 HTTP 서버 (with 문으로 시작/종료)
+
+    받은 요청은 requests에 (경로, 본문) 순서대로 남고,
+    연결(keep-alive 포함) 수는 connections로 센다.
+    """
+
+    handler_class = BaseHTTPRequestHandler
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        self.requests: List[Dict] = []
+        self.connections = 0
+        self._lock = threading.Lock()
+
+        stub = self
+
+        class Handler(self.handler_class):
+            protocol_version = 'HTTP/1.1'
+            server_stub = stub
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connections += 1
+
+            def log_message(self, format, *args):
+                pass  # 테스트 출력은 조용히
+
+        self._server = _QuietServer((host, port), Handler)
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record(self, path: str, body) -> None:
+        with self._lock:
+            self.requests.append({'path': path, 'body': body})
+
+    def start(self) -> 'StubServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> 'StubServer':
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class _JsonHandler(BaseHTTPRequestHandler):
+    """JSON 본문 읽기 / JSON·청크 응답 쓰기"""
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        return json.loads(raw) if raw else {}
+
+    def send_json(self, status: int, payload: Dict, headers: Dict = None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, str(value))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def write_chunk(self, data: bytes):
+        """Transfer-Encoding: chunked 한 조각 (빈 bytes면 종료 조각)"""
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+
+class AnthropicStub(StubServer):
+    """
+    Anthropic Messages API 대역 (POST /v1/messages)
+
+    stream=true면 SSE 이벤트(message_start → content_block_delta … → message_stop)를
+    chunk_size 글자씩 나눠 보내고, 아니면 한 번에 JSON으로 응답한다.
+    cache_control이 붙은 system 블록은 두 번째 요청부터 cache_read_input_tokens로 센다.
+
+    메시지 배치: POST /v1/messages/batches → GET /v1/messages/batches/{id} (batch_delay초 뒤 ended)
+    → GET /v1/messages/batches/{id}/results (JSONL)
+    """
+
+    def __init__(self, reply: str = DEFAULT_INSIGHT_REPLY, first_token_delay: float = 0.0,
+                 chunk_delay: float = 0.0, chunk_size: int = 24, status: int = 200,
+                 batch_delay: float = 0.0, **kwargs):
+        """
+        Args:
+            reply: 응답 텍스트
+            first_token_delay: 첫 텍스트 조각 전 대기 (초)
+            chunk_delay: 조각 사이 대기 (초)
+            chunk_size: 조각당 글자 수
+            status: 200이 아니면 오류 응답 (429, 529 등)
+            batch_delay: 메시지 배치가 끝나기까지 걸리는 시간 (초)
+        """
+        self.reply = reply
+        self.first_token_delay = first_token_delay
+        self.chunk_delay = chunk_delay
+        self.chunk_size = chunk_size
+        self.status = status
+        self.batch_delay = batch_delay
+        self.batches: Dict[str, Dict] = {}
+        self._cached_prefixes = set()
+        self.handler_class = _AnthropicHandler
+        super().__init__(**kwargs)
+
+    def usage_for(self, body: Dict) -> Dict:
+        """요청 크기로 흉내 낸 토큰 사용량 (글자 수 / 2, cache_control 블록까지는 프롬프트 캐시)"""
+        system = body.get('system', '')
+        blocks = system if isinstance(system, list) else [{'type': 'text', 'text': system}]
+        cached = [i for i, block in enumerate(blocks) if block.get('cache_control')]
+        split = cached[-1] + 1 if cached else 0
+
+        prefix = json.dumps(blocks[:split], ensure_ascii=False) if cached else ''
+        rest = json.dumps(blocks[split:], ensure_ascii=False) + json.dumps(body.get('messages', []), ensure_ascii=False)
+
+        usage = {'input_tokens': len(rest) // 2, 'output_tokens': len(self.reply) // 2,
+                 'cache_creation_input_tokens': 0, 'cache_read_input_tokens': 0}
+        if prefix:
+            with self._lock:
+                hit = prefix in self._cached_prefixes
+                self._cached_prefixes.add(prefix)
+            usage['cache_read_input_tokens' if hit else 'cache_creation_input_tokens'] = len(prefix) // 2
+        return usage
+
+    def message_for(self, body: Dict) -> Dict:
+        """비스트리밍 응답 메시지"""
+        return {
+            'id': f"msg_stub_{len(self.requests)}",
+            'type': 'message',
+            'role': 'assistant',
+            'model': body.get('model'),
+            'content': [{'type': 'text', 'text': self.reply}],
+            'stop_reason': 'end_turn',
+            'usage': self.usage_for(body)
+        }
+
+
+class _AnthropicHandler(_JsonHandler):
+
+    def do_GET(self):
+        stub = self.server_stub
+        stub.record(self.path, None)
+
+        parts = self.path.strip('/').split('/')
+        batch = stub.batches.get(parts[3]) if len(parts) >= 4 and parts[:3] == ['v1', 'messages', 'batches'] else None
+        if batch is None:
+            self.send_json(404, {'type': 'error', 'error': {'type': 'not_found_error', 'message': self.path}})
+            return
+
+        ended = time.time() >= batch['ends_at']
+        if len(parts) == 4:
+            self.send_json(200, {
+                'id': batch['id'],
+                'type': 'message_batch',
+                'processing_status': 'ended' if ended else 'in_progress',
+                'request_counts': {'processing': 0 if ended else len(batch['results']),
+                                   'succeeded': len(batch['results']) if ended else 0},
+                'results_url': f"{stub.url}/v1/messages/batches/{batch['id']}/results" if ended else None
+            })
+            return
+
+        body = ''.join(json.dumps(result, ensure_ascii=False) + '\n' for result in batch['results']).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/binary')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        stub = self.server_stub
+        body = self.read_json()
+        stub.record(self.path, body)
+
+        if self.path == '/v1/messages/batches' and self.headers.get('x-api-key'):
+            batch_id = f"msgbatch_stub_{len(stub.batches) + 1}"
+            stub.batches[batch_id] = {
+                'id': batch_id,
+                'ends_at': time.time() + stub.batch_delay,
+                'results': [
+                    {'custom_id': request['custom_id'],
+                     'result': {'type': 'succeeded', 'message': stub.message_for(request['params'])}}
+                    for request in body.get('requests', [])
+                ]
+            }
+            self.send_json(200, {'id': batch_id, 'type': 'message_batch', 'processing_status': 'in_progress'})
+            return
+
+        if self.path != '/v1/messages':
+            self.send_json(404, {'type': 'error', 'error': {'type': 'not_found_error', 'message': self.path}})
+            return
+        if not self.headers.get('x-api-key'):
+            self.send_json(401, {'type': 'error', 'error': {'type': 'authentication_error', 'message': 'no key'}})
+            return
+        if stub.status != 200:
+            error_type = 'rate_limit_error' if stub.status == 429 else 'overloaded_error'
+            self.send_json(stub.status, {'type': 'error', 'error': {'type': error_type, 'message': 'stub'}},
+                           headers={'retry-after': 1})
+            return
+
+        if not body.get('stream'):
+            time.sleep(stub.first_token_delay)
+            self.send_json(200, stub.message_for(body))
+            return
+
+        message = stub.message_for(body)
+        usage = message['usage']
+        message.update(content=[], stop_reason=None, usage={**usage, 'output_tokens': 1})
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def event(name, data):
+            self.write_chunk(f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode('utf-8'))
+
+        event('message_start', {'type': 'message_start', 'message': message})
+        event('content_block_start', {'type': 'content_block_start', 'index': 0,
+                                      'content_block': {'type': 'text', 'text': ''}})
+        time.sleep(stub.first_token_delay)
+        for i in range(0, len(stub.reply), stub.chunk_size):
+            if i:
+                time.sleep(stub.chunk_delay)
+            event('content_block_delta', {'type': 'content_block_delta', 'index': 0,
+                                          'delta': {'type': 'text_delta', 'text': stub.reply[i:i + stub.chunk_size]}})
+        event('content_block_stop', {'type': 'content_block_stop', 'index': 0})
+        event('message_delta', {'type': 'message_delta', 'delta': {'stop_reason': 'end_turn'},
+                                'usage': {'output_tokens': usage['output_tokens']}})
+        event('message_stop', {'type': 'message_stop'})
+        self.write_chunk(b'')
+
+
+
+class TelegramStub(StubServer):
+    """
+    Telegram Bot API 대역 (POST /bot{token}/sendMessage, editMessageText)
+
+    봇 전체로는 초당 global_rate건(최대 global_rate건까지 몰아서), 같은 채팅으로는
+    per_chat_interval초에 1건까지 받고, 넘으면 429 + parameters.retry_after로 응답한다.
+    blocked에 있는 채팅은 403 (봇 차단)으로 응답한다.
+    """
+
+    def __init__(self, global_rate: float = 30.0, per_chat_interval: float = 1.0, latency: float = 0.0,
+                 blocked=(), retry_after: int = 1, **kwargs):
+        """
+        Args:
+            global_rate: 봇 전체 초당 허용 건수
+            per_chat_interval: 같은 채팅 최소 간격 (초)
+            latency: 응답 전 대기 (초)
+            blocked: 봇을 차단한 chat_id 목록
+            retry_after: 429 응답의 retry_after (초)
+        """
+        self.global_rate = global_rate
+        self.per_chat_interval = per_chat_interval
+        self.latency = latency
+        self.blocked = {str(chat_id) for chat_id in blocked}
+        self.retry_after = retry_after
+        self.sent: Dict[str, List[Dict]] = defaultdict(list)
+        self.rate_limited = 0
+        self._tokens = global_rate
+        self._updated = time.monotonic()
+        self._last_chat = {}
+        self.handler_class = _TelegramHandler
+        super().__init__(**kwargs)
+
+    def admit(self, chat_id: str) -> bool:
+        """이번 요청이 한도 안인지 (안이면 토큰 사용)"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.global_rate, self._tokens + (now - self._updated) * self.global_rate)
+            self._updated = now
+            last = self._last_chat.get(chat_id)
+            if self._tokens < 1 or (last is not None and now - last < self.per_chat_interval):
+                self.rate_limited += 1
+                return False
+            self._tokens -= 1
+            self._last_chat[chat_id] = now
+            return True
+
+    def deliver(self, chat_id: str, body: Dict) -> int:
+        """받은 메시지 저장 후 message_id 반환"""
+        with self._lock:
+            self.sent[chat_id].append(body)
+            return sum(len(messages) for messages in self.sent.values())
+
+
+class _TelegramHandler(_JsonHandler):
+
+    def do_POST(self):
+        stub = self.server_stub
+        body = self.read_json()
+        stub.record(self.path, body)
+        time.sleep(stub.latency)
+
+        parts = self.path.strip('/').split('/')
+        if len(parts) != 2 or not parts[0].startswith('bot') or len(parts[0]) == 3:
+            self.send_json(404, {'ok': False, 'error_code': 404, 'description': 'Not Found'})
+            return
+        method = parts[1]
+        chat_id = str(body.get('chat_id', ''))
+
+        if method not in ('sendMessage', 'editMessageText'):
+            self.send_json(404, {'ok': False, 'error_code': 404, 'description': 'Not Found: method not found'})
+            return
+        if not chat_id or not body.get('text'):
+            self.send_json(400, {'ok': False, 'error_code': 400, 'description': 'Bad Request: message text is empty'})
+            return
+        if chat_id in stub.blocked:
+            self.send_json(403, {'ok': False, 'error_code': 403,
+                                 'description': 'Forbidden: bot was blocked by the user'})
+            return
+        if not stub.admit(chat_id):
+            self.send_json(429, {'ok': False, 'error_code': 429,
+                                 'description': f"Too Many Requests: retry after {stub.retry_after}",
+                                 'parameters': {'retry_after': stub.retry_after}})
+            return
+
+        if method == 'editMessageText':
+            message_id = body.get('message_id')
+        else:
+            message_id = stub.deliver(chat_id, body)
+        self.send_json(200, {'ok': True, 'result': {'message_id': message_id, 'chat': {'id': chat_id},
+                                                    'date': int(time.time()), 'text': body['text']}})
+
+
+# 테스트
+if __name__ == "__main__":
+    import requests
+
+    with AnthropicStub(first_token_delay=0.05) as stub:
+        session = requests.Session()
+        for _ in range(3):
+            response = session.post(f"{stub.url}/v1/messages", headers={'x-api-key': 'test'},
+                                    json={'model': 'stub', 'messages': [], 'stream': True}, stream=True)
+            events = [line for line in response.iter_lines() if line.startswith(b'event:')]
+        print(f"=== Anthropic 대역: {stub.url} ===")
+        print(f"요청 {len(stub.requests)}회 / 연결 {stub.connections}개 / 마지막 응답 이벤트 {len(events)}개")
+
+    with TelegramStub(global_rate=20, per_chat_interval=1.0) as stub:
+        session = requests.Session()
+        codes = [session.post(f"{stub.url}/bottest/sendMessage", json={'chat_id': i % 5, 'text': '안녕'}).status_code
+                 for i in range(10)]
+        print(f"=== Telegram 대역: {stub.url} ===")
+        print(f"응답 코드 {codes} / 전달 {sum(len(m) for m in stub.sent.values())}건 / 429 {stub.rate_limited}건")
@@ -0,0 +1,202 @@
+# supply_chain.py
+# Phase 2: 미국 기업/테마 → 한국 공급사·고객사·경쟁사 그래프 전파 (희소 행렬곱, 제한된 홉 수)
+
+import json
+import os
+import sys
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# 기본 그래프 파일
+DEFAULT_SUPPLY_CHAIN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'supply_chain.json')
+
+
+class SupplyChainGraph:
+    """
+    가중 방향 그래프 위의 충격 전파
+
+    노드는 미국 시장 데이터 이름('엔비디아', 'WTI'), 테마('#HBM'), 한국 종목코드('000660')이다.
+    간선 가중치는 출발 노드 등락률 중 도착 노드로 전해지는 비율이며 경쟁 관계는 음수로 둔다.
+
+    간선은 COO 배열(출발, 도착, 가중치)로 들고 있어 한 홉은
+    x_next = bincount(도착, 가중치 · x[출발]) 한 번으로 계산한다 (scipy 없이 희소 행렬곱).
+    종목별 주 경로는 필요한 종목만 간선을 거꾸로 한 번 더 전파해 구한다.
+    """
+
+    def __init__(self, edges: List[Tuple], labels: Dict[str, str] = None, hops: int = 3, decay: float = 0.5):
+        """
+        Args:
+            edges: [(출발, 도착, 가중치[, 관계]), ...]
+            labels: {노드: 표시 이름} (테마 노드 등)
+            hops: 최대 전파 홉 수
+            decay: 두 번째 홉부터 홉마다 곱하는 감쇠
+        """
+        self.hops = hops
+        self.decay = decay
+        self.labels = dict(labels or {})
+
+        index = {}
+        for edge in edges:
+            for node in edge[:2]:
+                node = str(node)
+                if node not in index:
+                    index[sys.intern(node)] = len(index)
+        self.nodes = list(index)
+        self.index = index
+
+        self._src = np.array([index[str(edge[0])] for edge in edges], dtype=np.int32)
+        self._dst = np.array([index[str(edge[1])] for edge in edges], dtype=np.int32)
+        self._weight = np.array([float(edge[2]) for edge in edges], dtype='f8')
+
+    def __len__(self) -> int:
+        return len(self._src)
+
+    def _accumulate(self, x: np.ndarray, src: np.ndarray, dst: np.ndarray, hops: int) -> np.ndarray:
+        """x에서 출발해 hops번까지 전파한 누적합: Σ decay^(k-1) · A^k · x"""
+        total = np.zeros(len(self.nodes))
+        scale = 1.0
+        for _ in range(hops):
+            x = np.bincount(dst, weights=self._weight * x[src], minlength=len(self.nodes))
+            total += scale * x
+            scale *= self.decay
+            if not x.any():
+                break
+        return total
+
+    def seed_vector(self, seeds: Dict[str, float]) -> np.ndarray:
+        """{노드: 등락률} → 노드 배열 (그래프에 없는 노드는 무시)"""
+        x = np.zeros(len(self.nodes))
+        for name, value in seeds.items():
+            i = self.index.get(name)
+            if i is not None:
+                x[i] = value
+        return x
+
+    def propagate(self, seeds: Dict[str, float], hops: int = None) -> np.ndarray:
+        """
+        출발 노드 등락률을 hops번까지 전파
+
+        노출 = A·s + decay·A²·s + decay²·A³·s + ... (A: 간선 가중치 행렬, s: 출발 노드 등락률)
+
+        Args:
+            seeds: {노드: 등락률 %}
+            hops: 최대 홉 수 (None이면 생성 시 값)
+
+        Returns:
+            (n_nodes,) 노드별 누적 노출 %
+        """
+        hops = self.hops if hops is None else hops
+        return self._accumulate(self.seed_vector(seeds), self._src, self._dst, hops)
+
+    def sensitivity(self, node: str, hops: int = None) -> np.ndarray:
+        """
+        (n_nodes,) 각 노드 등락률 1%가 node 노출에 주는 영향 (간선을 거꾸로 전파)
+        """
+        hops = self.hops if hops is None else hops
+        x = np.zeros(len(self.nodes))
+        if node in self.index:
+            x[self.index[node]] = 1.0
+        return self._accumulate(x, self._dst, self._src, hops)
+
+    def main_sources(self, us_market_data: Dict, nodes: List[str]) -> Dict[str, str]:
+        """
+        노드별로 노출에 가장 크게 기여한 출발 노드
+
+        Returns:
+            {노드: 출발 노드} (기여가 없으면 빠짐)
+        """
+        seeds = self.seed_vector(market_seeds(us_market_data))
+        sources = {}
+        for node in nodes:
+            contribution = self.sensitivity(node) * seeds
+            if contribution.any():
+                sources[node] = self.nodes[int(np.argmax(np.abs(contribution)))]
+        return sources
+
+    def exposures(self, us_market_data: Dict, nodes: List[str] = None) -> Dict[str, float]:
+        """
+        미국 시장 데이터 → 노드별 누적 노출
+
+        Args:
+            us_market_data: {이름: {'change_pct': float, ...}}
+            nodes: 결과에 포함할 노드 (None이면 출발 노드를 뺀 전체)
+
+        Returns:
+            {노드: 노출 %} (노출 0은 빠짐)
+        """
+        seeds = market_seeds(us_market_data)
+        exposure = self.propagate(seeds)
+
+        if nodes is None:
+            nodes = [node for node in self.nodes if node not in seeds]
+
+        index = self.index
+        return {
+            node: float(exposure[index[node]])
+            for node in nodes if node in index and exposure[index[node]] != 0
+        }
+
+
+def market_seeds(us_market_data: Dict) -> Dict[str, float]:
+    """시장 데이터 → {이름: 등락률} (값 없는 지수 제외)"""
+    return {
+        name: data['change_pct'] for name, data in us_market_data.items()
+        if data and data.get('change_pct') is not None
+    }
+
+
+def load_supply_chain(path: str = None, **kwargs) -> SupplyChainGraph:
+    """
+    그래프 파일 로드
+
+    Args:
+        path: JSON 파일 (환경변수 MAMOORI_SUPPLY_CHAIN 사용 가능)
+              {'nodes': {노드: 표시 이름}, 'edges': [[출발, 도착, 가중치, 관계], ...]}
+        kwargs: SupplyChainGraph 옵션 (hops, decay)
+    """
+    path = path or os.getenv('MAMOORI_SUPPLY_CHAIN') or DEFAULT_SUPPLY_CHAIN_PATH
+    with open(path, encoding='utf-8') as f:
+        spec = json.load(f)
+    return SupplyChainGraph(spec['edges'], labels=spec.get('nodes'), **kwargs)
+
+
+# 테스트
+if __name__ == "__main__":
+    import time
+
+    graph = load_supply_chain()
+    today = {
+        '엔비디아': {'change_pct': 6.2},
+        '마이크론': {'change_pct': 3.1},
+        '테슬라': {'change_pct': -4.5},
+        'WTI': {'change_pct': 1.8},
+        'USD/KRW': {'change_pct': 0.4},
+    }
+
+    print(f"=== 기본 그래프: {len(graph.nodes)}개 노드, {len(graph)}개 간선 ===")
+    exposures = {node: value for node, value in graph.exposures(today).items() if not node.startswith('#')}
+    sources = graph.main_sources(today, list(exposures))
+    for node, exposure in sorted(exposures.items(), key=lambda item: -abs(item[1])):
+        print(f"  {node}: {exposure:+.2f}% (주 경로: {sources.get(node)})")
+
+    # 간선 수만 개 규모 그래프에서 속도 확인
+    rng = np.random.default_rng(0)
+    us_nodes = [f'US{i}' for i in range(500)]
+    themes = [f'#T{i}' for i in range(300)]
+    kr_nodes = [f'{i:06d}' for i in range(3000)]
+    edges = (
+        [(rng.choice(us_nodes), rng.choice(themes), rng.uniform(0.1, 1.0)) for _ in range(10_000)]
+        + [(rng.choice(themes), rng.choice(kr_nodes), rng.uniform(-0.3, 0.8)) for _ in range(30_000)]
+        + [(rng.choice(kr_nodes), rng.choice(kr_nodes), rng.uniform(0.0, 0.3)) for _ in range(10_000)]
+    )
+    big = SupplyChainGraph(edges)
+    market = {name: {'change_pct': float(rng.normal(0, 2))} for name in us_nodes[:60]}
+
+    started = time.perf_counter()
+    result = big.exposures(market, nodes=kr_nodes)
+    top = max(result, key=lambda node: abs(result[node]))
+    via = big.main_sources(market, [top])[top]
+    elapsed = time.perf_counter() - started
+    print(f"\n{len(big):,}개 간선, 출발 노드 {len(market)}개, 3홉: {elapsed * 1000:.1f}ms"
+          f" ({len(result):,}개 종목 노출, 최대 {top} {result[top]:+.2f}% ← {via})")
@@ -0,0 +1,245 @@
+# synthetic_market.py
+# Phase 2: 상관관계가 있는 가상 시장 데이터 생성기 (스트레스 테스트용)
+
+import zlib
+from datetime import date, timedelta
+from typing import Dict, Iterator
+
+import numpy as np
+import pandas as pd
+
+# 티커별 (시작 가격, 연 기대수익률, 일 변동성, 시장 요인 민감도)
+EQUITY_PROFILES = {
+    '^GSPC': (5732.45, 0.07, 0.010, 0.98),
+    '^IXIC': (18315.20, 0.09, 0.013, 0.93),
+    '^DJI': (42863.00, 0.06, 0.009, 0.95),
+}
+DEFAULT_EQUITY_PROFILE = (100.0, 0.05, 0.015, 0.5)
+
+# 변동성 지수 (시장 요인과 반대로 움직임)
+VOLATILITY_TICKERS = {'^VIX'}
+
+# 국면별 설정: 변동성 배율, 연 기대수익률 가산, VIX 평균 수준, 평균 지속 거래일
+REGIMES = {
+    'calm': {'vol_scale': 0.8, 'drift_shift': 0.02, 'vix_level': 14.0, 'mean_duration': 250},
+    'stress': {'vol_scale': 2.2, 'drift_shift': -0.25, 'vix_level': 30.0, 'mean_duration': 40},
+}
+
+
+class SyntheticMarketGenerator:
+    """
+    국면 전환이 있는 상관 일봉 경로를 NumPy로 한 번에 생성
+
+    - 주가지수: 공통 시장 요인 + 개별 요인 (1-요인 모형)
+    - VIX: 국면별 평균으로 회귀하며 시장 요인과 반대 방향으로 움직임
+    - 국면: calm/stress 구간 길이를 기하분포로 뽑아 이어 붙임
+    """
+
+    def __init__(self, indices: Dict[str, str] = None, seed: int = None, per_ticker_streams: bool = False):
+        """
+        Args:
+            indices: {이름: 티커} (MarketDataCollector.indices와 같은 형태)
+            seed: 난수 시드 (같은 시드 → 같은 경로)
+            per_ticker_streams: 개별 요인을 (seed, 티커)별 난수열에서 뽑음
+                (국면/시장 요인은 seed로 공유 — 티커를 따로 생성해도 같은 경로, 서로 상관 유지)
+        """
+        self.indices = indices or {
+            'S&P 500': '^GSPC',
+            'NASDAQ': '^IXIC',
+            'DOW': '^DJI',
+            'VIX': '^VIX'
+        }
+        self.seed = seed
+        self.per_ticker_streams = per_ticker_streams
+        if per_ticker_streams and seed is None:
+            raise ValueError("per_ticker_streams requires a seed")
+        self.rng = np.random.default_rng(seed)
+
+        # VIX 평균 회귀 속도 / 시장 요인과의 역상관 / 일 변동성 (log 기준)
+        self.vix_reversion = 0.08
+        self.vix_market_corr = 0.8
+        self.vix_daily_vol = 0.07
+
+    def _ticker_rng(self, ticker: str) -> np.random.Generator:
+        """개별 요인 난수열"""
+        if not self.per_ticker_streams:
+            return self.rng
+        return np.random.default_rng([self.seed, zlib.crc32(ticker.encode('utf-8'))])
+
+    def _regime_path(self, n_days: int) -> np.ndarray:
+        """일별 국면 번호 (0=calm, 1=stress)"""
+        durations = np.array([REGIMES['calm']['mean_duration'], REGIMES['stress']['mean_duration']])
+
+        # 충분한 수의 구간을 한 번에 뽑고 교대로 배치 (첫 국면은 정상 비율로 선택)
+        n_spells = max(2, int(2 * n_days / durations.min()) + 2)
+        first = int(self.rng.random() < durations[1] / durations.sum())
+        regimes = (np.arange(n_spells) + first) % 2
+        lengths = self.rng.geometric(1.0 / durations[regimes])
+
+        return np.repeat(regimes, lengths)[:n_days]
+
+    def generate(self, n_days: int, start: date = date(2000, 1, 3)) -> Dict:
+        """
+        가상 일봉 생성
+
+        Args:
+            n_days: 거래일 수
+            start: 첫 거래일 (영업일 기준으로 이어짐)
+
+        Returns:
+            {
+                'dates': datetime64[D] 배열 (n_days,),
+                'names': 이름 목록,
+                'tickers': 티커 목록,
+                'close': 종가 (n_days, n_indices),
+                'change_pct': 등락률 % (n_days, n_indices),
+                'regime': 국면 번호 (n_days,)
+            }
+        """
+        names = list(self.indices)
+        tickers = [self.indices[name] for name in names]
+        regime = self._regime_path(n_days)
+
+        vol_scale = np.array([REGIMES['calm']['vol_scale'], REGIMES['stress']['vol_scale']])[regime]
+        drift_shift = np.array([REGIMES['calm']['drift_shift'], REGIMES['stress']['drift_shift']])[regime]
+        vix_level = np.array([REGIMES['calm']['vix_level'], REGIMES['stress']['vix_level']])[regime]
+
+        # 공통 시장 요인
+        market = self.rng.standard_normal(n_days)
+
+        close = np.empty((n_days, len(tickers)))
+        change_pct = np.empty((n_days, len(tickers)))
+
+        for j, ticker in enumerate(tickers):
+            rng = self._ticker_rng(ticker)
+            if ticker in VOLATILITY_TICKERS:
+                close[:, j] = self._volatility_path(market, vix_level, rng)
+            else:
+                start_price, drift, vol, loading = EQUITY_PROFILES.get(ticker, DEFAULT_EQUITY_PROFILE)
+                shocks = loading * market + np.sqrt(1 - loading ** 2) * rng.standard_normal(n_days)
+                log_returns = (drift + drift_shift) / 252 + vol * vol_scale * shocks
+                close[:, j] = start_price * np.exp(np.cumsum(log_returns))
+
+            change_pct[1:, j] = (close[1:, j] / close[:-1, j] - 1) * 100
+            change_pct[0, j] = 0.0
+
+        dates = np.busday_offset(np.datetime64(start, 'D'), np.arange(n_days), roll='forward')
+
+        return {
+            'dates': dates,
+            'names': names,
+            'tickers': tickers,
+            'close': close,
+            'change_pct': change_pct,
+            'regime': regime
+        }
+
+    def _volatility_path(self, market: np.ndarray, target_level: np.ndarray,
+                         rng: np.random.Generator = None) -> np.ndarray:
+        """
+        VIX 경로: log 수준의 AR(1) 평균 회귀
+
+        AR(1) 재귀는 지수가중 이동평균과 같으므로 pandas ewm(C 구현)으로 한 번에 계산한다.
+        """
+        rho = self.vix_market_corr
+        shocks = -rho * market + np.sqrt(1 - rho ** 2) * (rng or self.rng).standard_normal(len(market))
+
+        # ewm 한 스텝의 변화량 ≈ alpha × 입력이므로 입력 규모를 일 변동성에 맞춤
+        innovations = shocks * self.vix_daily_vol / self.vix_reversion
+
+        # 첫 값은 정상 분포에서 뽑아 짧은 경로에서도 초기 급등이 없도록 함
+        alpha = self.vix_reversion
+        innovations[0] = shocks[0] * self.vix_daily_vol / alpha * np.sqrt(alpha / (2 - alpha))
+
+        deviation = pd.Series(innovations).ewm(alpha=self.vix_reversion, adjust=False).mean().to_numpy()
+
+        # 국면 평균 수준도 부드럽게 전환
+        level = pd.Series(np.log(target_level)).ewm(alpha=self.vix_reversion, adjust=False).mean().to_numpy()
+
+        return np.exp(level + deviation)
+
+    def histories(self, n_days: int, end: date = None) -> Dict[str, pd.DataFrame]:
+        """
+        MarketDataSource와 같은 형태의 {ticker: 일봉 DataFrame}
+
+        Args:
+            n_days: 거래일 수
+            end: 마지막 거래일 (None이면 어제)
+        """
+        end = end or date.today() - timedelta(days=1)
+        last = np.busday_offset(np.datetime64(end, 'D'), 0, roll='backward')
+        first = np.busday_offset(last, -(n_days - 1))
+
+        sample = self.generate(n_days, start=first.astype(object))
+        index = pd.DatetimeIndex(sample['dates'], name='Date')
+
+        return {
+            ticker: pd.DataFrame(
+                {
+                    'Open': sample['close'][:, j],
+                    'High': sample['close'][:, j],
+                    'Low': sample['close'][:, j],
+                    'Close': sample['close'][:, j],
+                    'Volume': np.zeros(n_days)
+                },
+                index=index
+            )
+            for j, ticker in enumerate(sample['tickers'])
+        }
+
+
+def iter_market_data(sample: Dict) -> Iterator[Dict]:
+    """
+    generate() 결과를 하루씩 get_market_data()와 같은 형태로 변환
+
+    규칙 기반 로직(KoreanStockMapper, MarketAnalyst 등)을 가상 경로에 그대로 돌릴 때 사용
+    """
+    names = sample['names']
+    close = np.round(sample['close'], 2)
+    change_pct = np.round(sample['change_pct'], 2)
+    dates = sample['dates'].astype(str)
+
+    for i in range(len(dates)):
+        yield {
+            name: {
+                'price': float(close[i, j]),
+                'change_pct': float(change_pct[i, j]),
+                'date': dates[i]
+            }
+            for j, name in enumerate(names)
+        }
+
+
+# 테스트
+if __name__ == "__main__":
+    import time
+    from itertools import islice
+    from korean_stock_mapper import KoreanStockMapper
+
+    generator = SyntheticMarketGenerator(seed=42)
+
+    started = time.perf_counter()
+    sample = generator.generate(1_000_000)
+    elapsed = time.perf_counter() - started
+
+    print(f"=== 가상 시장 {len(sample['dates']):,}거래일 생성: {elapsed:.2f}초 ===")
+    print(f"기간: {sample['dates'][0]} ~ {sample['dates'][-1]}")
+    print(f"stress 국면 비율: {sample['regime'].mean():.1%}")
+
+    corr = np.corrcoef(sample['change_pct'][1:].T)
+    print("\n등락률 상관계수:")
+    for i, name in enumerate(sample['names']):
+        print(f"  {name:>8}: " + " ".join(f"{c:+.2f}" for c in corr[i]))
+
+    # 규칙 기반 매핑을 가상 경로에 적용
+    mapper = KoreanStockMapper()
+    counts = {}
+    started = time.perf_counter()
+    for market_data in islice(iter_market_data(sample), 100_000):
+        sector = mapper.analyze_korea_impact(market_data)['primary_sector']
+        counts[sector] = counts.get(sector, 0) + 1
+    elapsed = time.perf_counter() - started
+
+    print(f"\n한국 영향 분석 100,000일: {elapsed:.2f}초")
+    for sector, count in sorted(counts.items(), key=lambda x: -x[1]):
+        print(f"  {sector}: {count:,}")
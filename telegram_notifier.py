@@ -2,22 +2,92 @@
 # Phase 1 Day 4: Telegram Bot 연동
 
 import os
+import threading
+import time
 import requests
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from typing import Dict, Optional
 from datetime import datetime
 
+from fetch_resilience import TokenBucket
+from report_templates import PARSE_MODE_TARGETS, convert_markup
+
+# Bot API 주소 (환경변수 TELEGRAM_API_BASE로 로컬 대역 서버 등 지정 가능)
+DEFAULT_API_BASE = "https://api.telegram.org"
+
+# 대량 발송 한도 (봇 전체 초당 약 30건, 같은 채팅은 초당 1건)
+BROADCAST_RATE = 30.0
+PER_CHAT_INTERVAL = 1.0
+
+
+class _BroadcastLimiter:
+    """
+    broadcast() 발송 간격 조절 (스레드 안전)
+    
+    전역 토큰 버킷(초당 rate건, 몰아 보내지 않음) + 채팅별 최소 간격,
+    429 응답의 retry_after 동안은 모든 발송을 멈춘다.
+    """
+    
+    def __init__(self, rate: float, per_chat_interval: float):
+        self.bucket = TokenBucket(rate, burst=1.0)
+        self.per_chat_interval = per_chat_interval
+        self.rate_limited = 0
+        self._next_chat = {}
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+    
+    def wait(self, chat_id: str):
+        """
+        chat_id로 한 건 보내도 될 때까지 대기
+        
+        토큰을 기다리는 사이 다른 스레드가 429로 멈춤을 걸었으면 멈춤이 끝난 뒤 토큰을 다시 받는다.
+        (재시도를 포함해 매 발송 직전에 멈춤 여부를 확인)
+        """
+        with self._lock:
+            now = time.monotonic()
+            ready = max(now, self._next_chat.get(chat_id, 0.0))
+            self._next_chat[chat_id] = ready + self.per_chat_interval
+        if ready > now:
+            time.sleep(ready - now)
+        
+        while True:
+            self._wait_pause()
+            self.bucket.acquire()
+            if self._paused_until <= time.monotonic():
+                return
+    
+    def _wait_pause(self):
+        while True:
+            paused = self._paused_until - time.monotonic()
+            if paused <= 0:
+                return
+            time.sleep(paused)
+    
+    def pause(self, seconds: float):
+        """429 retry_after: 지금부터 seconds초 동안 전체 발송 중지"""
+        with self._lock:
+            self.rate_limited += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
 class TelegramNotifier:
     """Telegram을 통한 리포트 자동 발송"""
     
-    def __init__(self, bot_token: str = None, chat_id: str = None):
+    def __init__(self, bot_token: str = None, chat_id: str = None, parse_mode: str = "MarkdownV2",
+                 api_base: str = None):
         """
         Args:
             bot_token: Telegram Bot Token (환경변수 TELEGRAM_BOT_TOKEN)
             chat_id: 수신자 Chat ID (환경변수 TELEGRAM_CHAT_ID)
+            parse_mode: 리포트 발송 형식 (MarkdownV2, HTML, Markdown 또는 None=일반 텍스트)
+            api_base: Bot API 주소 (환경변수 TELEGRAM_API_BASE, 기본 https://api.telegram.org)
         """
         self.bot_token = bot_token or os.getenv('TELEGRAM_BOT_TOKEN')
         self.chat_id = chat_id or os.getenv('TELEGRAM_CHAT_ID')
-        self.base_url = f"https://api.telegram.org/bot{self.bot_token}"
+        self.parse_mode = parse_mode
+        self.api_base = (api_base or os.getenv('TELEGRAM_API_BASE') or DEFAULT_API_BASE).rstrip('/')
+        self.base_url = f"{self.api_base}/bot{self.bot_token}"
         
         # Mock 모드 (토큰이 없으면)
         self.mock_mode = not self.bot_token or not self.chat_id
@@ -28,7 +98,7 @@ class TelegramNotifier:
         
         Args:
             text: 발송할 메시지 (Markdown 지원)
-            parse_mode: 메시지 포맷 (Markdown 또는 HTML)
+            parse_mode: 메시지 포맷 (Markdown, MarkdownV2, HTML 또는 None)
             
         Returns:
             {'success': bool, 'message_id': int or None, 'error': str or None}
@@ -42,9 +112,10 @@ class TelegramNotifier:
             payload = {
                 'chat_id': self.chat_id,
                 'text': text,
-                'parse_mode': parse_mode,
                 'disable_web_page_preview': True  # 링크 미리보기 비활성화
             }
+            if parse_mode:
+                payload['parse_mode'] = parse_mode
             
             response = requests.post(url, json=payload, timeout=10)
             response.raise_for_status()
@@ -71,6 +142,55 @@ class TelegramNotifier:
                 'error': str(e)
             }
     
+    def edit_message(self, message_id: int, text: str, parse_mode: str = "Markdown") -> dict:
+        """
+        이미 발송한 메시지 내용 교체 (늦게 도착한 AI 인사이트 반영 등)
+        
+        Args:
+            message_id: send_message() 결과의 message_id
+            text: 새 메시지
+            parse_mode: 메시지 포맷 (Markdown, MarkdownV2, HTML 또는 None)
+            
+        Returns:
+            {'success': bool, 'message_id': int or None, 'error': str or None}
+        """
+        if self.mock_mode:
+            print(f"📝 [MOCK] 메시지 {message_id} 수정 ({len(text)}자)")
+            return {'success': True, 'message_id': message_id, 'error': None}
+        
+        try:
+            url = f"{self.base_url}/editMessageText"
+            
+            payload = {
+                'chat_id': self.chat_id,
+                'message_id': message_id,
+                'text': text,
+                'disable_web_page_preview': True
+            }
+            if parse_mode:
+                payload['parse_mode'] = parse_mode
+            
+            response = requests.post(url, json=payload, timeout=10)
+            response.raise_for_status()
+            
+            result = response.json()
+            
+            if result.get('ok'):
+                return {'success': True, 'message_id': message_id, 'error': None}
+            else:
+                return {
+                    'success': False,
+                    'message_id': message_id,
+                    'error': result.get('description', 'Unknown error')
+                }
+                
+        except requests.exceptions.RequestException as e:
+            return {
+                'success': False,
+                'message_id': message_id,
+                'error': str(e)
+            }
+    
     def _mock_send(self, text: str) -> dict:
         """Mock 모드: 실제 발송 없이 시뮬레이션"""
         print("="*70)
@@ -97,25 +217,126 @@ class TelegramNotifier:
         Returns:
             발송 결과 딕셔너리
         """
-        # Telegram Markdown에 맞게 포맷 조정
+        # parse_mode에 맞게 포맷 조정
         formatted_report = self._format_for_telegram(report)
         
-        return self.send_message(formatted_report)
+        return self.send_message(formatted_report, parse_mode=self.parse_mode)
     
-    def _format_for_telegram(self, report: str) -> str:
+    def edit_report(self, message_id: int, report: str) -> dict:
+        """발송한 리포트를 새 내용으로 교체"""
+        return self.edit_message(message_id, self._format_for_telegram(report), parse_mode=self.parse_mode)
+    
+    def broadcast(self, reports: Dict, max_workers: int = 16, rate: float = BROADCAST_RATE,
+                  per_chat_interval: float = PER_CHAT_INTERVAL, max_retries: int = 3) -> dict:
         """
-        Telegram Markdown 포맷에 맞게 텍스트 변환
+        여러 채팅에 리포트 동시 발송
+        
+        스레드 풀에서 keep-alive 세션 하나로 보내되, 전역 토큰 버킷(초당 rate건)과
+        채팅별 최소 간격을 지키고, 429 응답이 오면 retry_after 동안 전체 발송을 멈췄다가 다시 보낸다.
+        
+        Args:
+            reports: {chat_id: 리포트 텍스트(**굵게** 형식, parse_mode로 변환)} 또는
+                     {chat_id: {'text', 'parse_mode'}} (ReportPipeline.render_all() 결과, 그대로 발송)
+            max_workers: 동시 발송 스레드 수
+            rate: 봇 전체 초당 발송 건수
+            per_chat_interval: 같은 채팅 발송 최소 간격 (초)
+            max_retries: 429/네트워크 오류/5xx 재시도 횟수 (400/403은 재시도 안 함)
+            
+        Returns:
+            {'results': {chat_id: {'success', 'message_id', 'error', 'attempts'}},
+             'sent': int, 'failed': int, 'rate_limited': int, 'elapsed': float, 'throughput': float}
+        """
+        messages = {}
+        for chat_id, report in reports.items():
+            if isinstance(report, str):
+                messages[str(chat_id)] = (self._format_for_telegram(report), self.parse_mode)
+            else:
+                messages[str(chat_id)] = (report['text'], report.get('parse_mode'))
+        
+        started = time.perf_counter()
+        if not self.bot_token:
+            print(f"📱 [MOCK] {len(messages)}개 채팅 대량 발송 시뮬레이션")
+            results = {
+                chat_id: {'success': True, 'message_id': 999999, 'error': None, 'attempts': 0}
+                for chat_id in messages
+            }
+            rate_limited = 0
+        else:
+            limiter = _BroadcastLimiter(rate, per_chat_interval)
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            with session, ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='telegram') as pool:
+                futures = {
+                    chat_id: pool.submit(self._deliver, session, limiter, chat_id, text, parse_mode, max_retries)
+                    for chat_id, (text, parse_mode) in messages.items()
+                }
+                results = {chat_id: future.result() for chat_id, future in futures.items()}
+            rate_limited = limiter.rate_limited
         
-        Telegram은 일부 Markdown 문법만 지원:
-        - *bold* 또는 **bold**
-        - _italic_ 또는 __italic__
-        - `code`
-        - [link](URL)
+        elapsed = time.perf_counter() - started
+        sent = sum(1 for result in results.values() if result['success'])
+        return {
+            'results': results,
+            'sent': sent,
+            'failed': len(results) - sent,
+            'rate_limited': rate_limited,
+            'elapsed': round(elapsed, 3),
+            'throughput': round(sent / elapsed, 2) if elapsed > 0 else None
+        }
+    
+    def _deliver(self, session: requests.Session, limiter: _BroadcastLimiter, chat_id: str, text: str,
+                 parse_mode: Optional[str], max_retries: int) -> dict:
+        """broadcast() 한 채팅 발송 (재시도 포함)"""
+        payload = {
+            'chat_id': chat_id,
+            'text': text,
+            'disable_web_page_preview': True
+        }
+        if parse_mode:
+            payload['parse_mode'] = parse_mode
+        
+        error = None
+        for attempt in range(1, max_retries + 2):
+            limiter.wait(chat_id)
+            try:
+                response = session.post(f"{self.base_url}/sendMessage", json=payload, timeout=10)
+                result = response.json()
+            except (requests.exceptions.RequestException, ValueError) as e:
+                error = str(e)
+                if attempt <= max_retries:
+                    time.sleep(min(0.5 * 2 ** attempt, 10.0))
+                continue
+            
+            if result.get('ok'):
+                return {
+                    'success': True,
+                    'message_id': result.get('result', {}).get('message_id'),
+                    'error': None,
+                    'attempts': attempt
+                }
+            
+            error = result.get('description', f"HTTP {response.status_code}")
+            if response.status_code == 429:
+                limiter.pause(result.get('parameters', {}).get('retry_after', 1))
+            elif response.status_code < 500:
+                break  # 잘못된 chat_id, 봇 차단 등은 다시 보내도 같음
+            elif attempt <= max_retries:
+                time.sleep(min(0.5 * 2 ** attempt, 10.0))
+        
+        return {'success': False, 'message_id': None, 'error': error, 'attempts': attempt}
+    
+    def _format_for_telegram(self, report: str) -> str:
         """
-        # 기본적으로 그대로 사용 (CommonMark 호환)
-        # 필요시 추가 변환 로직
+        리포트 텍스트(**굵게**)를 parse_mode 형식으로 변환
         
-        return report
+        - MarkdownV2: *굵게*, 특수문자(. - ( ) ! 등)는 역슬래시로 이스케이프
+        - HTML: <b>굵게</b>, < > & 이스케이프
+        - None: 굵게 표시 제거
+        - Markdown: 그대로
+        """
+        return convert_markup(report, PARSE_MODE_TARGETS[self.parse_mode])
     
     def test_connection(self) -> bool:
         """
@@ -282,3 +503,17 @@ if __name__ == "__main__":
         print("   2. Chat ID 확인")
         print("   3. 환경변수 설정 또는 코드에 직접 입력")
         print("\n   자세한 내용은 위의 설정 가이드를 참고하세요!")
+    
+    # 대량 발송 부하 테스트 (로컬 Telegram 대역, 서버 한도보다 빠르게 보내 429 처리 확인)
+    from stub_servers import TelegramStub
+    
+    print("\n📡 대량 발송 부하 테스트 (로컬 대역)...\n")
+    with TelegramStub(global_rate=100, blocked=['100007', '100042']) as stub:
+        broadcaster = TelegramNotifier(bot_token='test', api_base=stub.url)
+        chat_ids = [str(100000 + i) for i in range(300)]
+        delivery = broadcaster.broadcast({chat_id: sample_report for chat_id in chat_ids}, max_workers=32, rate=200)
+        
+        print(f"  발송 {delivery['sent']}건 / 실패 {delivery['failed']}건 / 429 {delivery['rate_limited']}회")
+        print(f"  소요 {delivery['elapsed']}초 / 처리량 {delivery['throughput']}건/초 (서버 한도 {stub.global_rate}건/초)")
+        print(f"  실패 예: {delivery['results']['100007']['error']}")
+